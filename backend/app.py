@@ -1,4 +1,4 @@
-from flask import Flask, jsonify, send_from_directory
+from flask import Flask, Response, jsonify, send_from_directory
 from flask_cors import CORS
 import os
 import logging
@@ -8,6 +8,9 @@ from routes.auth import auth_bp
 from routes.enrollment import enrollment_bp
 from routes.attendance import attendance_bp
 from routes.admin import admin_bp
+from routes.reports import reports_bp
+from utils.metrics import metrics
+from utils.warmup import warmup
 
 # Configure logging
 logging.basicConfig(
@@ -24,8 +27,8 @@ def create_app():
     # Load configuration
     app.config.from_object(Config)
     
-    # Enable CORS
-    CORS(app, resources={r"/api/*": {"origins": "*"}})
+    # Enable CORS; the dashboards read ETag to poll with If-None-Match
+    CORS(app, resources={r"/api/*": {"origins": "*", "expose_headers": ["ETag"]}})
     
     # Create necessary directories
     os.makedirs(Config.FACE_ENCODINGS_DIR, exist_ok=True)
@@ -35,11 +38,16 @@ def create_app():
     init_db()
     logger.info("Database initialized successfully")
     
+    # Load the face models and gallery off the request path (gunicorn.conf.py does it from its hooks instead)
+    if Config.WARMUP == 'background':
+        warmup.start()
+    
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(enrollment_bp, url_prefix='/api/enroll')
     app.register_blueprint(attendance_bp, url_prefix='/api/attendance')
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    app.register_blueprint(reports_bp, url_prefix='/api/reports')
     
     # Serve frontend
     @app.route('/')
@@ -50,13 +58,19 @@ def create_app():
     def serve_static(path):
         return send_from_directory(app.static_folder, path)
     
-    # Health check endpoint
+    # Health check endpoint: 503 until this worker has loaded the face models and gallery
     @app.route('/api/health')
     def health_check():
-        return jsonify({
-            'status': 'healthy',
-            'message': 'Smart Attendance System is running'
-        })
+        status = warmup.status()
+        if status['status'] != 'healthy':
+            return jsonify(status), 503
+        status['message'] = 'Smart Attendance System is running'
+        return jsonify(status)
+    
+    # Prometheus metrics, merged across workers
+    @app.route('/api/metrics')
+    def prometheus_metrics():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
     
     # Error handlers
     @app.errorhandler(404)
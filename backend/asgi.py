@@ -0,0 +1,299 @@
+"""
+ASGI entry point for the attendance API
+
+    cd backend && uvicorn --factory asgi:create_asgi_app --host 0.0.0.0 --port 5000 --workers 4
+
+The scan endpoints (POST /api/attendance/mark and /api/attendance/mark-batch)
+are served natively: the upload is read with `await receive()`, decoding and
+recognition run on a thread pool (which hands off to the recognition process
+pool when RECOGNITION_WORKERS is set) and their SQLite work runs on one
+dedicated database thread, so the event loop never blocks and a slow upload
+holds no thread. Every other route (enrollment, auth, admin, streaming
+sessions, the SSE feed, static files) is the unchanged Flask app, run on a
+separate thread pool, so long-lived responses such as open SSE feeds can
+never take the threads scans need (the feed also caps its own streams, see
+STREAM_MAX_CLIENTS).
+"""
+import asyncio
+import io
+import json
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from werkzeug.wrappers import Request
+from app import create_app
+from config import Config
+from routes.attendance import checkin_result, batch_checkin_result, scan_outcome, scan_client
+from utils.detection import StageTimer
+from utils.image_io import read_images
+from utils.recognition_pool import recognition_executor, RecognitionUnavailable
+from utils.metrics import metrics
+from utils.quality import quality_filter, rejection
+
+logger = logging.getLogger(__name__)
+
+
+class RequestTooLarge(Exception):
+    pass
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+async def read_body(receive, limit=None):
+    """Read the whole request body from the ASGI receive channel"""
+    limit = limit or Config.MAX_CONTENT_LENGTH
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise ClientDisconnected()
+        body += message.get('body', b'')
+        if len(body) > limit:
+            raise RequestTooLarge()
+        if not message.get('more_body'):
+            return body
+
+
+def build_environ(scope, body):
+    """WSGI environ for an ASGI HTTP scope and its buffered body"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = f'HTTP_{name}'
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def send_json(send, payload, status, headers=()):
+    body = json.dumps(payload, default=str).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode('latin-1')),
+            # Same CORS policy the Flask app applies to /api/*
+            (b'access-control-allow-origin', b'*'),
+        ] + [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class AttendanceASGI:
+    """ASGI application: async scan endpoints in front of the Flask app"""
+
+    def __init__(self, flask_app, threads=None, wsgi_threads=None):
+        self.flask_app = flask_app
+        # Decoding and recognition of the scan endpoints
+        self.executor = ThreadPoolExecutor(max_workers=threads or Config.ASGI_THREADS,
+                                           thread_name_prefix='asgi-worker')
+        # Everything served through the Flask app
+        self.wsgi_executor = ThreadPoolExecutor(max_workers=wsgi_threads or Config.ASGI_WSGI_THREADS,
+                                                thread_name_prefix='asgi-wsgi')
+        # SQLite work of the async endpoints is serialized on one thread
+        self.db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='asgi-sqlite')
+        self.routes = {
+            ('POST', '/api/attendance/mark'): partial(self.scan, 'recognize_face'),
+            ('POST', '/api/attendance/mark-batch'): partial(self.scan, 'recognize_faces'),
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            # No websocket routes
+            if scope['type'] == 'websocket':
+                await send({'type': 'websocket.close'})
+            return
+
+        handler = self.routes.get((scope['method'], scope['path']))
+        try:
+            if handler is not None:
+                await handler(scope, receive, send)
+            else:
+                await self.wsgi(scope, receive, send)
+        except ClientDisconnected:
+            pass
+        except RequestTooLarge:
+            await send_json(send, {'error': 'Request too large'}, 413)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.wsgi_executor.shutdown(wait=False, cancel_futures=True)
+                self.db_executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def run(self, executor, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, partial(fn, *args, **kwargs))
+
+    async def scan(self, method, scope, receive, send):
+        """/mark and /mark-batch: same responses as the Flask views"""
+        body = await read_body(receive)
+        timer = StageTimer()
+        endpoint = 'mark' if method == 'recognize_face' else 'mark_batch'
+        try:
+            # The work hops between threads, so slow requests are logged with their stage timings only
+            with metrics.track_scan(endpoint, timer, sample_stacks=False) as scan:
+                request = Request(build_environ(scope, body))
+
+                try:
+                    images, reason = await self.run(self.executor, self.decode, request, timer,
+                                                    method == 'recognize_face')
+                except Exception as e:
+                    logger.error(f"Error decoding image: {e}")
+                    scan.outcome = 'invalid'
+                    await send_json(send, {'error': 'Invalid image data'}, 400)
+                    return
+
+                if not images:
+                    message = 'No image provided' if method == 'recognize_face' else 'No images provided'
+                    scan.outcome = 'invalid'
+                    await send_json(send, {'error': message}, 400)
+                    return
+
+                if reason:
+                    scan.outcome = reason
+                    await send_json(send, rejection(reason), 200)
+                    return
+
+                try:
+                    result = await self.run(self.executor, recognition_executor.run, method,
+                                            images[0] if method == 'recognize_face' else images, timer=timer)
+                except RecognitionUnavailable as e:
+                    scan.outcome = 'unavailable'
+                    await send_json(send, {'error': str(e), 'recognized': False}, e.status,
+                                    [('retry-after', str(e.retry_after))])
+                    return
+                logger.debug(f"Recognition stage timings (ms): {timer.timings}")
+
+                result_fn = checkin_result if method == 'recognize_face' else batch_checkin_result
+                submitted = time.perf_counter()
+
+                def record():
+                    # Time spent queued behind other requests' database work
+                    timer.merge({'db_wait': (time.perf_counter() - submitted) * 1000})
+                    return result_fn(*result, timer=timer)
+
+                payload, status = await self.run(self.db_executor, record)
+                if status == 200:
+                    if method == 'recognize_face':
+                        scan.outcome = scan_outcome(result[0] is not None, result[2])
+                    else:
+                        scan.faces = result[1]
+                        scan.outcome = scan_outcome(bool(payload['recognized']), result[2], result[1])
+                await send_json(send, payload, status)
+
+        except Exception as e:
+            logger.error(f"Error marking attendance: {e}")
+            await send_json(send, {'error': 'Internal server error'}, 500)
+
+    @staticmethod
+    def decode(request, timer, check_quality=False):
+        """Decoded images, and the quality filter's reason for turning away the first one (or None)"""
+        images = read_images(request, reduced=Config.DECODE_REDUCED, timer=timer)
+        reason = None
+        if check_quality and images:
+            reason = quality_filter.check_frame(images[0], scan_client(request), timer)
+        return images, reason
+
+    async def wsgi(self, scope, receive, send):
+        """Run the Flask app on its own thread pool, streaming its response back"""
+        body = await read_body(receive)
+        environ = build_environ(scope, body)
+        loop = asyncio.get_running_loop()
+        disconnected = threading.Event()
+
+        async def watch_disconnect():
+            # Lets long responses (the SSE feed) stop once the client is gone
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    disconnected.set()
+                    return
+
+        def send_from_thread(message):
+            # False once the client is gone; it can also leave between the check and the send
+            if disconnected.is_set():
+                return False
+            try:
+                asyncio.run_coroutine_threadsafe(send(message), loop).result()
+            except Exception as e:
+                logger.debug(f"Client went away during the response: {e}")
+                disconnected.set()
+                return False
+            return True
+
+        def run_app():
+            response = {}
+
+            def start_response(status, headers, exc_info=None):
+                response['status'] = int(status.split(' ', 1)[0])
+                response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                       for name, value in headers]
+
+            iterable = self.flask_app(environ, start_response)
+            try:
+                started = False
+                for chunk in iterable:
+                    if not started:
+                        if not send_from_thread({'type': 'http.response.start', 'status': response['status'],
+                                                 'headers': response['headers']}):
+                            return
+                        started = True
+                    if chunk and not send_from_thread({'type': 'http.response.body', 'body': chunk,
+                                                       'more_body': True}):
+                        return
+                if not started and not send_from_thread({'type': 'http.response.start',
+                                                         'status': response['status'],
+                                                         'headers': response['headers']}):
+                    return
+                send_from_thread({'type': 'http.response.body', 'body': b''})
+            finally:
+                if hasattr(iterable, 'close'):
+                    iterable.close()
+
+        watcher = asyncio.ensure_future(watch_disconnect())
+        try:
+            await loop.run_in_executor(self.wsgi_executor, run_app)
+        finally:
+            watcher.cancel()
+
+
+def create_asgi_app():
+    return AttendanceASGI(create_app())
@@ -0,0 +1,69 @@
+"""
+Benchmark: approximate (IVF) vs exact 1:N face search
+
+Builds synthetic galleries, queries them with perturbed copies of enrolled
+encodings (a second photo of the same student) and reports recall@1 of the
+IVF index against the exact brute-force result, plus p50/p99 latency of a
+single-probe search for both.
+
+Usage (from backend/):
+    python -m benchmarks.bench_ann --sizes 10000 100000 1000000 --nprobe 8 16 32
+"""
+import argparse
+import time
+import numpy as np
+from utils.gallery import FaceGallery
+from utils.face_index import IVFIndex
+
+
+def synthetic_gallery(size, rng):
+    # Same scale as dlib encodings: norms around 1, ~0.09 spread per dimension
+    encodings = rng.normal(0, 0.09, (size, 128)).astype(np.float32)
+    gallery = FaceGallery()
+    gallery.load([f"S{i:07d}" for i in range(size)], encodings)
+    return gallery
+
+
+def latencies(search, probes):
+    samples = []
+    for probe in probes:
+        start = time.perf_counter()
+        search(probe[None, :])
+        samples.append((time.perf_counter() - start) * 1000)
+    return np.percentile(samples, 50), np.percentile(samples, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[8, 16, 32])
+    parser.add_argument('--nlist', type=int, default=0, help='0 = about 4 * sqrt(size)')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--noise', type=float, default=0.03, help='per-dimension noise of the query photos')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'size':>9} {'index':>12} {'recall@1':>9} {'p50 ms':>9} {'p99 ms':>9} {'build s':>8}")
+    for size in args.sizes:
+        gallery = synthetic_gallery(size, rng)
+        targets = rng.choice(size, args.queries, replace=False)
+        probes = gallery.encodings[targets] + rng.normal(0, args.noise, (args.queries, 128)).astype(np.float32)
+
+        exact_ids, _ = gallery.exact_search(probes, k=1)
+        p50, p99 = latencies(lambda p: gallery.exact_search(p, k=1), probes)
+        print(f"{size:>9} {'exact':>12} {1.0:>9.3f} {p50:>9.3f} {p99:>9.3f} {'-':>8}")
+
+        index = IVFIndex(gallery, nlist=args.nlist or None)
+        start = time.perf_counter()
+        index.build()
+        build_s = time.perf_counter() - start
+        for nprobe in args.nprobe:
+            index.nprobe = nprobe
+            ivf_ids, _ = index.search(probes, k=1)
+            recall = float(np.mean(ivf_ids[:, 0] == exact_ids[:, 0]))
+            p50, p99 = latencies(lambda p: index.search(p, k=1), probes)
+            print(f"{size:>9} {f'ivf/{nprobe}':>12} {recall:>9.3f} {p50:>9.3f} {p99:>9.3f} {build_s:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
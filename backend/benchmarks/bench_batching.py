@@ -0,0 +1,110 @@
+"""
+Benchmark: micro-batched encoding + matching across concurrent requests
+
+Detects the faces of every fixture image once, then has `--clients`
+threads identify them as fast as they can, first with one
+face_encodings + gallery.match call per request (the unbatched path)
+and then through EncodingBatcher for each batch size. Reports faces per
+second, mean batch size and request latency percentiles.
+
+Usage (from backend/):
+    python -m benchmarks.bench_batching --images path/to/fixtures --clients 16 --batch-sizes 1 4 8 16 32
+"""
+import argparse
+import threading
+import time
+import numpy as np
+import face_recognition
+from benchmarks.bench_detection import load_images
+from utils.encode_batcher import EncodingBatcher
+from utils.gallery import FaceGallery, ENCODING_DIM
+
+
+class _System:
+    """The parts of FaceRecognitionSystem the batcher uses"""
+
+    def __init__(self, gallery, tolerance):
+        self.gallery = gallery
+        self.tolerance = tolerance
+
+
+def make_gallery(size, seed=0):
+    rng = np.random.default_rng(seed)
+    encodings = rng.normal(0, 0.1, (size, ENCODING_DIM)).astype(np.float32)
+    gallery = FaceGallery()
+    gallery.load([f'S{i:07d}' for i in range(size)], encodings)
+    return gallery
+
+
+def run_clients(requests, clients, duration, identify):
+    """Each client loops over `requests` until `duration` seconds have passed"""
+    latencies, counts = [], []
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client(offset):
+        local, faces = [], 0
+        i = offset
+        while time.perf_counter() < stop_at:
+            faces_of_request = requests[i % len(requests)]
+            start = time.perf_counter()
+            identify(faces_of_request)
+            local.append((time.perf_counter() - start) * 1000)
+            faces += len(faces_of_request)
+            i += 1
+        with lock:
+            latencies.extend(local)
+            counts.append(faces)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return sum(counts) / elapsed, np.percentile(latencies, [50, 95, 99])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', required=True, help='directory of fixture images')
+    parser.add_argument('--clients', type=int, default=16, help='concurrent request threads')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+    parser.add_argument('--wait-ms', type=float, default=5.0)
+    parser.add_argument('--gallery', type=int, default=10000, help='synthetic gallery size')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per variant')
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    requests = []
+    for _, image in images:
+        locations = face_recognition.face_locations(image)
+        if locations:
+            requests.append([(image, location) for location in locations])
+    if not requests:
+        parser.error(f"No faces found in {args.images}")
+
+    system = _System(make_gallery(args.gallery), 0.6)
+    print(f"{len(requests)} requests with {sum(map(len, requests))} faces, gallery {args.gallery}, "
+          f"{args.clients} clients")
+
+    def unbatched(faces):
+        image = faces[0][0]
+        encodings = face_recognition.face_encodings(image, [location for _, location in faces])
+        return system.gallery.match(encodings, system.tolerance)
+
+    print(f"{'variant':>12} {'faces/s':>9} {'avg batch':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    throughput, (p50, p95, p99) = run_clients(requests, args.clients, args.duration, unbatched)
+    print(f"{'unbatched':>12} {throughput:>9.1f} {'-':>10} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f}")
+
+    for batch_size in args.batch_sizes:
+        batcher = EncodingBatcher(system, max_batch=batch_size, max_wait_ms=args.wait_ms)
+        throughput, (p50, p95, p99) = run_clients(requests, args.clients, args.duration, batcher.identify)
+        stats = batcher.stats()
+        print(f"{'batch ' + str(batch_size):>12} {throughput:>9.1f} {stats['avg_batch_faces']:>10.1f} "
+              f"{p50:>8.1f} {p95:>8.1f} {p99:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark: two-stage detection vs full-resolution detection
+
+For every image in a fixture directory, runs the original pipeline
+(face_locations + face_encodings at full resolution) and the FaceDetector
+pipeline at each requested scale, with and without the cascade
+pre-filter. Reports mean per-stage timings and accuracy relative to the
+original: faces found, missed, box IoU and the distance between the two
+encodings of the same face (well under the 0.6 tolerance means the match
+decision is unchanged).
+
+Usage (from backend/):
+    python -m benchmarks.bench_detection --images path/to/fixtures --scales 1.0 0.5 0.25 --cascade haar
+"""
+import argparse
+import glob
+import os
+import time
+import numpy as np
+import face_recognition
+from utils.detection import FaceDetector, StageTimer
+
+
+def iou(a, b):
+    top, right, bottom, left = max(a[0], b[0]), min(a[1], b[1]), min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, right - left) * max(0, bottom - top)
+    area = lambda box: (box[1] - box[3]) * (box[2] - box[0])
+    union = area(a) + area(b) - inter
+    return inter / union if union else 0.0
+
+
+def load_images(directory):
+    paths = sorted(p for ext in ('jpg', 'jpeg', 'png')
+                   for p in glob.glob(os.path.join(directory, f'*.{ext}')))
+    return [(os.path.basename(p), face_recognition.load_image_file(p)) for p in paths]
+
+
+def run_baseline(image, model):
+    start = time.perf_counter()
+    boxes = face_recognition.face_locations(image, model=model)
+    detect_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    encodings = face_recognition.face_encodings(image, boxes)
+    encode_ms = (time.perf_counter() - start) * 1000
+    return boxes, encodings, {'detect': detect_ms, 'encode': encode_ms}
+
+
+def run_detector(detector, image):
+    timer = StageTimer()
+    boxes = detector.detect(image, timer)
+    with timer.stage('encode'):
+        encodings = face_recognition.face_encodings(image, boxes)
+    return boxes, encodings, timer.timings
+
+
+def compare(baseline, candidate):
+    """Greedy IoU pairing of faces; returns (found, missed, extra, ious, encoding distances)"""
+    base_boxes, base_encodings = baseline
+    boxes, encodings = candidate
+    ious, distances, used = [], [], set()
+    for i, box in enumerate(base_boxes):
+        scores = [(iou(box, other), j) for j, other in enumerate(boxes) if j not in used]
+        if not scores:
+            continue
+        best, j = max(scores)
+        if best < 0.3:
+            continue
+        used.add(j)
+        ious.append(best)
+        distances.append(float(np.linalg.norm(base_encodings[i] - encodings[j])))
+    found = len(ious)
+    return found, len(base_boxes) - found, len(boxes) - found, ious, distances
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', required=True, help='directory of fixture images')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1.0, 0.5, 0.25])
+    parser.add_argument('--cascade', default='haar', help="cascade for the pre-filter variant ('' to skip)")
+    parser.add_argument('--model', default='hog')
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    if not images:
+        parser.error(f"No images found in {args.images}")
+
+    baselines = [run_baseline(image, args.model) for _, image in images]
+    base_ms = {stage: np.mean([b[2][stage] for b in baselines]) for stage in ('detect', 'encode')}
+    print(f"{len(images)} images, baseline faces: {sum(len(b[0]) for b in baselines)}")
+    print(f"baseline: detect {base_ms['detect']:.1f} ms, encode {base_ms['encode']:.1f} ms")
+
+    variants = [(scale, '') for scale in args.scales]
+    if args.cascade:
+        variants += [(scale, args.cascade) for scale in args.scales]
+
+    print(f"{'scale':>6} {'cascade':>8} {'total ms':>9} {'stages (ms)':<48} {'found':>6} {'missed':>7} "
+          f"{'extra':>6} {'IoU':>5} {'enc dist':>9}")
+    for scale, cascade in variants:
+        detector = FaceDetector(model=args.model, scale=scale, cascade=cascade)
+        totals = {}
+        found = missed = extra = 0
+        ious, distances = [], []
+        for (_, image), baseline in zip(images, baselines):
+            boxes, encodings, timings = run_detector(detector, image)
+            for stage, ms in timings.items():
+                totals[stage] = totals.get(stage, 0.0) + ms
+            f, m, e, i, d = compare(baseline[:2], (boxes, encodings))
+            found, missed, extra = found + f, missed + m, extra + e
+            ious += i
+            distances += d
+        stages = {stage: ms / len(images) for stage, ms in totals.items()}
+        stage_text = ' '.join(f"{stage}={ms:.1f}" for stage, ms in stages.items())
+        print(f"{scale:>6.2f} {cascade or '-':>8} {sum(stages.values()):>9.1f} {stage_text:<48} {found:>6} "
+              f"{missed:>7} {extra:>6} {np.mean(ious) if ious else 0:>5.2f} "
+              f"{np.max(distances) if distances else 0:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Micro-benchmark: per-scan gallery matching
+
+Compares the original list-based matching path (compare_faces followed by
+face_distance over a Python list of encodings) with FaceGallery.match.
+
+Usage (from backend/):
+    python -m benchmarks.bench_gallery --sizes 1000 10000 50000 --faces 3
+"""
+import argparse
+import time
+import numpy as np
+from utils.gallery import FaceGallery
+
+
+def legacy_face_distance(face_encodings, face_to_compare):
+    # Same as face_recognition.face_distance
+    if len(face_encodings) == 0:
+        return np.empty((0))
+    return np.linalg.norm(face_encodings - face_to_compare, axis=1)
+
+
+def legacy_match(known_face_encodings, known_face_ids, probes, tolerance):
+    """The matching loop recognize_face used before FaceGallery"""
+    for face_encoding in probes:
+        # compare_faces converts the list and computes the distances once...
+        matches = list(legacy_face_distance(np.array(known_face_encodings), face_encoding) <= tolerance)
+        # ...and face_distance does it all again
+        face_distances = legacy_face_distance(np.array(known_face_encodings), face_encoding)
+        best_match_index = np.argmin(face_distances)
+        if matches[best_match_index]:
+            return known_face_ids[best_match_index]
+    return None
+
+
+def time_it(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return float(np.median(samples)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--faces', type=int, default=1, help='faces per frame')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--tolerance', type=float, default=0.6)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'gallery':>10} {'legacy ms':>12} {'gallery ms':>12} {'speedup':>10}")
+    for size in args.sizes:
+        encodings = rng.normal(0, 0.1, (size, 128))
+        ids = [f"S{i:07d}" for i in range(size)]
+        known_face_encodings = list(encodings)
+        # Probes that do not match force the legacy loop over every face
+        probes = rng.normal(0, 0.1, (args.faces, 128)) + 1.0
+
+        gallery = FaceGallery()
+        gallery.load(ids, encodings)
+
+        legacy_ms = time_it(lambda: legacy_match(known_face_encodings, ids, probes, args.tolerance), args.repeat)
+        gallery_ms = time_it(lambda: gallery.match(probes, args.tolerance), args.repeat)
+        print(f"{size:>10} {legacy_ms:>12.3f} {gallery_ms:>12.3f} {legacy_ms / gallery_ms:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark: bytes on the wire and CPU per request for each image ingestion path
+
+Builds the same scan frame as a JSON data URL (the original format), a
+multipart upload and a raw image/jpeg body, then times read_images for
+each inside a Flask request context, with and without reduced decoding.
+
+Usage (from backend/):
+    python -m benchmarks.bench_ingest [--image photo.jpg] [--repeat 200]
+"""
+import argparse
+import base64
+import json
+import time
+import cv2
+import numpy as np
+from flask import Flask
+from utils.image_io import read_images
+
+
+def synthetic_frame():
+    rng = np.random.default_rng(0)
+    frame = cv2.GaussianBlur(rng.integers(0, 255, (480, 640, 3), dtype=np.uint8), (15, 15), 0)
+    cv2.circle(frame, (320, 220), 110, (180, 160, 140), -1)
+    return frame
+
+
+def build_requests(jpeg):
+    data_url = 'data:image/jpeg;base64,' + base64.b64encode(jpeg).decode()
+    boundary = 'benchboundary'
+    multipart = (f'--{boundary}\r\nContent-Disposition: form-data; name="image"; filename="scan.jpg"\r\n'
+                 f'Content-Type: image/jpeg\r\n\r\n').encode() + jpeg + f'\r\n--{boundary}--\r\n'.encode()
+    return {
+        'json': (json.dumps({'image': data_url}).encode(), 'application/json'),
+        'multipart': (multipart, f'multipart/form-data; boundary={boundary}'),
+        'raw': (jpeg, 'image/jpeg'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', help='JPEG/PNG to use instead of a synthetic 640x480 frame')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    frame = cv2.imread(args.image) if args.image else synthetic_frame()
+    jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+    app = Flask(__name__)
+
+    print(f"frame {frame.shape[1]}x{frame.shape[0]}, jpeg {len(jpeg)} bytes")
+    print(f"{'path':>10} {'reduced':>8} {'bytes':>9} {'overhead':>9} {'cpu ms':>8}")
+    for name, (body, content_type) in build_requests(jpeg).items():
+        for reduced in (False, True):
+            start = time.process_time()
+            for _ in range(args.repeat):
+                with app.test_request_context('/', method='POST', data=body, content_type=content_type):
+                    images = read_images(reduced=reduced)
+            cpu_ms = (time.process_time() - start) * 1000 / args.repeat
+            assert images and images[0].shape[0] == frame.shape[0] // (2 if reduced else 1)
+            print(f"{name:>10} {str(reduced):>8} {len(body):>9} {len(body) / len(jpeg) - 1:>8.1%} {cpu_ms:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
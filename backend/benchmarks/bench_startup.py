@@ -0,0 +1,183 @@
+"""
+Startup benchmark: time from launching the server to its first successful scan
+
+Seeds a scratch database and encoding store by enrolling the face in
+--image, then for each server variant starts it from cold and measures:
+
+- first_page: first 200 from a route that needs no models (the login page)
+- healthy: first 200 from /api/health
+- first_scan: first /api/attendance/mark that recognizes the face,
+  counted from launch, and the latency of that request alone
+- cold_scan_max_ms: the slowest of the next 4 x --workers scans, which is
+  where workers that still have to load the models show up
+
+Variants:
+    lazy      gunicorn app:create_app(), bypassing gunicorn.conf.py, with
+              WARMUP=off: every worker loads the models on its first scan
+    warm      the same with WARMUP=background: each worker warms up on a
+              thread after it starts and /api/health waits for it
+    preload   gunicorn -c gunicorn.conf.py: the master loads and warms up
+              once before forking, the workers share it copy-on-write
+
+Usage (from backend/):
+    python -m benchmarks.bench_startup --image face.jpg
+    python -m benchmarks.bench_startup --image face.jpg --workers 4 --variants lazy preload --json
+"""
+import argparse
+import json
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from benchmarks.load_test import wait_healthy, enroll
+
+SERVERS = {
+    'lazy': ('gunicorn -c /dev/null --workers {workers} --worker-class gthread --threads 8 --timeout 120 '
+             '--bind 127.0.0.1:{port} app:create_app()', {'WARMUP': 'off'}),
+    'warm': ('gunicorn -c /dev/null --workers {workers} --worker-class gthread --threads 8 --timeout 120 '
+             '--bind 127.0.0.1:{port} app:create_app()', {'WARMUP': 'background'}),
+    'preload': ('gunicorn -c gunicorn.conf.py --workers {workers} --bind 127.0.0.1:{port}', {}),
+}
+
+
+def request(url, body=None, timeout=60):
+    """One request; returns (status, parsed JSON body or None)"""
+    headers = {'Content-Type': 'image/jpeg'} if body is not None else {}
+    req = urllib.request.Request(url, data=body, headers=headers, method='POST' if body is not None else 'GET')
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            status, data = response.status, response.read()
+    except urllib.error.HTTPError as e:
+        status, data = e.code, e.read()
+    try:
+        return status, json.loads(data)
+    except ValueError:
+        return status, None
+
+
+def wait_for(check, timeout, interval=0.05):
+    """Poll check() until it is true; returns the seconds waited, or None on timeout"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            if check():
+                return time.perf_counter() - start
+        except OSError:
+            pass
+        time.sleep(interval)
+    return None
+
+
+def measure(url, body, launched, workers, timeout):
+    result = {}
+
+    def since_launch():
+        return round(time.perf_counter() - launched, 3)
+
+    if wait_for(lambda: request(f"{url}/", timeout=5)[0] == 200, timeout) is None:
+        return None
+    result['first_page_s'] = since_launch()
+
+    wait_for(lambda: request(f"{url}/api/health", timeout=5)[0] == 200, timeout)
+    result['healthy_s'] = since_launch()
+
+    def scan():
+        start = time.perf_counter()
+        status, data = request(f"{url}/api/attendance/mark", body, timeout=timeout)
+        return status == 200 and bool(data and data.get('recognized')), (time.perf_counter() - start) * 1000
+
+    latency = None
+    while time.perf_counter() - launched < timeout:
+        ok, latency = scan()
+        if ok:
+            break
+    else:
+        return None
+    result['first_scan_s'] = since_launch()
+    result['first_scan_ms'] = round(latency, 1)
+
+    latencies = [scan()[1] for _ in range(4 * workers)]
+    result['cold_scan_max_ms'] = round(max(latencies), 1)
+    result['warm_scan_ms'] = round(sorted(latencies)[len(latencies) // 2], 1)
+    return result
+
+
+def start_server(name, workers, port, env, backend_dir):
+    command, extra_env = SERVERS[name]
+    command = command.format(workers=workers, port=port)
+    process = subprocess.Popen(shlex.split(command), cwd=backend_dir, env=dict(env, **extra_env),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return process, command
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', required=True, help='JPEG with one face, enrolled and then scanned')
+    parser.add_argument('--variants', nargs='+', default=['lazy', 'warm', 'preload'], choices=list(SERVERS))
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--port', type=int, default=5200)
+    parser.add_argument('--timeout', type=float, default=180.0, help='seconds to wait for each milestone')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    with open(args.image, 'rb') as f:
+        body = f.read()
+
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    scratch = tempfile.mkdtemp(prefix='ams-startup-')
+    env = dict(os.environ,
+               DATABASE_PATH=os.path.join(scratch, 'attendance.db'),
+               FACE_ENCODINGS_DIR=os.path.join(scratch, 'face_encodings'),
+               ATTENDANCE_JOURNAL_DIR=os.path.join(scratch, 'journal'),
+               METRICS_DIR=os.path.join(scratch, 'metrics'),
+               # Every scan should do the full detect/encode/match, not hit the cache or dedup
+               RECOGNITION_CACHE_TTL='0',
+               CHECKIN_DEDUP_SECONDS='0')
+
+    # Seed the gallery through the API, as a real deployment would have it
+    process, command = start_server('warm', 1, args.port, env, backend_dir)
+    try:
+        if not wait_healthy(f"http://127.0.0.1:{args.port}", args.timeout):
+            sys.exit(f"seed server did not become healthy ({command})")
+        status = enroll(f"http://127.0.0.1:{args.port}", body)
+        if status != 201 and status != 200:
+            sys.exit(f"enrolling --image failed: HTTP {status}")
+    finally:
+        stop_server(process)
+
+    results = {}
+    for index, name in enumerate(args.variants):
+        port = args.port + 1 + index
+        launched = time.perf_counter()
+        process, command = start_server(name, args.workers, port, env, backend_dir)
+        try:
+            results[name] = measure(f"http://127.0.0.1:{port}", body, launched, args.workers, args.timeout)
+        finally:
+            stop_server(process)
+        if results[name] is None:
+            print(f"{name}: no successful scan within {args.timeout}s ({command})", file=sys.stderr)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    columns = ['first_page_s', 'healthy_s', 'first_scan_s', 'first_scan_ms', 'cold_scan_max_ms', 'warm_scan_ms']
+    print(f"{'variant':>8} " + ' '.join(f"{c:>16}" for c in columns))
+    for name, r in results.items():
+        if r is not None:
+            print(f"{name:>8} " + ' '.join(f"{r[c]:>16}" for c in columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark: single-photo enrollment vs multi-sample templates
+
+Takes a directory with one sub-directory of photos per person (the LFW
+layout). For every person with more than --samples photos, the first
+--samples photos are enrolled and the rest are probes. Three galleries
+are compared: the first photo only (today's enroll_face), the template
+built from all samples (build_template), and that template rounded to
+float16. For each tolerance it reports the true accept rate of the
+probes, the false accept rate of probes from people who were never
+enrolled, and gallery rows and matching time per probe.
+
+Usage (from backend/):
+    python -m benchmarks.bench_templates --people path/to/lfw --samples 5 --tolerances 0.45 0.5 0.55 0.6
+"""
+import argparse
+import os
+import time
+import numpy as np
+import face_recognition
+from benchmarks.bench_detection import load_images
+from utils.gallery import FaceGallery
+from utils.templates import build_template, TemplateError
+
+
+def encode_people(directory, min_photos):
+    """{person: (K, 128) encodings} for people with at least min_photos single-face photos"""
+    people = {}
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not os.path.isdir(path):
+            continue
+        encodings = []
+        for _, image in load_images(path):
+            found = face_recognition.face_encodings(image)
+            if len(found) == 1:
+                encodings.append(found[0])
+        if len(encodings) >= min_photos:
+            people[name] = np.array(encodings, dtype=np.float32)
+    return people
+
+
+def evaluate(gallery, probes, impostors, tolerance):
+    start = time.perf_counter()
+    genuine = gallery.match([p for _, p in probes], tolerance) if probes else []
+    elapsed = time.perf_counter() - start
+    impostor = gallery.match(impostors, tolerance) if len(impostors) else []
+    tar = np.mean([match == name for (name, _), (match, _) in zip(probes, genuine)]) if probes else 0.0
+    far = np.mean([match is not None for match, _ in impostor]) if len(impostor) else 0.0
+    return tar, far, elapsed * 1000 / max(1, len(probes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--people', required=True, help='directory with one sub-directory of photos per person')
+    parser.add_argument('--samples', type=int, default=5, help='photos enrolled per person')
+    parser.add_argument('--tolerances', type=float, nargs='+', default=[0.45, 0.5, 0.55, 0.6])
+    parser.add_argument('--impostor-share', type=float, default=0.3, help='share of people kept out of the gallery')
+    args = parser.parse_args()
+
+    people = encode_people(args.people, args.samples + 1)
+    if len(people) < 2:
+        parser.error(f"Need at least two people with more than {args.samples} usable photos")
+
+    names = sorted(people)
+    n_impostors = max(1, int(len(names) * args.impostor_share))
+    enrolled, impostors = names[n_impostors:], names[:n_impostors]
+    impostor_probes = np.vstack([people[name] for name in impostors])
+    probes = [(name, p) for name in enrolled for p in people[name][args.samples:]]
+
+    galleries = {'single': FaceGallery(), 'template': FaceGallery(), 'float16': FaceGallery()}
+    rejected = 0
+    for name in enrolled:
+        samples = people[name][:args.samples]
+        try:
+            template = build_template(samples)
+        except TemplateError:
+            rejected += 1
+            template = samples[:1]
+        galleries['single'].add(name, samples[0])
+        galleries['template'].add(name, template)
+        galleries['float16'].add(name, template.astype(np.float16).astype(np.float32))
+
+    print(f"{len(enrolled)} enrolled, {len(probes)} probes, {len(impostor_probes)} impostor probes "
+          f"({rejected} sample sets rejected as inconsistent)")
+    print(f"{'gallery':>9} {'rows':>6} {'tolerance':>9} {'TAR':>7} {'FAR':>7} {'ms/probe':>9}")
+    for label, gallery in galleries.items():
+        for tolerance in args.tolerances:
+            tar, far, ms = evaluate(gallery, probes, impostor_probes, tolerance)
+            print(f"{label:>9} {len(gallery):>6} {tolerance:>9.2f} {tar:>7.3f} {far:>7.3f} {ms:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
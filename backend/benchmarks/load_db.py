@@ -0,0 +1,98 @@
+"""
+Load test: check-in throughput of the models layer under concurrent workers
+
+Simulates gunicorn workers (processes) hammering the same SQLite file with
+the database work of one successful scan (Student.get_by_id followed by
+Attendance.mark_present). Runs once with plain per-call connections and
+the default rollback journal (the original behaviour) and once with the
+pooled WAL connections, on fresh databases.
+
+Usage (from backend/):
+    python -m benchmarks.load_db --workers 4 --threads 2 --checkins 2000
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from config import Config
+import models
+
+
+def seed(path, students):
+    Config.DATABASE_PATH = path
+    models.init_db()
+    conn = models.get_db_connection()
+    conn.executemany('INSERT INTO students (student_id, name, department) VALUES (?, ?, ?)',
+                     [(f"S{i:06d}", f"Student {i}", 'CS') for i in range(students)])
+    conn.commit()
+    conn.close()
+
+
+def worker(path, pool_size, worker_index, threads, checkins, students, results):
+    import threading
+    Config.DATABASE_PATH = path
+    Config.DB_POOL_SIZE = pool_size
+    failures = []
+    latencies = []
+
+    def run(thread_index):
+        for n in range(checkins):
+            student_id = f"S{(worker_index * 7919 + thread_index * 104729 + n) % students:06d}"
+            # Spread check-ins over many days so most are inserts, not upserts
+            date = f"2024-{1 + n % 12:02d}-{1 + (n // 12) % 28:02d}"
+            start = time.perf_counter()
+            models.Student.get_by_id(student_id)
+            if not models.Attendance.mark_present(student_id, 0.9, date):
+                failures.append(student_id)
+            latencies.append(time.perf_counter() - start)
+
+    pool = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    results.put((len(failures), latencies))
+
+
+def run(label, pool_size, args):
+    path = os.path.join(tempfile.mkdtemp(), 'load.db')
+    Config.DB_POOL_SIZE = pool_size
+    seed(path, args.students)
+
+    per_thread = args.checkins // (args.workers * args.threads)
+    results = multiprocessing.Queue()
+    start = time.perf_counter()
+    procs = [multiprocessing.Process(target=worker,
+                                     args=(path, pool_size, w, args.threads, per_thread, args.students, results))
+             for w in range(args.workers)]
+    for p in procs:
+        p.start()
+    collected = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - start
+
+    failures = sum(f for f, _ in collected)
+    latencies = sorted(l for _, lat in collected for l in lat)
+    total = len(latencies)
+    p99 = latencies[int(total * 0.99) - 1] * 1000 if total else 0
+    print(f"{label:>8} {total / elapsed:>12.0f} {latencies[total // 2] * 1000:>9.2f} {p99:>9.2f} {failures:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=2)
+    parser.add_argument('--checkins', type=int, default=2000)
+    parser.add_argument('--students', type=int, default=5000)
+    args = parser.parse_args()
+
+    pool_size = Config.DB_POOL_SIZE or 8
+    print(f"{'mode':>8} {'checkins/s':>12} {'p50 ms':>9} {'p99 ms':>9} {'failures':>9}")
+    run('legacy', 0, args)
+    run('pooled', pool_size, args)
+
+
+if __name__ == '__main__':
+    main()
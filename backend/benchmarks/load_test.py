@@ -0,0 +1,237 @@
+"""
+Load test: requests/sec and tail latency of the attendance API
+
+Drives a running server with `--concurrency` keep-alive connections for
+`--duration` seconds, all posting the same image to a scan endpoint (or
+GETting any other path), and reports throughput, latency percentiles and
+status codes. Connections the server closes (gunicorn sync workers do
+after every response) are reopened, and the reconnect counts towards
+latency, as it does for real clients.
+
+With --compare it starts the current sync deployment (gunicorn, 4 sync
+workers) and the ASGI entry point (uvicorn) one after the other on a
+scratch database and encoding store, optionally enrolls the face in the
+image first, and prints both results side by side.
+
+Usage (from backend/):
+    python -m benchmarks.load_test --url http://localhost:5000 --image face.jpg
+    python -m benchmarks.load_test --compare --image face.jpg --enroll --concurrency 32 \\
+        --env RECOGNITION_CACHE_TTL=0 --env CHECKIN_DEDUP_SECONDS=0
+"""
+import argparse
+import asyncio
+import json
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlsplit
+import numpy as np
+
+SERVERS = {
+    'sync': 'gunicorn --workers {workers} --timeout 120 --bind 127.0.0.1:{port} app:create_app()',
+    'asgi': 'uvicorn --factory asgi:create_asgi_app --workers {workers} --host 127.0.0.1 --port {port} '
+            '--log-level warning',
+}
+
+
+async def read_response(reader, with_body=False):
+    """Read one HTTP/1.1 response; returns (status, keep_alive), plus the body with_body"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connection closed")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    body = b''
+    keep_alive = headers.get('connection', '').lower() != 'close'
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            body += (await reader.readexactly(size + 2))[:size]
+            if size == 0:
+                break
+    elif 'content-length' in headers:
+        body = await reader.readexactly(int(headers['content-length']))
+    else:
+        body = await reader.read()
+        keep_alive = False
+    return (status, keep_alive, body) if with_body else (status, keep_alive)
+
+
+async def client(host, port, request, stop_at, results):
+    reader = writer = None
+    while time.perf_counter() < stop_at:
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(request)
+            await writer.drain()
+            status, keep_alive = await read_response(reader)
+        except (ConnectionError, asyncio.IncompleteReadError, OSError):
+            results.append((0, (time.perf_counter() - start) * 1000))
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            continue
+        results.append((status, (time.perf_counter() - start) * 1000))
+        if not keep_alive:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+def build_request(url, path, body, content_type):
+    parts = urlsplit(url)
+    host = parts.hostname
+    port = parts.port or 80
+    if body is None:
+        head = f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\n\r\n"
+        return host, port, head.encode('latin-1')
+    head = (f"POST {path} HTTP/1.1\r\nHost: {host}:{port}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n")
+    return host, port, head.encode('latin-1') + body
+
+
+async def run_load(url, path, body, content_type, concurrency, duration):
+    host, port, request = build_request(url, path, body, content_type)
+    results = []
+    start = time.perf_counter()
+    stop_at = start + duration
+    await asyncio.gather(*(client(host, port, request, stop_at, results) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array([ms for _, ms in results]) if results else np.zeros(1)
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    ok = sum(count for status, count in statuses.items() if 200 <= status < 300)
+    return {
+        'requests': len(results),
+        'rps': len(results) / elapsed,
+        'ok_rps': ok / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'max_ms': float(latencies.max()),
+        'statuses': statuses,
+    }
+
+
+def wait_healthy(url, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"{url}/api/health", timeout=2) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            time.sleep(0.5)
+    return False
+
+
+def enroll(url, image_bytes):
+    request = urllib.request.Request(
+        f"{url}/api/enroll/register?student_id=LOAD0001&name=Load%20Test&department=QA",
+        data=image_bytes, headers={'Content-Type': 'image/jpeg'}, method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def print_results(rows):
+    print(f"{'server':>8} {'requests':>9} {'req/s':>8} {'2xx/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8}  statuses")
+    for name, r in rows:
+        statuses = ' '.join(f"{status}:{count}" for status, count in sorted(r['statuses'].items()))
+        print(f"{name:>8} {r['requests']:>9} {r['rps']:>8.1f} {r['ok_rps']:>8.1f} {r['p50_ms']:>8.1f} "
+              f"{r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['max_ms']:>8.1f}  {statuses}")
+
+
+def compare(args, body):
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    scratch = tempfile.mkdtemp(prefix='ams-load-')
+    env = dict(os.environ,
+               DATABASE_PATH=os.path.join(scratch, 'attendance.db'),
+               FACE_ENCODINGS_DIR=os.path.join(scratch, 'face_encodings'),
+               ATTENDANCE_JOURNAL_DIR=os.path.join(scratch, 'journal'))
+    for item in args.env:
+        name, _, value = item.partition('=')
+        env[name] = value
+
+    rows = []
+    for index, name in enumerate(args.servers):
+        port = args.port + index
+        url = f"http://127.0.0.1:{port}"
+        command = SERVERS[name].format(workers=args.workers, port=port)
+        process = subprocess.Popen(shlex.split(command), cwd=backend_dir, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_healthy(url):
+                print(f"{name}: server did not become healthy ({command})", file=sys.stderr)
+                continue
+            if args.enroll and index == 0 and body is not None:
+                print(f"enroll: HTTP {enroll(url, body)}")
+            # Warm up every worker before measuring
+            asyncio.run(run_load(url, args.path, body, args.content_type, args.workers, 2))
+            rows.append((name, asyncio.run(run_load(url, args.path, body, args.content_type,
+                                                    args.concurrency, args.duration))))
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='server to load (ignored with --compare)')
+    parser.add_argument('--path', default='/api/attendance/mark')
+    parser.add_argument('--image', help='image posted as the request body (omit to send GETs)')
+    parser.add_argument('--content-type', default='image/jpeg')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds per run')
+    parser.add_argument('--compare', action='store_true', help='start and load each of --servers in turn')
+    parser.add_argument('--servers', nargs='+', default=['sync', 'asgi'], choices=sorted(SERVERS))
+    parser.add_argument('--workers', type=int, default=4, help='server worker processes (--compare)')
+    parser.add_argument('--port', type=int, default=5100, help='first port used by --compare')
+    parser.add_argument('--enroll', action='store_true', help='enroll the face in --image first (--compare)')
+    parser.add_argument('--env', action='append', default=[], help='KEY=VALUE for the servers (--compare)')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    body = None
+    if args.image:
+        with open(args.image, 'rb') as f:
+            body = f.read()
+
+    if args.compare:
+        rows = compare(args, body)
+    else:
+        rows = [(urlsplit(args.url).netloc, asyncio.run(run_load(args.url, args.path, body, args.content_type,
+                                                                 args.concurrency, args.duration)))]
+
+    if args.json:
+        print(json.dumps({name: result for name, result in rows}, indent=2, default=str))
+    else:
+        print_results(rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Recognition stub: a stand-in `face_recognition` module for benchmarking
+without dlib or its models
+
+install() registers the stub under the names the app imports, so it must
+run before utils.face_utils (or anything importing it) is imported.
+Detection finds one face in frames made by benchmarks.synthetic.frame()
+and none in any other image, and the encoding of that face is the
+synthetic probe of the student index the frame carries. Everything around
+it (decoding, the gallery, the recognition cache, the database, HTTP) is
+the real code.
+
+STUB_RECOGNITION_MS adds a CPU-bound delay per detection and per encoded
+face, to approximate the cost of the real models (about 30-150ms for HOG
+detection and 10-20ms per encoding on a typical server core).
+BENCH_SEED must match the seed the gallery was built with.
+
+The server side of the load test runs the app through this module
+(from backend/):
+    gunicorn -c gunicorn.conf.py 'benchmarks.stub_recognition:create_app()'
+
+The recognition process pool (RECOGNITION_WORKERS) and EncodingBatcher
+(ENCODE_BATCHING) call into dlib directly and are not covered by the stub.
+"""
+import os
+import sys
+import time
+import types
+import numpy as np
+from benchmarks import synthetic
+
+COST_MS = float(os.getenv('STUB_RECOGNITION_MS', '0'))
+SEED = int(os.getenv('BENCH_SEED', '0'))
+
+
+def _spend(ms):
+    # Busy loop rather than sleep: the real models hold a core (and the GIL) while they run
+    deadline = time.perf_counter() + ms / 1000
+    while time.perf_counter() < deadline:
+        pass
+
+
+def face_locations(img, number_of_times_to_upsample=1, model='hog'):
+    _spend(COST_MS)
+    if synthetic.read_frame_index(img) is None:
+        return []
+    height, width = img.shape[:2]
+    return [(height // 4, width * 3 // 4, height * 3 // 4, width // 4)]
+
+
+def face_encodings(face_image, known_face_locations=None, num_jitters=1, model='small'):
+    if known_face_locations is None:
+        known_face_locations = face_locations(face_image)
+    index = synthetic.read_frame_index(face_image)
+    result = []
+    for _ in known_face_locations:
+        _spend(COST_MS)
+        result.append(synthetic.probe(index, SEED).astype(np.float64) if index is not None
+                      else np.zeros(synthetic.ENCODING_DIM))
+    return result
+
+
+def install():
+    """Register the stub as face_recognition (and face_recognition.api) in this process"""
+    module = types.ModuleType('face_recognition')
+    module.face_locations = face_locations
+    module.face_encodings = face_encodings
+    module.api = module
+    module.__stub__ = True
+    sys.modules['face_recognition'] = module
+    sys.modules['face_recognition.api'] = module
+    try:
+        import dlib  # noqa: F401  (encode_batcher imports it at module level)
+    except ImportError:
+        sys.modules['dlib'] = types.ModuleType('dlib')
+    return module
+
+
+def create_app():
+    """The Flask app with recognition stubbed out (a gunicorn/WSGI entry point)"""
+    install()
+    from app import create_app as create
+    return create()
@@ -0,0 +1,604 @@
+"""
+Benchmark suite: reproducible, offline measurements of the recognition and
+database layers, written as JSON so runs can be compared across commits
+
+All data is synthetic (benchmarks/synthetic.py) and generated from --seed,
+in a scratch directory that is removed afterwards. Benchmarks (--only):
+
+    gallery     FaceGallery.match latency, recall and false accepts for
+                galleries of --gallery-sizes encodings
+    store       EncodingStore write time, cold load into
+                FaceRecognitionSystem and the cost of refresh() with and
+                without changes, for --store-sizes students
+    scan        FaceRecognitionSystem.recognize_face end to end, per stage
+    quality     QualityFilter.check_frame latency at common camera
+                resolutions, and the verdicts on dark, blown-out and
+                blurred copies of a frame
+    checkins    Attendance.mark_present (one transaction per scan) and
+                write_checkins (batched) throughput
+    dashboard   admin dashboard and report queries on a database with
+                --db-students students and --db-days school days of history
+    rush        gate-rush replay: gunicorn (gunicorn.conf.py) serving the
+                app, --rush-students arriving over --rush-seconds with
+                retries and unknown visitors, sent open-loop at their
+                scheduled times; latency counts from the scheduled time
+
+Recognition is stubbed by default (benchmarks/stub_recognition.py), so the
+suite needs neither dlib nor its models and `scan` and `rush` measure
+everything except detection and encoding. --stub-ms adds a CPU-bound
+delay per detection and per face to stand in for them. With
+--recognition dlib, `scan` runs the real models on --image; `rush`
+always uses the stub, as it needs a distinct face per student.
+
+Usage (from backend/):
+    python -m benchmarks.suite --output results/base.json
+    python -m benchmarks.suite --quick --only gallery checkins
+    python -m benchmarks.suite --output results/new.json --compare results/base.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+import numpy as np
+from benchmarks import synthetic
+
+BENCHMARKS = ['gallery', 'store', 'scan', 'quality', 'checkins', 'dashboard', 'rush']
+
+PROFILES = {
+    'full': {
+        'gallery_sizes': [1000, 10000, 100000, 1000000],
+        'store_sizes': [1000, 100000, 1000000],
+        'queries': 500,
+        'scan_gallery': 10000,
+        'checkins': 5000,
+        'db_students': 2000,
+        'db_days': 500,
+        'rush_students': 1000,
+        'rush_seconds': 60.0,
+    },
+    'quick': {
+        'gallery_sizes': [1000, 10000],
+        'store_sizes': [1000, 10000],
+        'queries': 100,
+        'scan_gallery': 1000,
+        'checkins': 500,
+        'db_students': 300,
+        'db_days': 60,
+        'rush_students': 200,
+        'rush_seconds': 15.0,
+    },
+}
+
+
+def summarize(seconds):
+    """Latency percentiles (ms) of a list of durations in seconds"""
+    ms = np.asarray(seconds, dtype=np.float64) * 1000
+    if len(ms) == 0:
+        return {'count': 0}
+    return {
+        'count': len(ms),
+        'mean_ms': round(float(ms.mean()), 3),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'max_ms': round(float(ms.max()), 3),
+    }
+
+
+def timed(fn, repeat):
+    """Call fn once to warm up, then `repeat` times; returns the durations"""
+    fn()
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def bench_gallery(args, scratch):
+    from config import Config
+    from utils.face_index import create_index
+    from utils.gallery import FaceGallery
+
+    results = {}
+    rng = np.random.default_rng(args.seed)
+    for size in args.gallery_sizes:
+        matrix = synthetic.encodings(np.arange(size), args.seed)
+        ids = np.array([synthetic.student_id(i) for i in range(size)], dtype=object)
+
+        gallery = FaceGallery()
+        start = time.perf_counter()
+        gallery.load(ids, matrix)
+        gallery.index = create_index(gallery)
+        load_s = time.perf_counter() - start
+
+        targets = rng.integers(0, size, args.queries)
+        probes = [synthetic.probe(int(t), args.seed) for t in targets]
+        durations, correct = [], 0
+        for target, p in zip(targets, probes):
+            start = time.perf_counter()
+            (student_id, _), = gallery.match([p], Config.TOLERANCE)
+            durations.append(time.perf_counter() - start)
+            correct += student_id == synthetic.student_id(int(target))
+
+        # Faces of people who are not enrolled
+        impostors = [synthetic.probe(size + i, args.seed) for i in range(args.queries)]
+        false_accepts = sum(s is not None for s, _ in gallery.match(impostors, Config.TOLERANCE))
+
+        # A group photo: 8 faces matched in one call
+        batches = [probes[i:i + 8] for i in range(0, len(probes) - 7, 8)]
+        batch_durations = []
+        for batch in batches:
+            start = time.perf_counter()
+            gallery.match(batch, Config.TOLERANCE)
+            batch_durations.append(time.perf_counter() - start)
+
+        results[str(size)] = {
+            'index': gallery.index.name,
+            'load_s': round(load_s, 4),
+            'recall': round(correct / len(targets), 4),
+            'false_accept_rate': round(false_accepts / len(impostors), 4),
+            'match_1': summarize(durations),
+            'match_8': summarize(batch_durations),
+        }
+        del gallery, matrix, ids
+    return results
+
+
+def bench_store(args, scratch):
+    from utils.encoding_store import EncodingStore
+    from utils.face_utils import FaceRecognitionSystem
+    from utils.recognition_cache import RecognitionCache
+
+    results = {}
+    for size in args.store_sizes:
+        directory = os.path.join(scratch, f'store_{size}')
+        os.makedirs(directory)
+        store = EncodingStore(directory)
+        build_s = synthetic.build_store(store, size, args.seed)
+
+        system = FaceRecognitionSystem(store=store, cache=RecognitionCache(ttl=0))
+        start = time.perf_counter()
+        system.load_known_faces()
+        load_s = time.perf_counter() - start
+        # The gallery maps the store; the first match is what pages it in
+        start = time.perf_counter()
+        system.gallery.match([synthetic.probe(0, args.seed)], system.tolerance)
+        first_match_s = time.perf_counter() - start
+
+        unchanged = timed(system.refresh, 200)
+
+        # One enrollment and one removal by "another worker", picked up as deltas
+        enroll, remove = [], []
+        for n in range(20):
+            store.add(synthetic.student_id(size + n), synthetic.encodings([size + n], args.seed))
+            start = time.perf_counter()
+            system.refresh()
+            enroll.append(time.perf_counter() - start)
+            store.remove(synthetic.student_id(n))
+            start = time.perf_counter()
+            system.refresh()
+            remove.append(time.perf_counter() - start)
+
+        size_bytes = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        results[str(size)] = {
+            'build_s': round(build_s, 4),
+            'build_rows_per_s': round(size / build_s, 1),
+            'load_s': round(load_s, 4),
+            'first_match_s': round(first_match_s, 4),
+            'store_mb': round(size_bytes / 2 ** 20, 2),
+            'refresh_unchanged': summarize(unchanged),
+            'refresh_after_enroll': summarize(enroll),
+            'refresh_after_remove': summarize(remove),
+        }
+        del system
+        shutil.rmtree(directory)
+    return results
+
+
+def bench_scan(args, scratch):
+    import cv2
+    from utils.detection import StageTimer
+    from utils.encoding_store import EncodingStore
+    from utils.face_utils import FaceRecognitionSystem
+    from utils.recognition_cache import RecognitionCache
+
+    directory = os.path.join(scratch, 'scan_store')
+    os.makedirs(directory)
+    store = EncodingStore(directory)
+    synthetic.build_store(store, args.scan_gallery, args.seed)
+    system = FaceRecognitionSystem(store=store, cache=RecognitionCache(ttl=0))
+
+    if args.recognition == 'stub':
+        indexes = np.random.default_rng(args.seed).integers(0, args.scan_gallery, 50)
+        frames = [synthetic.frame(int(i), args.seed) for i in indexes]
+    else:
+        with open(args.image, 'rb') as f:
+            frames = [f.read()]
+        image = cv2.cvtColor(cv2.imdecode(np.frombuffer(frames[0], np.uint8), cv2.IMREAD_COLOR), cv2.COLOR_BGR2RGB)
+        encoding, error = system.encode_enrollment_image(image)
+        if error:
+            raise RuntimeError(f"--image: {error}")
+        store.add('SCAN_PROBE', encoding)
+    images = [cv2.cvtColor(cv2.imdecode(np.frombuffer(f, np.uint8), cv2.IMREAD_COLOR), cv2.COLOR_BGR2RGB)
+              for f in frames]
+
+    system.recognize_face(images[0])
+    durations, stages, recognized = [], {}, 0
+    for n in range(args.queries):
+        timer = StageTimer()
+        start = time.perf_counter()
+        student_id, _, _ = system.recognize_face(images[n % len(images)], timer)
+        durations.append(time.perf_counter() - start)
+        recognized += student_id is not None
+        for stage, ms in timer.timings.items():
+            stages[stage] = stages.get(stage, 0.0) + ms
+
+    return {
+        'recognition': args.recognition,
+        'gallery': len(system.gallery),
+        'recognized_rate': round(recognized / args.queries, 4),
+        'latency': summarize(durations),
+        'stage_mean_ms': {stage: round(ms / args.queries, 3) for stage, ms in sorted(stages.items())},
+    }
+
+
+def bench_quality(args, scratch):
+    import cv2
+    from utils.quality import QualityFilter
+
+    quality = QualityFilter(checks='exposure,blur,face_size,liveness')
+    frame = cv2.imdecode(np.frombuffer(synthetic.frame(1, args.seed), np.uint8), cv2.IMREAD_COLOR)
+    results = {'latency': {}, 'verdicts': {}}
+    for width, height in [(640, 480), (1280, 720), (1920, 1080)]:
+        image = cv2.resize(frame, (width, height))
+        # Alternate two frames so liveness compares and passes every time
+        frames = [image, cv2.flip(image, 1)]
+        count = iter(range(10 ** 9))
+        results['latency'][f"{width}x{height}"] = summarize(
+            timed(lambda: quality.check_frame(frames[next(count) % 2], 'bench'), args.queries))
+
+    variants = {
+        'sharp': frame,
+        'dark': (frame * 0.1).astype(np.uint8),
+        'overexposed': cv2.convertScaleAbs(frame, alpha=1.0, beta=200),
+        'gaussian_blur': cv2.GaussianBlur(frame, (31, 31), 0),
+        # Diagonal shake: the frame's index blocks keep sharp edges along a purely horizontal or vertical smear
+        'motion_blur': cv2.filter2D(frame, -1, np.eye(31) / 31),
+    }
+    for name, image in variants.items():
+        results['verdicts'][name] = quality.check_frame(image) or 'ok'
+    return results
+
+
+def bench_checkins(args, scratch):
+    from config import Config
+    from models import Attendance
+
+    path = os.path.join(scratch, 'checkins.db')
+    students = max(1, args.checkins // 5)
+    synthetic.build_database(path, students)
+    Config.DATABASE_PATH = path
+
+    # Distinct (student, date) pairs, so every call is an insert
+    first_day = date(2020, 1, 1)
+    durations = []
+    start = time.perf_counter()
+    for n in range(args.checkins):
+        day = (first_day + timedelta(days=n // students)).isoformat()
+        began = time.perf_counter()
+        Attendance.mark_present(synthetic.student_id(n % students), 0.7, day)
+        durations.append(time.perf_counter() - began)
+    single_s = time.perf_counter() - start
+
+    batch, rows = 100, []
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    for n in range(args.checkins):
+        day = (first_day + timedelta(days=1000 + n // students)).isoformat()
+        rows.append((synthetic.student_id(n % students), day, 0.7, now))
+    start = time.perf_counter()
+    for offset in range(0, len(rows), batch):
+        Attendance.write_checkins(rows[offset:offset + batch])
+    batched_s = time.perf_counter() - start
+
+    return {
+        'mark_present_per_s': round(args.checkins / single_s, 1),
+        'mark_present': summarize(durations),
+        f'write_checkins_{batch}_rows_per_s': round(len(rows) / batched_s, 1),
+    }
+
+
+def bench_dashboard(args, scratch):
+    from config import Config
+    from models import Attendance, Student
+
+    path = os.path.join(scratch, 'history.db')
+    start = time.perf_counter()
+    rows = synthetic.build_database(path, args.db_students, args.db_days, seed=args.seed)
+    build_s = time.perf_counter() - start
+    Config.DATABASE_PATH = path
+
+    today = date.today()
+    month_ago = (today - timedelta(days=29)).isoformat()
+    year_ago = (today - timedelta(days=364)).isoformat()
+    today = today.isoformat()
+    queries = {
+        'statistics': Attendance.get_statistics,
+        'department_statistics': Attendance.get_department_statistics,
+        'today_attendance_50': lambda: Attendance.get_today_attendance(limit=50),
+        'today_attendance_all': Attendance.get_today_attendance,
+        'attendance_version': Attendance.get_version,
+        'students_all': Student.get_all,
+        'history_page_100': lambda: list(Attendance.iter_history(month_ago, today, limit=100)),
+        'history_month_all': lambda: sum(1 for _ in Attendance.iter_history(month_ago, today)),
+        'student_rollup_30d': lambda: list(Attendance.iter_student_rollup(month_ago, today)),
+        'department_rollup_365d': lambda: list(Attendance.iter_department_rollup(year_ago, today)),
+    }
+    results = {
+        'rows': rows,
+        'build_s': round(build_s, 3),
+        'database_mb': round(os.path.getsize(path) / 2 ** 20, 2),
+    }
+    for name, query in queries.items():
+        results[name] = summarize(timed(query, args.repeat))
+    return results
+
+
+def rush_schedule(students, seconds, retry_rate, unknown_rate, seed):
+    """
+    (seconds from start, student index) of every scan in a gate rush:
+    arrivals peak shortly before the bell, some students are scanned twice
+    (a kiosk retry), and some faces are not enrolled at all
+    """
+    rng = np.random.default_rng(seed)
+    arrivals = np.clip(rng.normal(0.6 * seconds, seconds / 5, students), 0, seconds)
+    events = [(float(t), i) for i, t in enumerate(arrivals)]
+    for i in np.flatnonzero(rng.random(students) < retry_rate):
+        events.append((min(seconds, float(arrivals[i] + rng.uniform(0.5, 2.0))), int(i)))
+    for n in range(int(students * unknown_rate)):
+        events.append((float(rng.uniform(0, seconds)), students + n))
+    events.sort()
+    return events
+
+
+async def replay(host, port, events, bodies, connections):
+    from benchmarks.load_test import read_response
+    queue = asyncio.Queue()
+    for event in events:
+        queue.put_nowait(event)
+    results = []
+    started = time.perf_counter()
+
+    async def connection():
+        reader = writer = None
+        while not queue.empty():
+            at, index = queue.get_nowait()
+            delay = started + at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            body = bodies[index]
+            head = (f"POST /api/attendance/mark HTTP/1.1\r\nHost: {host}:{port}\r\n"
+                    f"Content-Type: image/jpeg\r\nContent-Length: {len(body)}\r\n\r\n")
+            sent = time.perf_counter()
+            status, keep_alive, response = 0, False, b''
+            # A keep-alive connection the server timed out fails on first use; reconnect once, as clients do
+            for attempt in range(2):
+                try:
+                    if writer is None:
+                        reader, writer = await asyncio.open_connection(host, port)
+                    writer.write(head.encode('latin-1') + body)
+                    await writer.drain()
+                    status, keep_alive, response = await read_response(reader, with_body=True)
+                    break
+                except (ConnectionError, asyncio.IncompleteReadError, OSError):
+                    if writer is not None:
+                        writer.close()
+                    reader = writer = None
+            done = time.perf_counter()
+            try:
+                recognized = bool(json.loads(response).get('recognized'))
+            except ValueError:
+                recognized = False
+            results.append((index, status, recognized, done - (started + at), done - sent))
+            if not keep_alive and writer is not None:
+                writer.close()
+                reader = writer = None
+        if writer is not None:
+            writer.close()
+
+    await asyncio.gather(*(connection() for _ in range(connections)))
+    return results, time.perf_counter() - started
+
+
+def bench_rush(args, scratch):
+    from benchmarks.load_test import wait_healthy
+    from utils.encoding_store import EncodingStore
+
+    directory = os.path.join(scratch, 'rush')
+    store_dir = os.path.join(directory, 'face_encodings')
+    os.makedirs(store_dir)
+    database = os.path.join(directory, 'attendance.db')
+    synthetic.build_database(database, args.rush_students)
+    synthetic.build_store(EncodingStore(store_dir), args.rush_students, args.seed)
+
+    events = rush_schedule(args.rush_students, args.rush_seconds, 0.2, 0.05, args.seed)
+    bodies = {index: synthetic.frame(index, args.seed) for index in {i for _, i in events}}
+
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ,
+               DATABASE_PATH=database,
+               FACE_ENCODINGS_DIR=store_dir,
+               ATTENDANCE_JOURNAL_DIR=os.path.join(directory, 'journal'),
+               METRICS_DIR=os.path.join(directory, 'metrics'),
+               BULK_IMPORT_DIR=os.path.join(directory, 'bulk_imports'),
+               BENCH_SEED=str(args.seed),
+               STUB_RECOGNITION_MS=str(args.stub_ms),
+               RECOGNITION_WORKERS='0',
+               ENCODE_BATCHING='False',
+               GUNICORN_WORKERS=str(args.workers),
+               GUNICORN_BIND=f"127.0.0.1:{args.port}")
+    command = ['gunicorn', '-c', 'gunicorn.conf.py', 'benchmarks.stub_recognition:create_app()']
+    process = subprocess.Popen(command, cwd=backend_dir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_healthy(f"http://127.0.0.1:{args.port}"):
+            raise RuntimeError(f"server did not become healthy ({' '.join(command)})")
+        results, elapsed = asyncio.run(replay('127.0.0.1', args.port, events, bodies, args.connections))
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    statuses = {}
+    for _, status, _, _, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    enrolled = [recognized for index, _, recognized, _, _ in results if index < args.rush_students]
+    return {
+        'scans': len(results),
+        'offered_rps': round(len(events) / args.rush_seconds, 2),
+        'peak_offered_rps': max(np.histogram([at for at, _ in events],
+                                             bins=max(1, int(args.rush_seconds)))[0].tolist()),
+        'elapsed_s': round(elapsed, 3),
+        'statuses': statuses,
+        'recognized_rate': round(sum(enrolled) / max(1, len(enrolled)), 4),
+        'false_accepts': sum(recognized for index, _, recognized, _, _ in results if index >= args.rush_students),
+        'latency': summarize([r[3] for r in results]),
+        'service': summarize([r[4] for r in results]),
+    }
+
+
+def git_revision(directory):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=directory, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=directory,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(dirty)
+
+
+def flatten(tree, prefix=''):
+    values = {}
+    for key, value in tree.items():
+        name = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            values.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[name] = value
+    return values
+
+
+def print_comparison(base, current):
+    """Every numeric result present in both runs, with the relative change"""
+    before, after = flatten(base['results']), flatten(current['results'])
+    print(f"base {str(base['meta'].get('commit'))[:10]} -> current {str(current['meta'].get('commit'))[:10]}")
+    print(f"{'metric':<58} {'base':>12} {'current':>12} {'change':>9}")
+    for name in sorted(before.keys() & after.keys()):
+        if name.endswith('.count'):
+            continue
+        old, new = before[name], after[name]
+        change = f"{(new - old) / old * 100:+.1f}%" if old else ''
+        print(f"{name:<58} {old:>12g} {new:>12g} {change:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument('--quick', action='store_true', help='small sizes, for a run of a minute or two')
+    parser.add_argument('--recognition', choices=['stub', 'dlib'], default='stub')
+    parser.add_argument('--image', help='photo with one face for `scan` with --recognition dlib')
+    parser.add_argument('--stub-ms', type=float, default=0.0, help='simulated cost of detection and of each encoding')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--gallery-sizes', type=int, nargs='+')
+    parser.add_argument('--store-sizes', type=int, nargs='+')
+    parser.add_argument('--queries', type=int, help='probes per gallery size, scans for `scan`')
+    parser.add_argument('--scan-gallery', type=int, help='enrolled students for `scan`')
+    parser.add_argument('--checkins', type=int, help='check-ins per variant for `checkins`')
+    parser.add_argument('--db-students', type=int)
+    parser.add_argument('--db-days', type=int, help='school days of history for `dashboard`')
+    parser.add_argument('--repeat', type=int, default=20, help='runs of each dashboard query')
+    parser.add_argument('--rush-students', type=int)
+    parser.add_argument('--rush-seconds', type=float)
+    parser.add_argument('--connections', type=int, default=64, help='client connections for `rush`')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers for `rush`')
+    parser.add_argument('--port', type=int, default=5300)
+    parser.add_argument('--output', help='write the JSON results here instead of stdout')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    args = parser.parse_args()
+
+    for name, value in PROFILES['quick' if args.quick else 'full'].items():
+        if getattr(args, name) is None:
+            setattr(args, name, value)
+    if 'scan' in args.only and args.recognition == 'dlib' and not args.image:
+        parser.error('--recognition dlib needs --image for the scan benchmark')
+
+    if args.recognition == 'stub':
+        from benchmarks import stub_recognition
+        stub_recognition.install()
+    os.environ['BENCH_SEED'] = str(args.seed)
+
+    from config import Config
+    scratch = tempfile.mkdtemp(prefix='ams-bench-')
+    # Nothing the benchmarks write may land next to the real data
+    Config.FACE_INDEX_PATH = os.path.join(scratch, 'face_index.npz')
+    Config.ATTENDANCE_JOURNAL_DIR = os.path.join(scratch, 'journal')
+
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    commit, dirty = git_revision(backend_dir)
+    report = {
+        'meta': {
+            'commit': commit,
+            'dirty': dirty,
+            'started': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'args': vars(args),
+        },
+        'results': {},
+    }
+    runners = {
+        'gallery': bench_gallery,
+        'store': bench_store,
+        'scan': bench_scan,
+        'quality': bench_quality,
+        'checkins': bench_checkins,
+        'dashboard': bench_dashboard,
+        'rush': bench_rush,
+    }
+    try:
+        for name in args.only:
+            print(f"running {name}...", file=sys.stderr)
+            start = time.perf_counter()
+            report['results'][name] = runners[name](args, scratch)
+            print(f"  {name} took {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    elif not args.compare:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
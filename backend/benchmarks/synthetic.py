@@ -0,0 +1,180 @@
+"""
+Synthetic data for the benchmarks: encodings, encoding stores, attendance
+databases and scan frames, all reproducible from a seed and without any
+face photos or dlib models
+
+Encodings are a deterministic function of (seed, student index), so a
+process that only knows the index (the recognition stub serving a load
+test) computes the same vector the gallery was built from. Different
+students are about 0.8 apart, like real dlib encodings of different
+people, well outside the 0.6 tolerance.
+
+Scan frames carry the student index as a row of black and white blocks
+along their top edge, which survives JPEG and half-resolution decoding;
+see benchmarks/stub_recognition.py.
+
+Also usable on its own to build a database for manual testing
+(from backend/):
+    python -m benchmarks.synthetic --database /tmp/ams.db --store /tmp/encodings --students 2000 --days 730
+"""
+import argparse
+import os
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+import cv2
+import numpy as np
+
+ENCODING_DIM = 128
+DEPARTMENTS = ['Computer Science', 'Electronics', 'Mechanical', 'Civil', 'Electrical', 'Chemical',
+               'Mathematics', 'Physics']
+
+FRAME_SIZE = (640, 480)
+BLOCK = 16
+INDEX_BITS = 24
+
+
+def student_id(index):
+    return f"S{index:07d}"
+
+
+def encodings(indexes, seed=0, chunk=65536):
+    """
+    Encodings of the given student indexes, shaped (len(indexes), 128) float32
+    Each dimension is a sine of the index at a seeded frequency and phase,
+    so any single row can be recomputed without generating the others
+    """
+    rng = np.random.default_rng(seed)
+    frequencies = rng.uniform(0, 1e4, ENCODING_DIM)
+    phases = rng.uniform(0, 2 * np.pi, ENCODING_DIM)
+    indexes = np.asarray(indexes, dtype=np.float64).reshape(-1)
+    out = np.empty((len(indexes), ENCODING_DIM), dtype=np.float32)
+    # Per-dimension std of 0.05 puts two students about 0.8 apart
+    for start in range(0, len(indexes), chunk):
+        block = indexes[start:start + chunk, None] * frequencies + phases
+        out[start:start + chunk] = 0.0707 * np.sin(block)
+    return out
+
+
+def probe(index, seed=0, noise=0.02):
+    """A second 'photo' of a student: their encoding plus a fixed per-student offset (about 0.23 away)"""
+    offset = np.random.default_rng([seed, index]).normal(0, noise, ENCODING_DIM).astype(np.float32)
+    return encodings([index], seed)[0] + offset
+
+
+def build_store(store, count, seed=0, chunk=50000):
+    """Enroll students 0..count-1 into an EncodingStore; returns seconds taken"""
+    start = time.perf_counter()
+    for first in range(0, count, chunk):
+        indexes = np.arange(first, min(count, first + chunk))
+        matrix = encodings(indexes, seed)
+        store.add_many((student_id(i), row) for i, row in zip(indexes, matrix))
+    return time.perf_counter() - start
+
+
+def build_database(path, students, days=0, rate=0.85, seed=0, end=None):
+    """
+    Create a database with `students` active students and `days` school days
+    (weekdays up to and including `end`, default today) of check-ins, each
+    student present with probability `rate`, arriving between 8:00 and 9:30
+    Returns: number of attendance rows
+    """
+    from config import Config
+    import models
+    Config.DATABASE_PATH = path
+    models.init_db()
+
+    rng = np.random.default_rng(seed)
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            conn.executemany(
+                'INSERT OR IGNORE INTO students (student_id, name, department, email) VALUES (?, ?, ?, ?)',
+                ((student_id(i), f"Student {i}", DEPARTMENTS[i % len(DEPARTMENTS)], f"s{i}@example.edu")
+                 for i in range(students)))
+
+        rows = 0
+        end = end or date.today()
+        day = end
+        remaining = days
+        while remaining > 0:
+            # `end` itself always has check-ins, so "today" queries have data on weekends too
+            if day.weekday() < 5 or day == end:
+                present = np.flatnonzero(rng.random(students) < rate)
+                # Arrivals bunch up before the 9:00 bell
+                seconds = np.clip(rng.normal(45 * 60, 15 * 60, len(present)), 0, 90 * 60).astype(int)
+                morning = datetime.combine(day, datetime.min.time()) + timedelta(hours=8)
+                confidences = rng.uniform(0.55, 0.8, len(present)).round(4)
+                with conn:
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO attendance (student_id, check_in_time, date, status, confidence) "
+                        "VALUES (?, ?, ?, 'Present', ?)",
+                        ((student_id(int(i)), (morning + timedelta(seconds=int(s))).strftime('%Y-%m-%d %H:%M:%S'),
+                          day.isoformat(), float(c))
+                         for i, s, c in zip(present, seconds, confidences)))
+                rows += len(present)
+                remaining -= 1
+            day -= timedelta(days=1)
+    finally:
+        conn.close()
+    return rows
+
+
+def frame(index, seed=0, quality=90):
+    """
+    JPEG scan frame of one student: a smooth background (so decoding costs
+    about what a camera frame does) with the index encoded in blocks
+    The background differs per student, as faces do, so the recognition
+    cache's crop hash tells students apart. Index -1 gives a frame without a face
+    """
+    width, height = FRAME_SIZE
+    rng = np.random.default_rng([seed, index + 1])
+    small = rng.integers(40, 200, (height // 16, width // 16, 3), dtype=np.uint8)
+    image = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    if index >= 0:
+        # Block 0 is the "face present" marker, then the index bits, least significant first
+        bits = [1] + [(index >> b) & 1 for b in range(INDEX_BITS)]
+        for position, bit in enumerate(bits):
+            image[0:BLOCK, position * BLOCK:(position + 1) * BLOCK] = 255 if bit else 0
+    else:
+        image[0:BLOCK, 0:BLOCK] = 0
+    ok, data = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return data.tobytes()
+
+
+def read_frame_index(image):
+    """Student index encoded in a decoded frame (at any scale), or None if it carries no face"""
+    block = image.shape[1] / FRAME_SIZE[0] * BLOCK
+    row = int(block / 2)
+
+    def bit(position):
+        return image[row, int((position + 0.5) * block)].mean() > 127
+
+    if not bit(0):
+        return None
+    return sum(1 << b for b in range(INDEX_BITS) if bit(b + 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', help='SQLite file to create')
+    parser.add_argument('--store', help='encoding store directory to create')
+    parser.add_argument('--students', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=365, help='school days of attendance history')
+    parser.add_argument('--rate', type=float, default=0.85, help='share of students present each day')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.database:
+        start = time.perf_counter()
+        rows = build_database(args.database, args.students, args.days, args.rate, args.seed)
+        print(f"{args.database}: {args.students} students, {rows} check-ins in {time.perf_counter() - start:.1f}s")
+    if args.store:
+        from utils.encoding_store import EncodingStore
+        os.makedirs(args.store, exist_ok=True)
+        seconds = build_store(EncodingStore(args.store), args.students, args.seed)
+        print(f"{args.store}: {args.students} encodings in {seconds:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
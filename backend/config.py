@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,13 +10,97 @@ class Config:
     DEBUG = os.getenv('DEBUG', 'False') == 'True'
     
     # Database
-    DATABASE_PATH = os.path.join(os.path.dirname(__file__), 'database', 'attendance.db')
+    DATABASE_PATH = os.getenv('DATABASE_PATH', os.path.join(os.path.dirname(__file__), 'database', 'attendance.db'))
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '8'))  # idle connections kept per worker; 0 disables pooling
+    DB_BUSY_TIMEOUT = float(os.getenv('DB_BUSY_TIMEOUT', '5'))  # seconds to wait on a locked database
+    DB_CACHE_SIZE_KB = int(os.getenv('DB_CACHE_SIZE_KB', '16384'))
+    DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', str(256 * 1024 * 1024)))
+    DB_STATEMENT_CACHE = int(os.getenv('DB_STATEMENT_CACHE', '256'))
     
     # Face Recognition
-    FACE_ENCODINGS_DIR = os.path.join(os.path.dirname(__file__), 'face_encodings')
-    TOLERANCE = float(os.getenv('FACE_TOLERANCE', '0.6'))
+    FACE_ENCODINGS_DIR = os.getenv('FACE_ENCODINGS_DIR', os.path.join(os.path.dirname(__file__), 'face_encodings'))
+    TOLERANCE = float(os.getenv('FACE_TOLERANCE', '0.6'))  # 0.5 holds up once students enroll with several samples
     MODEL = os.getenv('FACE_MODEL', 'hog')  # hog or cnn (cnn is more accurate but slower)
     
+    # Face detection for scans: HOG/CNN runs on a copy downscaled by this factor, encodings use full resolution
+    # 0.5 halves detection time but misses faces under about 80px; enrollment always detects at full scale
+    DETECTION_SCALE = float(os.getenv('FACE_DETECTION_SCALE', '1.0'))
+    DETECTION_UPSAMPLE = int(os.getenv('FACE_DETECTION_UPSAMPLE', '1'))
+    # Decode scan uploads at half resolution (cheap for JPEG); detection then skips its own downscale
+    DECODE_REDUCED = os.getenv('FACE_DECODE_REDUCED', 'False') == 'True'
+    # Optional cascade pre-filter before dlib: '' (off), 'haar', or a path to a Haar/LBP cascade XML
+    PREFILTER_CASCADE = os.getenv('FACE_PREFILTER_CASCADE', '')
+    PREFILTER_MIN_FACE = int(os.getenv('FACE_PREFILTER_MIN_FACE', '60'))  # pixels at full resolution
+    
+    # Frame quality pre-filter: reject unusable scan frames before detection, with a reason code for the kiosk
+    # Checks: exposure, blur, face_size, liveness (a static-frame heuristic, so not on by default); empty disables
+    QUALITY_CHECKS = os.getenv('QUALITY_CHECKS', 'exposure,blur,face_size')
+    QUALITY_MIN_BRIGHTNESS = float(os.getenv('QUALITY_MIN_BRIGHTNESS', '40'))  # mean gray level, 0-255
+    QUALITY_MAX_BRIGHTNESS = float(os.getenv('QUALITY_MAX_BRIGHTNESS', '220'))
+    QUALITY_MAX_CLIPPED = float(os.getenv('QUALITY_MAX_CLIPPED', '0.4'))  # max share of black or blown-out pixels
+    QUALITY_BLUR_THRESHOLD = float(os.getenv('QUALITY_BLUR_THRESHOLD', '30'))  # Laplacian variance at 320x240
+    QUALITY_MIN_FACE = float(os.getenv('QUALITY_MIN_FACE', '0.12'))  # min face side as a share of frame height
+    QUALITY_LIVENESS_MIN_DIFF = float(os.getenv('QUALITY_LIVENESS_MIN_DIFF', '1.0'))  # mean gray change between frames
+    QUALITY_LIVENESS_WINDOW = float(os.getenv('QUALITY_LIVENESS_WINDOW', '5'))  # seconds a previous frame counts
+    
+    # Streaming scan sessions: full detection every Nth frame, OpenCV trackers in between
+    TRACK_DETECT_EVERY = int(os.getenv('TRACK_DETECT_EVERY', '5'))
+    TRACK_MIN_CONFIDENCE = float(os.getenv('TRACK_MIN_CONFIDENCE', '0.5'))  # re-encode tracks below this
+    TRACK_REVERIFY_FRAMES = int(os.getenv('TRACK_REVERIFY_FRAMES', '30'))  # re-encode identified tracks this often
+    TRACK_IOU = float(os.getenv('TRACK_IOU', '0.3'))  # overlap for a detection to continue a track
+    TRACKER = os.getenv('TRACKER', 'kcf')  # kcf or csrt (need opencv-contrib), mil
+    TRACK_SESSION_TTL = int(os.getenv('TRACK_SESSION_TTL', '60'))  # seconds without frames before a session expires
+    TRACK_MAX_SESSIONS = int(os.getenv('TRACK_MAX_SESSIONS', '64'))  # per worker
+    
+    # Recognition cache: reuse results for a face seen in the last few seconds (0 disables)
+    RECOGNITION_CACHE_TTL = float(os.getenv('RECOGNITION_CACHE_TTL', '10'))
+    RECOGNITION_CACHE_SIZE = int(os.getenv('RECOGNITION_CACHE_SIZE', '256'))
+    RECOGNITION_CACHE_HASH_BITS = int(os.getenv('RECOGNITION_CACHE_HASH_BITS', '4'))  # max differing bits of the 64-bit face hash
+    RECOGNITION_CACHE_DISTANCE = float(os.getenv('RECOGNITION_CACHE_DISTANCE', '0.35'))  # well inside FACE_TOLERANCE
+    CHECKIN_DEDUP_SECONDS = float(os.getenv('CHECKIN_DEDUP_SECONDS', '60'))  # skip repeat writes for a student (0 disables)
+    
+    # Per-worker cache of student records for recognized faces
+    ROSTER_CACHE_SIZE = int(os.getenv('ROSTER_CACHE_SIZE', '10000'))  # students kept in memory (0 disables)
+    ROSTER_CACHE_CHECK_SECONDS = float(os.getenv('ROSTER_CACHE_CHECK_SECONDS', '1'))  # max staleness after another worker's change
+    
+    # Recognition worker processes (0 runs recognition in the request thread)
+    # Each gunicorn worker starts its own pool, so run fewer (threaded) web workers when enabling it
+    RECOGNITION_WORKERS = int(os.getenv('RECOGNITION_WORKERS', '0'))
+    RECOGNITION_QUEUE_SIZE = int(os.getenv('RECOGNITION_QUEUE_SIZE', '0'))  # queued + running jobs; 0 = 4 per worker
+    RECOGNITION_TIMEOUT = float(os.getenv('RECOGNITION_TIMEOUT', '10'))  # per-request deadline, seconds
+    RECOGNITION_RETRY_AFTER = int(os.getenv('RECOGNITION_RETRY_AFTER', '1'))  # Retry-After sent with 429/503
+    
+    # Micro-batch encoding and matching across concurrent requests in one process (threaded workers)
+    ENCODE_BATCHING = os.getenv('ENCODE_BATCHING', 'False') == 'True'
+    ENCODE_BATCH_SIZE = int(os.getenv('ENCODE_BATCH_SIZE', '16'))  # max faces per batch
+    ENCODE_BATCH_WAIT_MS = float(os.getenv('ENCODE_BATCH_WAIT_MS', '5'))  # max wait for a batch to fill
+    
+    # Multi-sample enrollment: samples are reduced to a medoid plus exemplars covering the outliers
+    TEMPLATE_SIZE = int(os.getenv('TEMPLATE_SIZE', '4'))  # max gallery rows per student
+    TEMPLATE_COVERAGE = float(os.getenv('TEMPLATE_COVERAGE', '0.3'))  # samples closer than this to a row add nothing
+    ENROLL_MAX_IMAGES = int(os.getenv('ENROLL_MAX_IMAGES', '10'))  # photos accepted per enrollment request
+    
+    # Bulk enrollment (scripts/bulk_import.py and POST /api/enroll/bulk)
+    # Imports started over the API share the CPUs with scans, so the pool stays small (the CLI uses every CPU)
+    BULK_IMPORT_WORKERS = int(os.getenv('BULK_IMPORT_WORKERS', '2'))  # encoding processes; 0 = one per CPU
+    BULK_IMPORT_CHUNK = int(os.getenv('BULK_IMPORT_CHUNK', '500'))  # students written per store pass / transaction
+    BULK_IMPORT_DIR = os.getenv('BULK_IMPORT_DIR', os.path.join(os.path.dirname(__file__), 'bulk_imports'))
+    
+    # Face search index: exact (brute force) or ivf (approximate, for very large galleries)
+    FACE_INDEX = os.getenv('FACE_INDEX', 'exact')
+    FACE_INDEX_PATH = os.getenv('FACE_INDEX_PATH', '')  # saved ivf index; empty = face_index.npz in the encoding store directory
+    FACE_INDEX_MIN_SIZE = int(os.getenv('FACE_INDEX_MIN_SIZE', '10000'))  # use exact search below this
+    FACE_INDEX_NLIST = int(os.getenv('FACE_INDEX_NLIST', '0'))  # 0 = about 4 * sqrt(gallery size)
+    FACE_INDEX_NPROBE = int(os.getenv('FACE_INDEX_NPROBE', '16'))  # higher = better recall, slower
+    
+    # Startup warm-up (face models, gallery, one dummy scan) before /api/health reports healthy:
+    # background (create_app starts it on a thread), hooks (gunicorn.conf.py runs it) or off
+    WARMUP = os.getenv('WARMUP', 'background')
+    
+    # ASGI entry point (asgi.py): threads for decoding and recognition of scans, and for the Flask routes
+    ASGI_THREADS = int(os.getenv('ASGI_THREADS', '16'))
+    ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', '16'))  # keep above STREAM_MAX_CLIENTS
+    
     # AWS S3 (Optional)
     USE_S3 = os.getenv('USE_S3', 'False') == 'True'
     S3_BUCKET = os.getenv('S3_BUCKET', '')
@@ -26,4 +111,34 @@ class Config:
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
     
     # Attendance
-    ATTENDANCE_WINDOW_HOURS = 24  # Mark attendance within 24 hours
\ No newline at end of file
+    ATTENDANCE_WINDOW_HOURS = 24  # Mark attendance within 24 hours
+    
+    # Attendance reports (/api/reports)
+    REPORT_PAGE_SIZE = int(os.getenv('REPORT_PAGE_SIZE', '100'))  # JSON page size unless ?limit= is given
+    REPORT_MAX_PAGE_SIZE = int(os.getenv('REPORT_MAX_PAGE_SIZE', '1000'))
+    REPORT_FETCH_SIZE = int(os.getenv('REPORT_FETCH_SIZE', '500'))  # rows fetched from SQLite per batch when streaming
+    
+    # Metrics (/api/metrics): each worker writes its values here so any worker can serve a merged scrape
+    METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'ams-metrics'))  # empty = this worker only
+    METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', '5'))
+    # Slow request profiler: sample the stack of scan requests and log those slower than this (0 disables)
+    METRICS_PROFILE_SLOW_MS = float(os.getenv('METRICS_PROFILE_SLOW_MS', '0'))
+    METRICS_PROFILE_INTERVAL_MS = float(os.getenv('METRICS_PROFILE_INTERVAL_MS', '10'))
+    METRICS_PROFILE_DIR = os.getenv('METRICS_PROFILE_DIR', '')  # append folded stacks of slow requests here
+    
+    # Live attendance stream (Server-Sent Events)
+    STREAM_POLL_SECONDS = float(os.getenv('STREAM_POLL_SECONDS', '2'))  # catches check-ins from other workers
+    STREAM_KEEPALIVE_SECONDS = float(os.getenv('STREAM_KEEPALIVE_SECONDS', '15'))
+    STREAM_MAX_SECONDS = float(os.getenv('STREAM_MAX_SECONDS', '300'))  # clients reconnect automatically
+    # Each open stream holds a request thread: keep well below GUNICORN_THREADS so scans always find one (0 = no cap)
+    STREAM_MAX_CLIENTS = int(os.getenv('STREAM_MAX_CLIENTS', '2'))  # per worker
+    STREAM_RETRY_AFTER = int(os.getenv('STREAM_RETRY_AFTER', '30'))  # Retry-After sent with 503 above the cap
+    
+    # Write-behind check-ins: queue in memory and commit in groups from a background thread
+    ATTENDANCE_WRITE_BEHIND = os.getenv('ATTENDANCE_WRITE_BEHIND', 'False') == 'True'
+    ATTENDANCE_FLUSH_MS = int(os.getenv('ATTENDANCE_FLUSH_MS', '50'))
+    ATTENDANCE_FLUSH_ROWS = int(os.getenv('ATTENDANCE_FLUSH_ROWS', '200'))
+    ATTENDANCE_QUEUE_MAX = int(os.getenv('ATTENDANCE_QUEUE_MAX', '10000'))  # flush inline beyond this
+    # Journal of queued check-ins replayed after a crash; empty to disable
+    ATTENDANCE_JOURNAL_DIR = os.getenv('ATTENDANCE_JOURNAL_DIR',
+                                       os.path.join(os.path.dirname(__file__), 'database', 'journal'))
\ No newline at end of file
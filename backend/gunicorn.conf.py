@@ -0,0 +1,47 @@
+"""
+gunicorn settings for the attendance API
+
+    cd backend && gunicorn                        (gunicorn reads ./gunicorn.conf.py by default)
+    gunicorn -c backend/gunicorn.conf.py          (from the repository root, as in the Dockerfile)
+
+The app is preloaded in the master, which also imports the face models,
+loads the gallery and runs one dummy scan before forking. Workers then share
+those pages copy-on-write instead of each paying seconds for them on their
+first scan. Every worker still runs its own short warm-up (and starts its
+recognition pool, if RECOGNITION_WORKERS is set) before /api/health reports
+it healthy. WARMUP=off in the environment skips all of it.
+"""
+import gc
+import os
+
+# Warm-up is driven by the hooks below instead of by create_app()
+os.environ.setdefault('WARMUP', 'hooks')
+
+chdir = os.path.dirname(os.path.abspath(__file__))
+wsgi_app = 'app:create_app()'
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+# Threaded workers so long-lived /api/attendance/stream connections do not pin a whole worker;
+# STREAM_MAX_CLIENTS caps how many of a worker's threads the streams may hold
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+timeout = 120
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+
+
+def when_ready(server):
+    if not server.cfg.preload_app or os.environ['WARMUP'] != 'hooks':
+        return
+    from utils.warmup import warmup
+    # No recognition pool here: its processes belong to the workers
+    warmup.run(recognition_pool=False)
+    # Move everything loaded so far out of the collector's reach, so GC passes
+    # in the workers do not write to (and so copy) the shared pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if os.environ['WARMUP'] != 'hooks':
+        return
+    from utils.warmup import warmup
+    warmup.start()
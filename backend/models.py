@@ -1,15 +1,19 @@
 import sqlite3
-from datetime import datetime
+from datetime import datetime, timezone
 from config import Config
+from utils.db_utils import get_pool
+from utils.events import attendance_feed
 import logging
 
 logger = logging.getLogger(__name__)
 
 def get_db_connection():
-    """Create database connection"""
-    conn = sqlite3.connect(Config.DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Get a database connection from this worker's pool (close() returns it)"""
+    if Config.DB_POOL_SIZE <= 0:
+        conn = sqlite3.connect(Config.DATABASE_PATH)
+        conn.row_factory = sqlite3.Row
+        return conn
+    return get_pool().acquire()
 
 def init_db():
     """Initialize database with required tables"""
@@ -51,11 +55,100 @@ def init_db():
             date TEXT NOT NULL,
             status TEXT DEFAULT 'Present',
             confidence REAL,
+            seq INTEGER,
             FOREIGN KEY (student_id) REFERENCES students(student_id),
             UNIQUE(student_id, date)
         )
     ''')
     
+    # Indexes for the dashboard queries: today's check-ins newest first, active roster count
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendance_date_time ON attendance(date, check_in_time DESC)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_students_active ON students(is_active, department)')
+    # History reports page by (date, id); SQLite keys every index by rowid last, so this is (date, id)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendance_date ON attendance(date)')
+    
+    # Present counts per date and department, maintained by triggers in the same
+    # transaction as every attendance insert/delete, so statistics never scan attendance
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS daily_summary (
+            date TEXT NOT NULL,
+            department TEXT NOT NULL DEFAULT '',
+            present INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (date, department)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_attendance_summary_insert
+        AFTER INSERT ON attendance
+        BEGIN
+            INSERT INTO daily_summary (date, department, present)
+            VALUES (NEW.date,
+                    COALESCE((SELECT department FROM students WHERE student_id = NEW.student_id), ''),
+                    1)
+            ON CONFLICT(date, department) DO UPDATE SET present = present + 1;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_attendance_summary_delete
+        AFTER DELETE ON attendance
+        BEGIN
+            UPDATE daily_summary SET present = present - 1
+            WHERE date = OLD.date
+              AND department = COALESCE((SELECT department FROM students WHERE student_id = OLD.student_id), '');
+        END
+    ''')
+    
+    # Roster version, bumped by every change to students, so per-worker roster
+    # caches and the students listing's ETag can tell when to reload
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS roster_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO roster_version (id, version) VALUES (1, 0)')
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_students_version_{event.lower()}
+            AFTER {event} ON students
+            BEGIN
+                UPDATE roster_version SET version = version + 1 WHERE id = 1;
+            END
+        ''')
+    
+    # Change sequence for the live feed: every insert or repeat check-in stamps the row
+    # with the next value, in commit order (SQLite serializes writers), whatever its check_in_time
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS attendance_seq (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            seq INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    if 'seq' not in [c['name'] for c in cursor.execute('PRAGMA table_info(attendance)')]:
+        cursor.execute('ALTER TABLE attendance ADD COLUMN seq INTEGER')
+        cursor.execute('UPDATE attendance SET seq = id')
+    cursor.execute('INSERT OR IGNORE INTO attendance_seq (id, seq) SELECT 1, COALESCE(MAX(seq), 0) FROM attendance')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendance_date_seq ON attendance(date, seq)')
+    for event in ('INSERT', 'UPDATE OF check_in_time, confidence'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_attendance_seq_{event.split()[0].lower()}
+            AFTER {event} ON attendance
+            BEGIN
+                UPDATE attendance_seq SET seq = seq + 1 WHERE id = 1;
+                UPDATE attendance SET seq = (SELECT seq FROM attendance_seq WHERE id = 1) WHERE id = NEW.id;
+            END
+        ''')
+    
+    # Backfill the summary for databases that predate it
+    if cursor.execute('SELECT 1 FROM daily_summary LIMIT 1').fetchone() is None:
+        cursor.execute('''
+            INSERT INTO daily_summary (date, department, present)
+            SELECT a.date, COALESCE(s.department, ''), COUNT(*)
+            FROM attendance a
+            LEFT JOIN students s ON a.student_id = s.student_id
+            GROUP BY a.date, COALESCE(s.department, '')
+        ''')
+    
     # Insert default admin user (password: admin123)
     try:
         cursor.execute('''
@@ -69,6 +162,26 @@ def init_db():
     conn.close()
     logger.info("Database tables created successfully")
 
+def stream_query(sql, params=(), batch_size=None):
+    """
+    Yield the rows of a query as dicts, fetching `batch_size` at a time from a
+    server-side cursor, so memory stays flat however many rows match.
+    The connection is held until the generator is exhausted or closed.
+    """
+    batch_size = batch_size or Config.REPORT_FETCH_SIZE
+    conn = get_db_connection()
+    cursor = conn.execute(sql, params)
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for row in rows:
+                yield dict(row)
+    finally:
+        cursor.close()
+        conn.close()
+
 class Student:
     @staticmethod
     def create(student_id, name, department, email, phone, face_encoding_path):
@@ -87,6 +200,27 @@ class Student:
         finally:
             conn.close()
     
+    @staticmethod
+    def create_many(students):
+        """
+        Insert several students in one transaction; ids that already exist are skipped
+        students: iterable of dicts with student_id, name, department, email, phone, face_encoding_path
+        Returns: number of students inserted
+        """
+        rows = [(s['student_id'], s['name'], s['department'], s.get('email', ''), s.get('phone', ''),
+                 s['face_encoding_path']) for s in students]
+        conn = get_db_connection()
+        try:
+            before = conn.total_changes
+            with conn:
+                conn.executemany('''
+                    INSERT OR IGNORE INTO students (student_id, name, department, email, phone, face_encoding_path)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', rows)
+            return conn.total_changes - before
+        finally:
+            conn.close()
+    
     @staticmethod
     def get_all():
         conn = get_db_connection()
@@ -94,12 +228,55 @@ class Student:
         conn.close()
         return [dict(s) for s in students]
     
+    @staticmethod
+    def get_page(after=None, limit=None):
+        """Active students ordered by student_id, the `limit` after student_id `after` (keyset paging)"""
+        conn = get_db_connection()
+        students = conn.execute('''
+            SELECT * FROM students
+            WHERE is_active = 1 AND student_id > ?
+            ORDER BY student_id
+            LIMIT ?
+        ''', (after or '', -1 if limit is None else limit)).fetchall()
+        conn.close()
+        return [dict(s) for s in students]
+    
+    @staticmethod
+    def get_version():
+        """Roster version; changes whenever a student is added, updated or removed"""
+        conn = get_db_connection()
+        row = conn.execute('SELECT version FROM roster_version WHERE id = 1').fetchone()
+        conn.close()
+        return row['version'] if row else 0
+    
     @staticmethod
     def get_by_id(student_id):
         conn = get_db_connection()
         student = conn.execute('SELECT * FROM students WHERE student_id = ?', (student_id,)).fetchone()
         conn.close()
         return dict(student) if student else None
+    
+    @staticmethod
+    def get_many(student_ids):
+        """Fetch several students in one query, keyed by student_id"""
+        student_ids = list(student_ids)
+        if not student_ids:
+            return {}
+        conn = get_db_connection()
+        placeholders = ','.join('?' * len(student_ids))
+        students = conn.execute(f'SELECT * FROM students WHERE student_id IN ({placeholders})',
+                                student_ids).fetchall()
+        conn.close()
+        return {s['student_id']: dict(s) for s in students}
+    
+    @staticmethod
+    def deactivate(student_id):
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute('UPDATE students SET is_active = 0 WHERE student_id = ?', (student_id,))
+        conn.commit()
+        conn.close()
+        return cursor.rowcount > 0
 
 class Attendance:
     @staticmethod
@@ -118,6 +295,7 @@ class Attendance:
                     confidence = excluded.confidence
             ''', (student_id, date, confidence))
             conn.commit()
+            attendance_feed.publish()
             return True
         except Exception as e:
             logger.error(f"Error marking attendance: {e}")
@@ -126,7 +304,44 @@ class Attendance:
             conn.close()
     
     @staticmethod
-    def get_today_attendance():
+    def mark_present_bulk(records, date=None):
+        """
+        Mark several students present in a single transaction
+        records: iterable of (student_id, confidence)
+        """
+        if date is None:
+            date = datetime.now().strftime('%Y-%m-%d')
+        check_in_time = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        return Attendance.write_checkins(
+            (student_id, date, confidence, check_in_time) for student_id, confidence in records)
+    
+    @staticmethod
+    def write_checkins(rows):
+        """
+        Upsert check-ins in one transaction
+        rows: iterable of (student_id, date, confidence, check_in_time)
+        """
+        conn = get_db_connection()
+        try:
+            with conn:
+                conn.executemany('''
+                    INSERT INTO attendance (student_id, date, confidence, check_in_time, status)
+                    VALUES (?, ?, ?, ?, 'Present')
+                    ON CONFLICT(student_id, date) DO UPDATE SET
+                        check_in_time = excluded.check_in_time,
+                        confidence = excluded.confidence
+                ''', list(rows))
+            attendance_feed.publish()
+            return True
+        except Exception as e:
+            logger.error(f"Error writing check-ins: {e}")
+            return False
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def get_today_attendance(limit=None):
+        """Today's check-ins, newest first; limit keeps it to the most recent rows in SQL"""
         today = datetime.now().strftime('%Y-%m-%d')
         conn = get_db_connection()
         records = conn.execute('''
@@ -135,17 +350,50 @@ class Attendance:
             JOIN students s ON a.student_id = s.student_id
             WHERE a.date = ?
             ORDER BY a.check_in_time DESC
-        ''', (today,)).fetchall()
+            LIMIT ?
+        ''', (today, -1 if limit is None else limit)).fetchall()
+        conn.close()
+        return [dict(r) for r in records]
+    
+    @staticmethod
+    def get_changes_since(date, after_seq):
+        """
+        Check-ins of a day written or repeated after a change sequence number, in commit order
+        Unlike check_in_time, seq only grows, so rows committed late (write-behind
+        queues of other workers, journal replays) are not skipped
+        """
+        conn = get_db_connection()
+        records = conn.execute('''
+            SELECT a.*, s.name, s.department
+            FROM attendance a
+            JOIN students s ON a.student_id = s.student_id
+            WHERE a.seq > ? AND a.date = ?
+            ORDER BY a.seq
+        ''', (after_seq, date)).fetchall()
         conn.close()
         return [dict(r) for r in records]
     
+    @staticmethod
+    def get_version(date=None):
+        """Cheap fingerprint of a day's attendance, answered from idx_attendance_date_seq alone"""
+        if date is None:
+            date = datetime.now().strftime('%Y-%m-%d')
+        conn = get_db_connection()
+        row = conn.execute('''
+            SELECT COUNT(*) as count, MAX(seq) as last_seq
+            FROM attendance WHERE date = ?
+        ''', (date,)).fetchone()
+        conn.close()
+        return f"{date}-{row['count']}-{row['last_seq'] or 0}"
+    
     @staticmethod
     def get_statistics():
         today = datetime.now().strftime('%Y-%m-%d')
         conn = get_db_connection()
         
         total_students = conn.execute('SELECT COUNT(*) as count FROM students WHERE is_active = 1').fetchone()['count']
-        present_today = conn.execute('SELECT COUNT(*) as count FROM attendance WHERE date = ?', (today,)).fetchone()['count']
+        present_today = conn.execute('SELECT COALESCE(SUM(present), 0) as count FROM daily_summary WHERE date = ?',
+                                     (today,)).fetchone()['count']
         
         conn.close()
         
@@ -157,4 +405,109 @@ class Attendance:
             'present': present_today,
             'absent': absent,
             'attendance_rate': rate
-        }
\ No newline at end of file
+        }
+    
+    @staticmethod
+    def get_department_statistics(date=None):
+        """Present counts per department for a day, from the maintained summary"""
+        if date is None:
+            date = datetime.now().strftime('%Y-%m-%d')
+        conn = get_db_connection()
+        rows = conn.execute('''
+            SELECT department, present FROM daily_summary
+            WHERE date = ? AND present > 0
+            ORDER BY department
+        ''', (date,)).fetchall()
+        conn.close()
+        return {r['department']: r['present'] for r in rows}
+    
+    @staticmethod
+    def iter_history(start, end, department=None, student_id=None, after=None, limit=None):
+        """
+        Check-ins between two dates (inclusive), oldest first, as a generator
+        after: keyset cursor (date, id) of the last row already returned
+        limit: maximum rows, None for all
+        """
+        sql = '''
+            SELECT a.id, a.date, a.check_in_time, a.student_id, s.name, s.department, a.status, a.confidence
+            FROM attendance a
+            JOIN students s ON a.student_id = s.student_id
+            WHERE a.date BETWEEN ? AND ?
+        '''
+        params = [start, end]
+        if after is not None:
+            sql += ' AND (a.date > ? OR (a.date = ? AND a.id > ?))'
+            params += [after[0], after[0], after[1]]
+        if department:
+            sql += ' AND s.department = ?'
+            params.append(department)
+        if student_id:
+            sql += ' AND a.student_id = ?'
+            params.append(student_id)
+        sql += ' ORDER BY a.date, a.id LIMIT ?'
+        params.append(-1 if limit is None else limit)
+        return stream_query(sql, params)
+    
+    @staticmethod
+    def iter_student_rollup(start, end, department=None):
+        """
+        Per-student totals between two dates, computed in SQL
+        days_recorded counts dates on which anyone checked in, the denominator of the rate
+        """
+        sql = '''
+            WITH days AS (
+                SELECT COUNT(DISTINCT date) AS n FROM daily_summary
+                WHERE date BETWEEN ? AND ? AND present > 0
+            )
+            SELECT s.student_id, s.name, s.department,
+                   COUNT(a.id) AS days_present,
+                   days.n AS days_recorded,
+                   ROUND(100.0 * COUNT(a.id) / NULLIF(days.n, 0), 2) AS attendance_rate,
+                   MIN(a.date) AS first_present,
+                   MAX(a.date) AS last_present,
+                   ROUND(AVG(a.confidence), 2) AS avg_confidence
+            FROM students s
+            CROSS JOIN days
+            LEFT JOIN attendance a ON a.student_id = s.student_id AND a.date BETWEEN ? AND ?
+            WHERE s.is_active = 1
+        '''
+        params = [start, end, start, end]
+        if department:
+            sql += ' AND s.department = ?'
+            params.append(department)
+        sql += ' GROUP BY s.student_id ORDER BY s.department, s.student_id'
+        return stream_query(sql, params)
+    
+    @staticmethod
+    def iter_department_rollup(start, end):
+        """
+        Per-department totals between two dates from the maintained daily summary
+        average_rate compares the average present per recorded day with current enrollment
+        """
+        return stream_query('''
+            WITH days AS (
+                SELECT COUNT(DISTINCT date) AS n FROM daily_summary
+                WHERE date BETWEEN ? AND ? AND present > 0
+            ),
+            enrolled AS (
+                SELECT COALESCE(department, '') AS department, COUNT(*) AS students
+                FROM students WHERE is_active = 1 GROUP BY COALESCE(department, '')
+            ),
+            present AS (
+                SELECT department, SUM(present) AS check_ins, COUNT(*) AS days_with_checkins
+                FROM daily_summary
+                WHERE date BETWEEN ? AND ? AND present > 0
+                GROUP BY department
+            )
+            SELECT d.department,
+                   COALESCE(e.students, 0) AS students,
+                   COALESCE(p.check_ins, 0) AS check_ins,
+                   COALESCE(p.days_with_checkins, 0) AS days_with_checkins,
+                   days.n AS days_recorded,
+                   ROUND(100.0 * COALESCE(p.check_ins, 0) / NULLIF(e.students * days.n, 0), 2) AS average_rate
+            FROM (SELECT department FROM enrolled UNION SELECT department FROM present) d
+            CROSS JOIN days
+            LEFT JOIN enrolled e ON e.department = d.department
+            LEFT JOIN present p ON p.department = d.department
+            ORDER BY d.department
+        ''', (start, end, start, end))
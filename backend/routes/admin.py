@@ -1,21 +1,42 @@
 from flask import Blueprint, jsonify
 from models import Attendance, Student
+from utils.attendance_queue import attendance_writer
+from utils.events import attendance_feed
+from utils.recognition_cache import recognition_cache
+from utils.recognition_pool import recognition_executor
+from utils.roster import roster
+from utils.quality import quality_filter
 import logging
 
 logger = logging.getLogger(__name__)
 admin_bp = Blueprint('admin', __name__)
 
-@attendance_bp.route('/dashboard', methods=['GET'])
+@admin_bp.route('/dashboard', methods=['GET'])
 def get_dashboard_data():
     """Get complete dashboard data"""
     try:
         stats = Attendance.get_statistics()
-        recent_attendance = Attendance.get_today_attendance()[:10]
+        recent_attendance = Attendance.get_today_attendance(limit=10)
         
         return jsonify({
             'statistics': stats,
+            'departments': Attendance.get_department_statistics(),
             'recent_attendance': recent_attendance
         }), 200
     except Exception as e:
         logger.error(f"Error fetching dashboard data: {e}")
-        return jsonify({'error': 'Internal server error'}), 500
\ No newline at end of file
+        return jsonify({'error': 'Internal server error'}), 500
+
+@admin_bp.route('/stats', methods=['GET'])
+def get_stats():
+    """Operational metrics of this worker"""
+    from utils.face_utils import face_system
+    return jsonify({
+        'attendance_queue': attendance_writer.stats(),
+        'recognition_cache': recognition_cache.stats(),
+        'roster_cache': roster.stats(),
+        'quality_filter': quality_filter.stats(),
+        'live_streams': attendance_feed.streams,
+        'recognition_pool': recognition_executor.stats(),
+        'encode_batcher': face_system.batcher.stats() if face_system.batcher else {'enabled': False}
+    }), 200
\ No newline at end of file
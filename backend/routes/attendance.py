@@ -1,70 +1,294 @@
-from flask import Blueprint, request, jsonify
-import cv2
-import numpy as np
-import base64
-from models import Student, Attendance
-from utils.face_utils import face_system
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from config import Config
+from models import Attendance
+from utils.detection import StageTimer
+from utils.image_io import read_images
+from utils.attendance_queue import record_checkins
+from utils.events import attendance_feed
+from utils.tracking import session_manager
+from utils.recognition_pool import recognition_executor, RecognitionUnavailable
+from utils.metrics import metrics
+from utils.roster import roster
+from utils.quality import quality_filter, rejection, REASONS
 from datetime import datetime
+import json
+import time
 import logging
 
 logger = logging.getLogger(__name__)
 attendance_bp = Blueprint('attendance', __name__)
 
+def _unavailable(error):
+    """429 (queue full) or 503 (timed out / restarting) with a Retry-After hint"""
+    response = jsonify({'error': str(error), 'recognized': False})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, error.status
+
+def scan_client(req):
+    """Key of the camera a scan comes from, for the liveness check: the kiosk's X-Kiosk-Id header or its address"""
+    return req.headers.get('X-Kiosk-Id') or req.remote_addr
+
+def scan_outcome(recognized, message, faces_detected=None):
+    """
+    Outcome label of a scan for the metrics (and the reason code of a failed
+    scan): recognized, unrecognized, no_face, face_too_small or no_gallery
+    """
+    if recognized:
+        return 'recognized'
+    if message == 'No enrolled faces found':
+        return 'no_gallery'
+    if faces_detected == 0 or message == 'No face detected':
+        return 'no_face'
+    if message == REASONS['face_too_small']:
+        return 'face_too_small'
+    return 'unrecognized'
+
+def checkin_result(student_id, confidence, message, timer=None):
+    """
+    Record the check-in of a recognized face (the database half of /mark)
+    timer: optional StageTimer, charged under 'db_lookup' and 'db_write'
+    Returns: (payload, status)
+    """
+    timer = timer or StageTimer()
+    if student_id is None:
+        return {'error': message, 'recognized': False, 'reason': scan_outcome(False, message)}, 200
+    
+    # Get student details (from this worker's roster cache)
+    with timer.stage('db_lookup'):
+        student = roster.get(student_id)
+    if not student:
+        return {'error': 'Student not found in database'}, 404
+    
+    # Mark attendance
+    with timer.stage('db_write'):
+        success = record_checkins([(student_id, confidence)])
+    
+    if not success:
+        return {'error': 'Failed to mark attendance'}, 500
+    
+    logger.info(f"Attendance marked for {student_id}")
+    return {
+        'recognized': True,
+        'student': student,
+        'confidence': round(confidence * 100, 2),
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'message': 'Attendance marked successfully'
+    }, 200
+
+def batch_checkin_result(matches, faces_detected, message, timer=None):
+    """
+    Record the check-ins of every recognized face (the database half of /mark-batch)
+    Returns: (payload, status)
+    """
+    timer = timer or StageTimer()
+    with timer.stage('db_lookup'):
+        students = roster.get_many(m['student_id'] for m in matches)
+    matches = [m for m in matches if m['student_id'] in students]
+    
+    # Mark attendance for every hit at once
+    if matches:
+        with timer.stage('db_write'):
+            success = record_checkins([(m['student_id'], m['confidence']) for m in matches])
+        if not success:
+            return {'error': 'Failed to mark attendance'}, 500
+    
+    logger.info(f"Batch attendance marked for {len(matches)} students")
+    return {
+        'recognized': [{
+            'student': students[m['student_id']],
+            'confidence': round(m['confidence'] * 100, 2),
+            'image': m['image'],
+            'location': m['location']
+        } for m in matches],
+        'faces_detected': faces_detected,
+        'unrecognized_faces': faces_detected - len(matches),
+        'message': message if not matches else 'Attendance marked successfully',
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    }, 200
+
 @attendance_bp.route('/mark', methods=['POST'])
 def mark_attendance():
     """Mark attendance by scanning face"""
+    timer = StageTimer()
     try:
-        data = request.get_json()
-        
-        if 'image' not in data:
-            return jsonify({'error': 'No image provided'}), 400
-        
-        # Decode image
-        try:
-            image_data = base64.b64decode(data['image'].split(',')[1])
-            nparr = np.frombuffer(image_data, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        except Exception as e:
-            logger.error(f"Error decoding image: {e}")
-            return jsonify({'error': 'Invalid image data'}), 400
+        with metrics.track_scan('mark', timer) as scan:
+            # Decode image (raw JPEG body, multipart upload or JSON data URL)
+            try:
+                images = read_images(reduced=Config.DECODE_REDUCED, timer=timer)
+            except Exception as e:
+                logger.error(f"Error decoding image: {e}")
+                scan.outcome = 'invalid'
+                return jsonify({'error': 'Invalid image data'}), 400
+            
+            if not images:
+                scan.outcome = 'invalid'
+                return jsonify({'error': 'No image provided'}), 400
+            image_rgb = images[0]
+            
+            # Turn away dark, blurred or frozen frames before any detection work
+            reason = quality_filter.check_frame(image_rgb, scan_client(request), timer)
+            if reason:
+                scan.outcome = reason
+                return jsonify(rejection(reason)), 200
+            
+            # Recognize face (in a recognition worker process when RECOGNITION_WORKERS is set)
+            try:
+                student_id, confidence, message = recognition_executor.run(
+                    'recognize_face', image_rgb, timer=timer)
+            except RecognitionUnavailable as e:
+                scan.outcome = 'unavailable'
+                return _unavailable(e)
+            logger.debug(f"Recognition stage timings (ms): {timer.timings}")
+            
+            payload, status = checkin_result(student_id, confidence, message, timer)
+            if status == 200:
+                scan.outcome = scan_outcome(student_id is not None, message)
+            return jsonify(payload), status
         
-        # Recognize face
-        student_id, confidence, message = face_system.recognize_face(image_rgb)
-        
-        if student_id is None:
-            return jsonify({'error': message, 'recognized': False}), 200
-        
-        # Get student details
-        student = Student.get_by_id(student_id)
-        if not student:
-            return jsonify({'error': 'Student not found in database'}), 404
-        
-        # Mark attendance
-        success = Attendance.mark_present(student_id, confidence)
-        
-        if not success:
-            return jsonify({'error': 'Failed to mark attendance'}), 500
+    except Exception as e:
+        logger.error(f"Error marking attendance: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@attendance_bp.route('/mark-batch', methods=['POST'])
+def mark_attendance_batch():
+    """Mark attendance for every recognized face in one or more images"""
+    timer = StageTimer()
+    try:
+        with metrics.track_scan('mark_batch', timer) as scan:
+            # Decode images
+            try:
+                decoded = read_images(reduced=Config.DECODE_REDUCED, timer=timer)
+            except Exception as e:
+                logger.error(f"Error decoding image: {e}")
+                scan.outcome = 'invalid'
+                return jsonify({'error': 'Invalid image data'}), 400
+            
+            if not decoded:
+                scan.outcome = 'invalid'
+                return jsonify({'error': 'No images provided'}), 400
+            
+            # Recognize all faces
+            try:
+                matches, faces_detected, message = recognition_executor.run(
+                    'recognize_faces', decoded, timer=timer)
+            except RecognitionUnavailable as e:
+                scan.outcome = 'unavailable'
+                return _unavailable(e)
+            logger.debug(f"Batch recognition stage timings (ms): {timer.timings}")
+            
+            payload, status = batch_checkin_result(matches, faces_detected, message, timer)
+            scan.faces = faces_detected
+            if status == 200:
+                scan.outcome = scan_outcome(bool(payload['recognized']), message, faces_detected)
+            return jsonify(payload), status
         
-        logger.info(f"Attendance marked for {student_id}")
-        return jsonify({
-            'recognized': True,
-            'student': student,
-            'confidence': round(confidence * 100, 2),
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'message': 'Attendance marked successfully'
-        }), 200
+    except Exception as e:
+        logger.error(f"Error marking batch attendance: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@attendance_bp.route('/sessions', methods=['POST'])
+def create_session():
+    """Start a streaming scan session (frames are then posted to /sessions/<id>/frames)"""
+    session = session_manager.create()
+    return jsonify({
+        'session_id': session.session_id,
+        'detect_every': session.detect_every
+    }), 201
+
+@attendance_bp.route('/sessions/<session_id>/frames', methods=['POST'])
+def process_session_frames(session_id):
+    """
+    Feed frames to a streaming session: a raw image body (one frame) or a
+    multipart upload with several 'images' (a chunk of consecutive frames)
+    """
+    timer = StageTimer()
+    try:
+        with metrics.track_scan('session_frames', timer) as scan:
+            try:
+                frames = read_images(reduced=Config.DECODE_REDUCED, timer=timer)
+            except Exception as e:
+                logger.error(f"Error decoding image: {e}")
+                scan.outcome = 'invalid'
+                return jsonify({'error': 'Invalid image data'}), 400
+            
+            if not frames:
+                scan.outcome = 'invalid'
+                return jsonify({'error': 'No image provided'}), 400
+            
+            session = session_manager.get(session_id)
+            # Unusable frames are skipped; the session only sees the good ones
+            reasons = [quality_filter.check_frame(frame, session_id, timer) for frame in frames]
+            if all(reasons):
+                scan.outcome = reasons[-1]
+                return jsonify({
+                    'session_id': session_id,
+                    'frame': session.frame_index,
+                    'tracks': [],
+                    'recognized': [],
+                    'error': REASONS[reasons[-1]],
+                    'reason': reasons[-1],
+                    'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                }), 200
+            
+            checkins = []
+            for frame, reason in zip(frames, reasons):
+                if reason:
+                    continue
+                tracks, new_checkins = session.process_frame(frame, timer)
+                checkins.extend(new_checkins)
+            logger.debug(f"Session {session_id} stage timings (ms): {timer.timings}")
+            
+            with timer.stage('db_lookup'):
+                students = roster.get_many(student_id for student_id, _ in checkins)
+            checkins = [(student_id, confidence) for student_id, confidence in checkins if student_id in students]
+            if checkins:
+                with timer.stage('db_write'):
+                    success = record_checkins(checkins)
+                if not success:
+                    return jsonify({'error': 'Failed to mark attendance'}), 500
+            
+            scan.faces = len(tracks)
+            scan.outcome = scan_outcome(any(t['student_id'] for t in tracks), '', len(tracks))
+            payload = {
+                'session_id': session_id,
+                'frame': session.frame_index,
+                'tracks': tracks,
+                'recognized': [{
+                    'student': students[student_id],
+                    'confidence': round(confidence * 100, 2)
+                } for student_id, confidence in checkins],
+                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+            # Faces are followed but too small to be encoded yet
+            height = frames[-1].shape[0]
+            if scan.outcome == 'unrecognized' and not any(quality_filter.large_enough(t['location'], height)
+                                                          for t in tracks):
+                scan.outcome = payload['reason'] = 'face_too_small'
+            return jsonify(payload), 200
         
     except Exception as e:
-        logger.error(f"Error marking attendance: {e}")
+        logger.error(f"Error processing session frames: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@attendance_bp.route('/sessions/<session_id>', methods=['DELETE'])
+def close_session(session_id):
+    """End a streaming scan session"""
+    session_manager.close(session_id)
+    return jsonify({'message': 'Session closed'}), 200
+
 @attendance_bp.route('/today', methods=['GET'])
 def get_today_attendance():
     """Get today's attendance records"""
     try:
+        # Answer unchanged polls with 304 before running the JOIN
+        etag = Attendance.get_version()
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers={'ETag': f'"{etag}"'})
+        
         records = Attendance.get_today_attendance()
-        return jsonify(records), 200
+        response = jsonify(records)
+        response.set_etag(etag)
+        return response, 200
     except Exception as e:
         logger.error(f"Error fetching attendance: {e}")
         return jsonify({'error': 'Internal server error'}), 500
@@ -74,7 +298,67 @@ def get_statistics():
     """Get attendance statistics"""
     try:
         stats = Attendance.get_statistics()
-        return jsonify(stats), 200
+        response = jsonify(stats)
+        response.add_etag()
+        return response.make_conditional(request)
     except Exception as e:
         logger.error(f"Error fetching statistics: {e}")
-        return jsonify({'error': 'Internal server error'}), 500
\ No newline at end of file
+        return jsonify({'error': 'Internal server error'}), 500
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@attendance_bp.route('/stream', methods=['GET'])
+def stream_attendance():
+    """
+    Live attendance feed (Server-Sent Events)
+    Sends a 'snapshot' of today's records and statistics, then a 'checkin'
+    event per new or repeated check-in followed by updated 'statistics'.
+    At most STREAM_MAX_CLIENTS streams per worker, as each holds a request thread.
+    """
+    if not attendance_feed.open_stream(Config.STREAM_MAX_CLIENTS):
+        response = jsonify({'error': 'Too many live streams open, retry later'})
+        response.headers['Retry-After'] = str(Config.STREAM_RETRY_AFTER)
+        return response, 503
+    
+    def generate():
+        deadline = time.monotonic() + Config.STREAM_MAX_SECONDS
+        date = None
+        
+        while time.monotonic() < deadline:
+            today = datetime.now().strftime('%Y-%m-%d')
+            if today != date:
+                # First event, and again when the day rolls over
+                date = today
+                records = Attendance.get_today_attendance()
+                yield _sse('snapshot', {
+                    'date': date,
+                    'statistics': Attendance.get_statistics(),
+                    'records': records
+                })
+                last_seq = max((r['seq'] or 0 for r in records), default=0)
+                sequence = attendance_feed.sequence
+                last_sent = time.monotonic()
+                continue
+            
+            # Woken by a local check-in, or time to look for other workers' check-ins
+            sequence = attendance_feed.wait(sequence, Config.STREAM_POLL_SECONDS)
+            
+            new_records = Attendance.get_changes_since(date, last_seq)
+            if new_records:
+                for record in new_records:
+                    last_seq = record['seq']
+                    yield _sse('checkin', record)
+                yield _sse('statistics', Attendance.get_statistics())
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent > Config.STREAM_KEEPALIVE_SECONDS:
+                yield ': keepalive\n\n'
+                last_sent = time.monotonic()
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Runs when the server closes the response, also if the client left before the first event
+    response.call_on_close(attendance_feed.close_stream)
+    return response
\ No newline at end of file
@@ -1,9 +1,10 @@
-from flask import Blueprint, request, jsonify
-import cv2
-import numpy as np
-import base64
+from flask import Blueprint, Response, request, jsonify
+from config import Config
 from models import Student
-from utils.face_utils import face_system
+from utils.image_io import read_images, request_fields
+from utils.bulk_import import start_job, job_status, ImportBusy
+from utils.roster import roster
+from utils.encoding_store import student_id_error
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,31 +14,38 @@ enrollment_bp = Blueprint('enrollment', __name__)
 def register_student():
     """Enroll a new student with face data"""
     try:
-        data = request.get_json()
+        data = request_fields()
         
         # Validate required fields
-        required_fields = ['student_id', 'name', 'department', 'image']
+        required_fields = ['student_id', 'name', 'department']
         for field in required_fields:
             if field not in data:
                 return jsonify({'error': f'Missing required field: {field}'}), 400
         
+        id_error = student_id_error(data['student_id'])
+        if id_error:
+            return jsonify({'error': id_error}), 400
+        
         # Check if student already exists
         existing = Student.get_by_id(data['student_id'])
         if existing:
             return jsonify({'error': 'Student ID already exists'}), 400
         
-        # Decode base64 image
+        # Decode image(s) (JSON data URLs, multipart uploads or a raw image body)
         try:
-            image_data = base64.b64decode(data['image'].split(',')[1])
-            nparr = np.frombuffer(image_data, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            images = read_images()
         except Exception as e:
             logger.error(f"Error decoding image: {e}")
             return jsonify({'error': 'Invalid image data'}), 400
         
-        # Enroll face
-        success, result = face_system.enroll_face(image_rgb, data['student_id'])
+        if not images:
+            return jsonify({'error': 'Missing required field: image'}), 400
+        if len(images) > Config.ENROLL_MAX_IMAGES:
+            return jsonify({'error': f'At most {Config.ENROLL_MAX_IMAGES} images per enrollment'}), 400
+        
+        # Enroll face from every sample (face_utils loads the dlib models, so it is imported on first use)
+        from utils.face_utils import face_system
+        success, result = face_system.enroll_face(images, data['student_id'])
         
         if not success:
             return jsonify({'error': result}), 400
@@ -54,6 +62,7 @@ def register_student():
         
         if not student_id:
             return jsonify({'error': 'Failed to save student'}), 500
+        roster.invalidate()
         
         logger.info(f"Student enrolled successfully: {data['student_id']}")
         return jsonify({
@@ -65,12 +74,126 @@ def register_student():
         logger.error(f"Error in registration: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@enrollment_bp.route('/bulk', methods=['POST'])
+def bulk_import():
+    """Start a bulk enrollment from a CSV roster ('csv') and a zip of photos ('images')"""
+    try:
+        csv_file = request.files.get('csv')
+        images_file = request.files.get('images')
+        if csv_file is None or images_file is None:
+            return jsonify({'error': 'Upload a CSV file as "csv" and a zip of photos as "images"'}), 400
+        
+        try:
+            job_id = start_job(csv_file, images_file)
+        except ImportBusy as e:
+            return jsonify({'error': str(e), 'job_id': e.job_id}), 409
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        logger.info(f"Bulk import started: {job_id}")
+        return jsonify({
+            'message': 'Bulk import started',
+            'job_id': job_id
+        }), 202
+    except Exception as e:
+        logger.error(f"Error starting bulk import: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@enrollment_bp.route('/bulk/<job_id>', methods=['GET'])
+def bulk_import_status(job_id):
+    """Progress and report of a bulk enrollment"""
+    try:
+        status = job_status(job_id)
+        if status is None:
+            return jsonify({'error': 'Import job not found'}), 404
+        return jsonify(status), 200
+    except Exception as e:
+        logger.error(f"Error fetching bulk import status: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
 @enrollment_bp.route('/students', methods=['GET'])
 def get_students():
-    """Get all enrolled students"""
+    """
+    Get enrolled students, ordered by student_id
+    Without ?limit returns the whole roster as a list; with it, a page of
+    {'students': [...], 'next_cursor': ...}, continued with ?cursor=<next_cursor>.
+    Either way an unchanged roster is answered with 304 to If-None-Match
+    """
     try:
-        students = Student.get_all()
-        return jsonify(students), 200
+        # The roster version changes with every student change, so it can answer before any query
+        etag = f"students-{Student.get_version()}"
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers={'ETag': f'"{etag}"'})
+        
+        limit = request.args.get('limit', type=int)
+        cursor = request.args.get('cursor')
+        if limit is None and cursor is None:
+            response = jsonify(Student.get_page())
+        else:
+            limit = max(1, min(limit or Config.REPORT_PAGE_SIZE, Config.REPORT_MAX_PAGE_SIZE))
+            # One extra row tells whether there is a next page
+            students = Student.get_page(cursor, limit + 1)
+            next_cursor = None
+            if len(students) > limit:
+                students = students[:limit]
+                next_cursor = students[-1]['student_id']
+            response = jsonify({'students': students, 'next_cursor': next_cursor})
+        response.set_etag(etag)
+        return response, 200
     except Exception as e:
         logger.error(f"Error fetching students: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@enrollment_bp.route('/students/<student_id>/samples', methods=['POST'])
+def add_face_samples(student_id):
+    """Add face samples to an enrolled student's template"""
+    try:
+        student = Student.get_by_id(student_id)
+        if not student or not student['is_active']:
+            return jsonify({'error': 'Student not found'}), 404
+        
+        try:
+            images = read_images()
+        except Exception as e:
+            logger.error(f"Error decoding image: {e}")
+            return jsonify({'error': 'Invalid image data'}), 400
+        
+        if not images:
+            return jsonify({'error': 'Missing required field: image'}), 400
+        if len(images) > Config.ENROLL_MAX_IMAGES:
+            return jsonify({'error': f'At most {Config.ENROLL_MAX_IMAGES} images per enrollment'}), 400
+        
+        from utils.face_utils import face_system
+        success, result = face_system.enroll_face(images, student_id, extend=True)
+        if not success:
+            return jsonify({'error': result}), 400
+        
+        logger.info(f"Face samples added for student: {student_id}")
+        return jsonify({
+            'message': 'Face samples added successfully',
+            'student_id': student_id,
+            'template_size': len(face_system.store.get(student_id))
+        }), 200
+    except Exception as e:
+        logger.error(f"Error adding face samples: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@enrollment_bp.route('/students/<student_id>', methods=['DELETE'])
+def deactivate_student(student_id):
+    """Deactivate a student and remove their face data from recognition"""
+    try:
+        if not Student.deactivate(student_id):
+            return jsonify({'error': 'Student not found'}), 404
+        roster.invalidate()
+        
+        from utils.face_utils import face_system
+        face_system.remove_face(student_id)
+        
+        logger.info(f"Student deactivated: {student_id}")
+        return jsonify({
+            'message': 'Student deactivated successfully',
+            'student_id': student_id
+        }), 200
+    except Exception as e:
+        logger.error(f"Error deactivating student: {e}")
         return jsonify({'error': 'Internal server error'}), 500
\ No newline at end of file
@@ -0,0 +1,157 @@
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from datetime import datetime, timedelta
+import csv
+import io
+import json
+from config import Config
+from models import Attendance
+import logging
+
+logger = logging.getLogger(__name__)
+reports_bp = Blueprint('reports', __name__)
+
+HISTORY_FIELDS = ['id', 'date', 'check_in_time', 'student_id', 'name', 'department', 'status', 'confidence']
+STUDENT_FIELDS = ['student_id', 'name', 'department', 'days_present', 'days_recorded', 'attendance_rate',
+                  'first_present', 'last_present', 'avg_confidence']
+DEPARTMENT_FIELDS = ['department', 'students', 'check_ins', 'days_with_checkins', 'days_recorded', 'average_rate']
+FORMATS = ('json', 'csv', 'ndjson')
+
+class ReportError(ValueError):
+    pass
+
+def _date_param(name, default):
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        raise ReportError(f'Invalid {name} date, expected YYYY-MM-DD')
+
+def _report_params():
+    """start/end (default: the last 30 days) and output format from the query string"""
+    today = datetime.now()
+    end = _date_param('end', today.strftime('%Y-%m-%d'))
+    start = _date_param('start', (datetime.strptime(end, '%Y-%m-%d') - timedelta(days=29)).strftime('%Y-%m-%d'))
+    if start > end:
+        raise ReportError('start must not be after end')
+    fmt = request.args.get('format', 'json').lower()
+    if fmt not in FORMATS:
+        raise ReportError(f"Invalid format, expected one of: {', '.join(FORMATS)}")
+    return start, end, fmt
+
+def _parse_cursor(cursor):
+    """Keyset cursor 'YYYY-MM-DD:id' of the last row of the previous page"""
+    date, _, row_id = cursor.rpartition(':')
+    try:
+        datetime.strptime(date, '%Y-%m-%d')
+        return date, int(row_id)
+    except ValueError:
+        raise ReportError('Invalid cursor')
+
+def _stream_rows(rows, fields, fmt, filename):
+    """Stream a row generator as CSV or NDJSON (one batch of rows per chunk), or as a JSON array"""
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore')
+        if fmt == 'csv':
+            writer.writeheader()
+        elif fmt == 'json':
+            buffer.write('[')
+        count = 0
+        try:
+            for row in rows:
+                if fmt == 'csv':
+                    writer.writerow(row)
+                elif fmt == 'ndjson':
+                    buffer.write(json.dumps(row, default=str))
+                    buffer.write('\n')
+                else:
+                    buffer.write(',' if count else '')
+                    buffer.write(json.dumps(row, default=str))
+                count += 1
+                if count % Config.REPORT_FETCH_SIZE == 0:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+        except Exception as e:
+            # Headers are already sent; the truncated body is all we can signal
+            logger.error(f"Error streaming report {filename}: {e}")
+            raise
+        finally:
+            rows.close()
+        if fmt == 'json':
+            buffer.write(']')
+        yield buffer.getvalue()
+
+    mimetypes = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson', 'json': 'application/json'}
+    headers = {}
+    if fmt != 'json':
+        headers['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return Response(stream_with_context(generate()), mimetype=mimetypes[fmt], headers=headers)
+
+@reports_bp.route('/attendance', methods=['GET'])
+def attendance_history():
+    """
+    Check-ins between ?start and ?end, optionally for one ?department or ?student_id
+    format=json returns a page of ?limit rows and a next_cursor to pass as ?cursor;
+    format=csv or ndjson streams every matching row after ?cursor
+    """
+    try:
+        start, end, fmt = _report_params()
+        cursor = request.args.get('cursor')
+        after = _parse_cursor(cursor) if cursor else None
+        department = request.args.get('department')
+        student_id = request.args.get('student_id')
+
+        if fmt != 'json':
+            limit = request.args.get('limit', type=int)
+            rows = Attendance.iter_history(start, end, department, student_id, after, limit)
+            return _stream_rows(rows, HISTORY_FIELDS, fmt, f'attendance_{start}_{end}')
+
+        limit = request.args.get('limit', Config.REPORT_PAGE_SIZE, type=int)
+        limit = max(1, min(limit, Config.REPORT_MAX_PAGE_SIZE))
+        # One extra row tells whether there is a next page
+        records = list(Attendance.iter_history(start, end, department, student_id, after, limit + 1))
+        next_cursor = None
+        if len(records) > limit:
+            records = records[:limit]
+            next_cursor = f"{records[-1]['date']}:{records[-1]['id']}"
+
+        return jsonify({
+            'start': start,
+            'end': end,
+            'records': records,
+            'next_cursor': next_cursor
+        }), 200
+    except ReportError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error fetching attendance history: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@reports_bp.route('/students', methods=['GET'])
+def student_report():
+    """Per-student days present and attendance rate between ?start and ?end, optionally for one ?department"""
+    try:
+        start, end, fmt = _report_params()
+        rows = Attendance.iter_student_rollup(start, end, request.args.get('department'))
+        return _stream_rows(rows, STUDENT_FIELDS, fmt, f'students_{start}_{end}')
+    except ReportError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error fetching student report: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@reports_bp.route('/departments', methods=['GET'])
+def department_report():
+    """Per-department check-ins and average attendance rate between ?start and ?end"""
+    try:
+        start, end, fmt = _report_params()
+        rows = Attendance.iter_department_rollup(start, end)
+        return _stream_rows(rows, DEPARTMENT_FIELDS, fmt, f'departments_{start}_{end}')
+    except ReportError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error fetching department report: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
@@ -0,0 +1,56 @@
+"""
+Bulk enrollment from a CSV roster and a folder (or zip) of ID photos.
+
+The CSV needs student_id, name and department columns; email, phone and
+image are optional. The image column names the photo, or several photos
+of the same student separated by ";" (reduced to one template). Without
+it the photo is looked up as <student_id>.jpg / .jpeg / .png. Students
+already in the database are skipped, so an interrupted import can be re-run.
+
+Usage (from backend/):
+    python -m scripts.bulk_import students.csv photos/ [--workers 8] [--chunk 500] [--failures failed.csv]
+    python -m scripts.bulk_import students.csv photos.zip
+"""
+import argparse
+import csv
+import os
+import sys
+from models import init_db
+from utils.bulk_import import run_import
+
+
+def print_progress(report):
+    print(f"\r{report['processed']}/{report['total']} processed, {report['imported']} imported, "
+          f"{len(report['failed'])} failed, {report['images_per_second']} images/s",
+          end='', file=sys.stderr, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('csv', help='student roster CSV')
+    parser.add_argument('images', help='directory or zip archive of photos')
+    parser.add_argument('--workers', type=int, default=0, help='encoding processes (default: one per CPU)')
+    parser.add_argument('--chunk', type=int, default=0, help='students written per store pass / transaction')
+    parser.add_argument('--failures', help='write failed rows to this CSV')
+    args = parser.parse_args()
+
+    init_db()
+    report = run_import(args.csv, args.images, workers=args.workers or os.cpu_count(), chunk_size=args.chunk,
+                        progress=print_progress)
+    print(file=sys.stderr)
+
+    print(f"Imported {report['imported']} of {report['total']} students in {report['seconds']}s "
+          f"({report['images_per_second']} images/s); {report['skipped_existing']} already enrolled, "
+          f"{len(report['failed'])} failed")
+    for failure in report['failed']:
+        print(f"Failed: line {failure['line']} {failure['student_id']}: {failure['error']}")
+
+    if args.failures and report['failed']:
+        with open(args.failures, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['line', 'student_id', 'image', 'error'])
+            writer.writeheader()
+            writer.writerows(report['failed'])
+
+
+if __name__ == '__main__':
+    main()
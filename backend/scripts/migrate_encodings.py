@@ -0,0 +1,61 @@
+"""
+One-shot migration of legacy per-student .pkl face encodings into the
+packed encoding store.
+
+Usage (from backend/):
+    python -m scripts.migrate_encodings [--directory DIR] [--remove-pickles]
+"""
+import argparse
+import glob
+import os
+import pickle
+from config import Config
+from models import get_db_connection, init_db
+from utils.encoding_store import EncodingStore, student_id_error
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--directory', default=Config.FACE_ENCODINGS_DIR)
+    parser.add_argument('--remove-pickles', action='store_true', help='delete the .pkl files after importing')
+    args = parser.parse_args()
+
+    store = EncodingStore(args.directory)
+    paths = sorted(glob.glob(os.path.join(args.directory, '*.pkl')))
+    items = []
+    failed = []
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+            id_error = student_id_error(data['student_id'])
+            if id_error:
+                failed.append((path, id_error))
+                continue
+            items.append((data['student_id'], data['encoding']))
+        except Exception as e:
+            failed.append((path, str(e)))
+
+    store.add_many(items)
+
+    if items:
+        init_db()
+        conn = get_db_connection()
+        conn.executemany('UPDATE students SET face_encoding_path = ? WHERE student_id = ?',
+                         [(store.data_path, student_id) for student_id, _ in items])
+        conn.commit()
+        conn.close()
+
+    if args.remove_pickles:
+        failed_paths = {path for path, _ in failed}
+        for path in paths:
+            if path not in failed_paths:
+                os.remove(path)
+
+    print(f"Imported {len(items)} encodings into {store.data_path}")
+    for path, error in failed:
+        print(f"Failed: {path}: {error}")
+
+
+if __name__ == '__main__':
+    main()
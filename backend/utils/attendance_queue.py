@@ -0,0 +1,226 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from config import Config
+from models import Attendance
+from utils.recognition_cache import recognition_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AttendanceWriter:
+    """
+    Write-behind queue for check-ins.
+
+    Requests enqueue recognized check-ins and return immediately; a
+    background thread drains the queue every `flush_ms` milliseconds (or as
+    soon as `flush_rows` are waiting) and writes each batch with one
+    executemany in one transaction, i.e. one commit per group instead of
+    one per face. Queued rows are flushed on interpreter exit, and an
+    optional append-only journal lets rows that were queued but not yet
+    committed be replayed after a crash.
+    """
+
+    def __init__(self, flush_ms=None, flush_rows=None, max_queue=None, journal_dir=None):
+        self.flush_interval = (flush_ms if flush_ms is not None else Config.ATTENDANCE_FLUSH_MS) / 1000.0
+        self.flush_rows = flush_rows or Config.ATTENDANCE_FLUSH_ROWS
+        self.max_queue = max_queue or Config.ATTENDANCE_QUEUE_MAX
+        self.journal_dir = journal_dir if journal_dir is not None else Config.ATTENDANCE_JOURNAL_DIR
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.flush_lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+        self.journal = None
+        self.stopping = False
+        self.metrics = {
+            'enqueued': 0,
+            'flushed_rows': 0,
+            'flushes': 0,
+            'failed_flushes': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'total_flush_ms': 0.0,
+        }
+
+    def _ensure_started(self):
+        # Threads do not survive fork, so every worker starts its own writer
+        if self.thread is not None and self.pid == os.getpid() and self.thread.is_alive():
+            return
+        with self.condition:
+            if self.thread is not None and self.pid == os.getpid() and self.thread.is_alive():
+                return
+            self.pid = os.getpid()
+            self.queue.clear()
+            self.stopping = False
+            if self.journal_dir:
+                os.makedirs(self.journal_dir, exist_ok=True)
+                self.replay_journals()
+                self.journal = open(self._journal_path(self.pid), 'a')
+            self.thread = threading.Thread(target=self._run, name='attendance-writer', daemon=True)
+            self.thread.start()
+
+    def _journal_path(self, pid):
+        return os.path.join(self.journal_dir, f'attendance-{pid}.journal')
+
+    def submit(self, student_id, confidence, date=None):
+        """Queue one check-in"""
+        self.submit_many([(student_id, confidence)], date)
+
+    def submit_many(self, records, date=None):
+        """
+        Queue several check-ins
+        records: iterable of (student_id, confidence)
+        """
+        self._ensure_started()
+        now = datetime.now()
+        date = date or now.strftime('%Y-%m-%d')
+        # Same format as SQLite CURRENT_TIMESTAMP, taken now rather than at flush time
+        check_in_time = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        rows = [(student_id, date, confidence, check_in_time) for student_id, confidence in records]
+
+        with self.condition:
+            if self.journal is not None:
+                self.journal.write(''.join(json.dumps(row) + '\n' for row in rows))
+                self.journal.flush()
+            self.queue.extend(rows)
+            self.metrics['enqueued'] += len(rows)
+            backlog = len(self.queue)
+            if backlog >= self.flush_rows:
+                self.condition.notify()
+
+        # Backpressure: never let the queue grow without bound
+        if backlog > self.max_queue:
+            self.flush()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                if not self.stopping and len(self.queue) < self.flush_rows:
+                    self.condition.wait(self.flush_interval)
+                if self.stopping and not self.queue:
+                    return
+            self.flush()
+
+    def flush(self):
+        """Write everything queued so far in one transaction"""
+        with self.flush_lock:
+            with self.condition:
+                rows = list(self.queue)
+                self.queue.clear()
+            if not rows:
+                return True
+
+            start = time.perf_counter()
+            success = Attendance.write_checkins(rows)
+            elapsed = (time.perf_counter() - start) * 1000
+
+            with self.condition:
+                if not success:
+                    # Keep the rows for the next attempt
+                    self.queue.extendleft(reversed(rows))
+                    self.metrics['failed_flushes'] += 1
+                    return False
+                self.metrics['flushes'] += 1
+                self.metrics['flushed_rows'] += len(rows)
+                self.metrics['last_flush_ms'] = elapsed
+                self.metrics['max_flush_ms'] = max(self.metrics['max_flush_ms'], elapsed)
+                self.metrics['total_flush_ms'] += elapsed
+                # Everything journaled so far is committed
+                if self.journal is not None and not self.queue:
+                    self.journal.truncate(0)
+                    self.journal.seek(0)
+            return True
+
+    def replay_journals(self):
+        """Commit check-ins left in the journals of workers that are no longer running"""
+        for path in glob.glob(os.path.join(self.journal_dir, 'attendance-*.journal')):
+            try:
+                pid = int(os.path.basename(path).split('-')[1].split('.')[0])
+            except ValueError:
+                continue
+            if pid != os.getpid() and _pid_alive(pid):
+                continue
+            rows = []
+            with open(path) as f:
+                for line in f:
+                    try:
+                        rows.append(tuple(json.loads(line)))
+                    except ValueError:
+                        # A torn last line from the crash
+                        continue
+            if rows and not Attendance.write_checkins(rows):
+                logger.error(f"Could not replay attendance journal {path}")
+                continue
+            os.remove(path)
+            if rows:
+                logger.info(f"Replayed {len(rows)} check-ins from {path}")
+
+    def stop(self):
+        """Flush what is queued and stop the writer thread"""
+        if self.thread is None or self.pid != os.getpid():
+            return
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        self.thread.join(timeout=10)
+        self.flush()
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+            if os.path.exists(self._journal_path(self.pid)) and os.path.getsize(self._journal_path(self.pid)) == 0:
+                os.remove(self._journal_path(self.pid))
+
+    def stats(self):
+        with self.condition:
+            metrics = dict(self.metrics)
+            metrics['queue_depth'] = len(self.queue)
+        flushes = metrics.pop('total_flush_ms')
+        metrics['avg_flush_ms'] = round(flushes / metrics['flushes'], 3) if metrics['flushes'] else 0.0
+        metrics['enabled'] = Config.ATTENDANCE_WRITE_BEHIND
+        return metrics
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# Global instance
+attendance_writer = AttendanceWriter()
+atexit.register(attendance_writer.stop)
+
+
+def record_checkins(records):
+    """
+    Record check-ins either synchronously or through the write-behind queue
+    records: list of (student_id, confidence)
+    Students already written within CHECKIN_DEDUP_SECONDS are skipped.
+    Returns: True if the check-ins were written (or queued)
+    """
+    claimed = set(recognition_cache.claim_checkins([student_id for student_id, _ in records]))
+    records = [record for record in records if record[0] in claimed]
+    if not records:
+        return True
+
+    if Config.ATTENDANCE_WRITE_BEHIND:
+        attendance_writer.submit_many(records)
+        return True
+    if len(records) == 1:
+        success = Attendance.mark_present(*records[0])
+    else:
+        success = Attendance.mark_present_bulk(records)
+    if not success:
+        recognition_cache.release_checkins(list(claimed))
+    return success
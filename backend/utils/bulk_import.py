@@ -0,0 +1,342 @@
+import csv
+import fcntl
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+from config import Config
+from models import Student
+from utils.encoding_store import encoding_store, student_id_error
+from utils.recognition_pool import worker_settings, apply_worker_settings
+from utils.templates import build_template
+import logging
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = ('student_id', 'name', 'department')
+IMAGE_EXTENSIONS = ('jpg', 'jpeg', 'png')
+
+# Per-process handle of the zip archive being imported
+_archive = {}
+
+
+class ImportBusy(Exception):
+    """Another bulk import is running; imports run one at a time"""
+
+    def __init__(self, job_id):
+        super().__init__("Another bulk import is running, retry when it has finished")
+        self.job_id = job_id
+
+
+def _init_worker(settings):
+    apply_worker_settings(settings)
+
+
+def _read_image_bytes(source, name):
+    """Bytes of `name` from an image directory or zip archive"""
+    if zipfile.is_zipfile(source):
+        archive = _archive.get(source)
+        if archive is None:
+            archive = _archive[source] = zipfile.ZipFile(source)
+        return archive.read(name)
+    with open(os.path.join(source, name), 'rb') as f:
+        return f.read()
+
+
+def _encode_image(task):
+    """
+    Runs in an import worker process
+    task: (source, image names of one student)
+    Returns: (template, None) or (None, error message)
+    """
+    source, names = task
+    from utils.face_utils import face_system
+    try:
+        images = []
+        for name in names:
+            data = _read_image_bytes(source, name)
+            image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                return None, f"Could not decode image {name}"
+            images.append(cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image))
+        samples, error = face_system.encode_enrollment_images(images)
+        if samples is None:
+            return None, error
+        return build_template(samples), None
+    except Exception as e:
+        return None, str(e)
+
+
+def list_images(source):
+    """
+    Images available in a directory or zip archive
+    Returns: dict of lowercase path and lowercase file name -> path inside the source
+    """
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            names = [n for n in archive.namelist() if not n.endswith('/')]
+    else:
+        names = [os.path.relpath(os.path.join(root, f), source)
+                 for root, _, files in os.walk(source) for f in files]
+    images = {}
+    for name in names:
+        if name.rsplit('.', 1)[-1].lower() not in IMAGE_EXTENSIONS:
+            continue
+        images.setdefault(os.path.basename(name).lower(), name)
+        images[name.lower()] = name
+    return images
+
+
+def read_roster(csv_file):
+    """Parse the student CSV (path or text stream); returns a list of row dicts"""
+    if isinstance(csv_file, str):
+        with open(csv_file, newline='', encoding='utf-8-sig') as f:
+            return read_roster(f)
+    reader = csv.DictReader(csv_file)
+    columns = [c.strip().lower() for c in reader.fieldnames or []]
+    missing = [c for c in REQUIRED_COLUMNS if c not in columns]
+    if missing:
+        raise ValueError(f"CSV is missing required columns: {', '.join(missing)}")
+    return [{k.strip().lower(): (v or '').strip() for k, v in row.items() if k} for row in reader]
+
+
+def _find_images(row, images):
+    """
+    The images of a CSV row: its 'image' column (several samples separated by ';'),
+    else <student_id>.<jpg|jpeg|png> anywhere in the source
+    Returns: tuple of names inside the source, or None if any is missing
+    """
+    if row.get('image'):
+        names = tuple(images.get(n.strip().lower()) for n in row['image'].split(';') if n.strip())
+        return names if names and None not in names else None
+    for ext in IMAGE_EXTENSIONS:
+        name = images.get(f"{row['student_id']}.{ext}".lower())
+        if name is not None:
+            return (name,)
+    return None
+
+
+def run_import(csv_file, source, workers=None, chunk_size=None, progress=None, store=None):
+    """
+    Enroll every student of a CSV roster from an image directory or zip.
+
+    Faces are encoded across a process pool; every chunk of `chunk_size`
+    students is then written to the encoding store in one pass and to the
+    database in one transaction. Students already in the database are
+    skipped, so an interrupted import can simply be run again.
+    progress: optional callback receiving the report after every chunk
+    Returns: report dict with counts, throughput and per-image failures
+    """
+    store = store or encoding_store
+    workers = workers or Config.BULK_IMPORT_WORKERS or os.cpu_count() or 1
+    chunk_size = chunk_size or Config.BULK_IMPORT_CHUNK
+    started = time.perf_counter()
+
+    rows = read_roster(csv_file)
+    images = list_images(source)
+    report = {
+        'total': len(rows),
+        'imported': 0,
+        'skipped_existing': 0,
+        'failed': [],
+        'processed': 0,
+        'seconds': 0.0,
+        'images_per_second': 0.0,
+        'done': False,
+    }
+
+    # Resume: whoever is already in the database was imported by an earlier run
+    existing = set()
+    ids = [row['student_id'] for row in rows if row.get('student_id')]
+    for start in range(0, len(ids), 500):
+        existing.update(Student.get_many(ids[start:start + 500]))
+
+    tasks, seen = [], set()
+    for line, row in enumerate(rows, start=2):
+        student_id = row.get('student_id')
+        if any(not row.get(c) for c in REQUIRED_COLUMNS):
+            report['failed'].append({'line': line, 'student_id': student_id, 'error': 'Missing required field'})
+            continue
+        id_error = student_id_error(student_id)
+        if id_error:
+            report['failed'].append({'line': line, 'student_id': student_id, 'error': id_error})
+            continue
+        if student_id in seen:
+            report['failed'].append({'line': line, 'student_id': student_id, 'error': 'Duplicate student_id in CSV'})
+            continue
+        seen.add(student_id)
+        if student_id in existing:
+            report['skipped_existing'] += 1
+            continue
+        names = _find_images(row, images)
+        if names is None:
+            report['failed'].append({'line': line, 'student_id': student_id, 'error': 'Image not found'})
+            continue
+        tasks.append((line, row, names))
+    report['processed'] = skipped = report['total'] - len(tasks)
+
+    def finish_chunk(encoded):
+        if encoded:
+            store.add_many([(row['student_id'], template) for row, template in encoded])
+            Student.create_many([dict(row, face_encoding_path=store.data_path) for row, _ in encoded])
+            report['imported'] += len(encoded)
+        elapsed = time.perf_counter() - started
+        report['seconds'] = round(elapsed, 2)
+        report['images_per_second'] = round((report['processed'] - skipped) / elapsed, 2) if elapsed else 0.0
+        if progress is not None:
+            progress(report)
+
+    if tasks:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(worker_settings(),)) as pool:
+            results = pool.map(_encode_image, [(source, names) for _, _, names in tasks],
+                               chunksize=max(1, min(16, len(tasks) // (4 * workers))))
+            encoded = []
+            for (line, row, names), (template, error) in zip(tasks, results):
+                report['processed'] += 1
+                if template is None:
+                    report['failed'].append({'line': line, 'student_id': row['student_id'],
+                                             'image': ';'.join(names), 'error': error})
+                else:
+                    encoded.append((row, template))
+                if len(encoded) >= chunk_size:
+                    finish_chunk(encoded)
+                    encoded = []
+            if encoded:
+                finish_chunk(encoded)
+
+    report['failed'].sort(key=lambda failure: failure['line'])
+    report['done'] = True
+    finish_chunk([])
+    logger.info(f"Bulk import: {report['imported']} imported, {report['skipped_existing']} already enrolled, "
+                f"{len(report['failed'])} failed in {report['seconds']}s")
+    return report
+
+
+def _write_status(job_dir, status):
+    # Written atomically so any web worker can serve GET /api/enroll/bulk/<job_id>
+    path = os.path.join(job_dir, 'status.json')
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(status, f)
+    os.replace(f'{path}.tmp', path)
+
+
+def _lock_path():
+    return os.path.join(Config.BULK_IMPORT_DIR, 'import.lock')
+
+
+def _acquire_import_lock(job_id):
+    """
+    Take the import lock for `job_id` and return its open file; the lock is
+    held until the file is closed, or the process holding it dies
+    Raises ImportBusy with the running job's id if another import holds it
+    """
+    os.makedirs(Config.BULK_IMPORT_DIR, exist_ok=True)
+    lock_file = open(_lock_path(), 'a+')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.seek(0)
+        running = lock_file.read().strip()
+        lock_file.close()
+        raise ImportBusy(running)
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(job_id)
+    lock_file.flush()
+    return lock_file
+
+
+def _running_job():
+    """Id of the import holding the lock in any process, or None if none is running"""
+    try:
+        lock_file = open(_lock_path())
+    except FileNotFoundError:
+        return None
+    with lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return lock_file.read().strip()
+        return None
+
+
+def start_job(csv_file, images_file):
+    """
+    Save an uploaded roster and image zip and import them on a background thread
+    Only one import runs at a time, across all workers (raises ImportBusy)
+    Returns: job id
+    """
+    job_id = uuid.uuid4().hex
+    lock_file = _acquire_import_lock(job_id)
+    job_dir = os.path.join(Config.BULK_IMPORT_DIR, job_id)
+    csv_path = os.path.join(job_dir, 'students.csv')
+    zip_path = os.path.join(job_dir, 'images.zip')
+    try:
+        os.makedirs(job_dir)
+        csv_file.save(csv_path)
+        images_file.save(zip_path)
+        if not zipfile.is_zipfile(zip_path):
+            raise ValueError("Images must be uploaded as a zip archive")
+        read_roster(csv_path)  # Reject a CSV without the required columns up front
+        # Written before the request returns, so the job id can be polled right away
+        _write_status(job_dir, {'job_id': job_id, 'state': 'running'})
+    except Exception:
+        lock_file.close()
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise
+
+    def run():
+        from utils.face_utils import face_system
+        status = {'job_id': job_id, 'state': 'running'}
+        try:
+            report = run_import(csv_path, zip_path,
+                                progress=lambda report: _write_status(job_dir, dict(status, **report)))
+            status.update(report, state='done')
+            face_system.refresh()
+        except Exception as e:
+            logger.error(f"Bulk import {job_id} failed: {e}")
+            status.update(state='failed', error=str(e))
+        finally:
+            # The final status is written before the lock is released, see job_status
+            _write_status(job_dir, status)
+            lock_file.close()
+
+    threading.Thread(target=run, name=f'bulk-import-{job_id[:8]}', daemon=True).start()
+    return job_id
+
+
+def _read_status(job_dir):
+    try:
+        with open(os.path.join(job_dir, 'status.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def job_status(job_id):
+    """
+    Status and report of a bulk import job, or None if unknown
+    A job left 'running' by a process that died (worker restart, crash) no
+    longer holds the import lock; it is reported, and recorded, as failed
+    """
+    if not job_id.isalnum():
+        return None
+    job_dir = os.path.join(Config.BULK_IMPORT_DIR, job_id)
+    status = _read_status(job_dir)
+    if status is None or status.get('state') != 'running' or _running_job() == job_id:
+        return status
+    # Read again: the job may have written its final status and released the lock meanwhile
+    status = _read_status(job_dir)
+    if status is not None and status.get('state') == 'running':
+        status.update(state='failed', error='Import was interrupted; upload it again to resume')
+        _write_status(job_dir, status)
+    return status
@@ -0,0 +1,121 @@
+import os
+import time
+from contextlib import contextmanager
+import cv2
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimer:
+    """Collects per-stage wall-clock timings (ms) for one request"""
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed
+
+    def merge(self, timings):
+        """Add timings measured elsewhere (e.g. in a recognition worker process)"""
+        for name, elapsed in timings.items():
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed
+
+
+class FaceDetector:
+    """
+    Face detection stage used before encoding.
+
+    An optional OpenCV cascade rejects frames without any face-like region
+    cheaply, then HOG (or CNN) runs on a downscaled copy of the frame and
+    the boxes are mapped back to full-resolution coordinates, so encodings
+    are still computed on the original pixels.
+    """
+
+    def __init__(self, model=None, scale=None, upsample=None, cascade=None):
+        self.model = model or Config.MODEL
+        self.scale = scale if scale is not None else Config.DETECTION_SCALE
+        if scale is None and Config.DECODE_REDUCED:
+            # Scan frames already arrive at half resolution
+            self.scale = min(1.0, self.scale * 2)
+        self.upsample = upsample if upsample is not None else Config.DETECTION_UPSAMPLE
+        self.cascade = self._load_cascade(cascade if cascade is not None else Config.PREFILTER_CASCADE)
+
+    @staticmethod
+    def _load_cascade(cascade):
+        """'' disables the pre-filter, 'haar' uses OpenCV's bundled frontal face model, anything else is a cascade XML path (Haar or LBP)"""
+        if not cascade:
+            return None
+        path = cascade
+        if cascade == 'haar':
+            path = os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_default.xml')
+        classifier = cv2.CascadeClassifier(path)
+        if classifier.empty():
+            logger.error(f"Could not load face cascade {path}; pre-filter disabled")
+            return None
+        return classifier
+
+    def downscale(self, image):
+        """The copy of the frame detection (and tracking) runs on"""
+        if self.scale >= 1.0:
+            return image
+        return cv2.resize(image, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+
+    def has_face_candidate(self, small_image):
+        """Cheap cascade check on the downscaled frame; True when no cascade is configured"""
+        if self.cascade is None:
+            return True
+        gray = cv2.cvtColor(small_image, cv2.COLOR_RGB2GRAY)
+        min_side = max(20, int(Config.PREFILTER_MIN_FACE * self.scale))
+        faces = self.cascade.detectMultiScale(gray, scaleFactor=1.2, minNeighbors=3,
+                                              minSize=(min_side, min_side))
+        return len(faces) > 0
+
+    def detect_scaled(self, small, timer=None):
+        """Detect faces in an already downscaled frame; boxes stay in its coordinates"""
+        timer = timer or StageTimer()
+
+        if self.cascade is not None:
+            with timer.stage('prefilter'):
+                if not self.has_face_candidate(small):
+                    return []
+
+        # Imported on first use: loading the dlib models takes seconds, and
+        # importing this module (for StageTimer) must not pay for it
+        import face_recognition
+        with timer.stage('detect'):
+            return face_recognition.face_locations(small, number_of_times_to_upsample=self.upsample,
+                                                   model=self.model)
+
+    def to_full(self, boxes, shape):
+        """Map (top, right, bottom, left) boxes from the downscaled frame to a full frame of `shape`"""
+        if self.scale >= 1.0:
+            return list(boxes)
+        height, width = shape[:2]
+        factor = 1.0 / self.scale
+        return [
+            (max(0, int(round(top * factor))),
+             min(width, int(round(right * factor))),
+             min(height, int(round(bottom * factor))),
+             max(0, int(round(left * factor))))
+            for top, right, bottom, left in boxes
+        ]
+
+    def detect(self, image, timer=None):
+        """
+        Detect faces in an RGB frame
+        Returns: list of (top, right, bottom, left) boxes in full-resolution coordinates
+        """
+        timer = timer or StageTimer()
+
+        with timer.stage('downscale'):
+            small = self.downscale(image)
+
+        return self.to_full(self.detect_scaled(small, timer), image.shape)
@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+import dlib
+import numpy as np
+import face_recognition.api as face_api
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def encode_faces(jobs):
+    """
+    Encode the faces of several images with one descriptor call
+    jobs: list of (image, locations)
+    Returns: one (len(locations), 128) array per job
+    """
+    images, shapes = [], []
+    for image, locations in jobs:
+        image = np.ascontiguousarray(image)
+        detections = dlib.full_object_detections()
+        for top, right, bottom, left in locations:
+            # Same 5-point landmarks face_recognition.face_encodings uses
+            detections.append(face_api.pose_predictor_5_point(image, dlib.rectangle(left, top, right, bottom)))
+        images.append(image)
+        shapes.append(detections)
+    descriptors = face_api.face_encoder.compute_face_descriptor(images, shapes, 0)
+    return [np.array([np.array(d) for d in per_image]).reshape(-1, 128) for per_image in descriptors]
+
+
+class _Job:
+    __slots__ = ('faces', 'future', 'queued_at')
+
+    def __init__(self, faces):
+        self.faces = faces
+        self.future = Future()
+        self.queued_at = time.monotonic()
+
+
+class EncodingBatcher:
+    """
+    Micro-batches encoding and matching across concurrent requests.
+
+    Request threads hand over the faces they need identified and block;
+    a dispatcher thread waits up to `max_wait_ms` after the first job
+    arrives (or until `max_batch` faces are queued), encodes every face
+    of the batch with one dlib descriptor call, matches all the probes
+    against the gallery with one distance matrix multiply and resolves
+    each request's future with its own slice.
+    """
+
+    def __init__(self, system, max_batch=None, max_wait_ms=None):
+        self.system = system
+        self.max_batch = max(1, max_batch or Config.ENCODE_BATCH_SIZE)
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else Config.ENCODE_BATCH_WAIT_MS) / 1000.0
+        self.jobs = []
+        self.queued_faces = 0
+        self.condition = threading.Condition()
+        self.thread = None
+        self.pid = None
+        self.metrics = {
+            'batches': 0,
+            'jobs': 0,
+            'faces': 0,
+            'max_batch_faces': 0,
+            'total_wait_ms': 0.0,
+            'total_batch_ms': 0.0,
+        }
+
+    def _ensure_started(self):
+        # Threads do not survive fork, so every worker starts its own dispatcher
+        if self.thread is not None and self.pid == os.getpid() and self.thread.is_alive():
+            return
+        with self.condition:
+            if self.thread is not None and self.pid == os.getpid() and self.thread.is_alive():
+                return
+            self.pid = os.getpid()
+            self.jobs = []
+            self.queued_faces = 0
+            self.thread = threading.Thread(target=self._run, name='encode-batcher', daemon=True)
+            self.thread.start()
+
+    def identify(self, faces, timeout=None):
+        """
+        Encode and match faces given as (image, location) pairs, batched with other requests
+        Returns: (encodings, matches) with one encoding and one (student_id, distance) per face
+        """
+        if not faces:
+            return [], []
+        self._ensure_started()
+        job = _Job(faces)
+        with self.condition:
+            self.jobs.append(job)
+            self.queued_faces += len(faces)
+            self.condition.notify()
+        return job.future.result(timeout)
+
+    def _take_batch(self):
+        with self.condition:
+            while not self.jobs:
+                self.condition.wait()
+            # Give concurrent requests a few milliseconds to join the batch
+            first_at = self.jobs[0].queued_at
+            while self.queued_faces < self.max_batch:
+                remaining = first_at + self.max_wait - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+
+            batch, faces = [], 0
+            while self.jobs and (not batch or faces + len(self.jobs[0].faces) <= self.max_batch):
+                job = self.jobs.pop(0)
+                batch.append(job)
+                faces += len(job.faces)
+            self.queued_faces -= faces
+            return batch, faces
+
+    def _run(self):
+        while True:
+            batch, faces = self._take_batch()
+            start = time.monotonic()
+            try:
+                results = self._process(batch)
+            except Exception as e:
+                logger.error(f"Batched encoding failed: {e}")
+                for job in batch:
+                    job.future.set_exception(e)
+                continue
+            for job, result in zip(batch, results):
+                job.future.set_result(result)
+
+            elapsed = time.monotonic() - start
+            with self.condition:
+                self.metrics['batches'] += 1
+                self.metrics['jobs'] += len(batch)
+                self.metrics['faces'] += faces
+                self.metrics['max_batch_faces'] = max(self.metrics['max_batch_faces'], faces)
+                self.metrics['total_wait_ms'] += sum(start - job.queued_at for job in batch) * 1000
+                self.metrics['total_batch_ms'] += elapsed * 1000
+
+    def _process(self, batch):
+        # Group every face by image so each image is passed to dlib once
+        images, groups = [], {}
+        for job_index, job in enumerate(batch):
+            for face_index, (image, location) in enumerate(job.faces):
+                key = id(image)
+                if key not in groups:
+                    groups[key] = len(images)
+                    images.append((image, []))
+                images[groups[key]][1].append((location, job_index, face_index))
+
+        encoded = encode_faces([(image, [location for location, _, _ in entries]) for image, entries in images])
+
+        encodings = [[None] * len(job.faces) for job in batch]
+        for (_, entries), image_encodings in zip(images, encoded):
+            for (_, job_index, face_index), encoding in zip(entries, image_encodings):
+                encodings[job_index][face_index] = encoding
+
+        probes = [encoding for job_encodings in encodings for encoding in job_encodings]
+        gallery = self.system.gallery
+        if len(gallery) == 0:
+            matches = [(None, 1.0)] * len(probes)
+        else:
+            matches = gallery.match(probes, self.system.tolerance)
+
+        results, offset = [], 0
+        for job_encodings in encodings:
+            results.append((job_encodings, matches[offset:offset + len(job_encodings)]))
+            offset += len(job_encodings)
+        return results
+
+    def stats(self):
+        with self.condition:
+            metrics = dict(self.metrics)
+            metrics['queued_faces'] = self.queued_faces
+        batches = metrics['batches']
+        metrics['avg_batch_faces'] = round(metrics['faces'] / batches, 2) if batches else 0.0
+        metrics['avg_wait_ms'] = round(metrics.pop('total_wait_ms') / metrics['jobs'], 3) if metrics['jobs'] else 0.0
+        metrics['avg_batch_ms'] = round(metrics.pop('total_batch_ms') / batches, 3) if batches else 0.0
+        metrics['max_batch_size'] = self.max_batch
+        metrics['max_wait_ms'] = self.max_wait * 1000
+        metrics['enabled'] = True
+        return metrics
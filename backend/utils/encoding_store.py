@@ -0,0 +1,278 @@
+import fcntl
+import os
+import struct
+from contextlib import contextmanager
+import numpy as np
+from config import Config
+from utils.gallery import ENCODING_DIM
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'AMSENC01'
+VERSION = 1
+ID_WIDTH = 32  # bytes of utf-8 per student id
+
+# magic, version, dim, itemsize, id width, row count, generation, removed count
+HEADER = struct.Struct('<8sIIII QQQ')
+HEADER_SIZE = 64
+
+
+def student_id_error(student_id):
+    """Why a student id cannot be stored (a message for the client), or None"""
+    if len(str(student_id).encode('utf-8')) > ID_WIDTH:
+        return f"Student ID longer than {ID_WIDTH} bytes"
+    return None
+
+
+class EncodingStore:
+    """
+    Append-only packed store for face encodings.
+
+    Layout inside the encodings directory:
+        gallery.dat    64-byte header followed by a fixed-width (N, 128) float32 matrix
+        gallery.ids    fixed-width utf-8 student ids, one per row
+        gallery.norms  float32 squared norm of every row
+        gallery.tomb   tombstone bitmap, one bit per row
+        gallery.removed  int64 log of tombstoned rows, in removal order
+
+    Rows are never rewritten: re-enrolling a student appends new rows and
+    tombstones the old ones. The row count in the header is written last,
+    so readers never see a partially appended row, and the old rows are
+    only tombstoned once the new ones are committed, so a re-enrolled
+    student is never without live rows (not even after a crash). Readers map the files
+    with np.memmap, which keeps startup O(1) and lets every worker share
+    the same page cache.
+
+    The header generation is bumped on every append or removal, so a
+    reader can compare it on each request and fetch only the delta
+    (rows past its count, removal log entries past its offset).
+    """
+
+    def __init__(self, directory=None, dim=ENCODING_DIM):
+        self.directory = directory or Config.FACE_ENCODINGS_DIR
+        self.dim = dim
+        self.itemsize = np.dtype(np.float32).itemsize
+        self.data_path = os.path.join(self.directory, 'gallery.dat')
+        self.ids_path = os.path.join(self.directory, 'gallery.ids')
+        self.norms_path = os.path.join(self.directory, 'gallery.norms')
+        self.tomb_path = os.path.join(self.directory, 'gallery.tomb')
+        self.removed_path = os.path.join(self.directory, 'gallery.removed')
+        self.lock_path = os.path.join(self.directory, 'gallery.lock')
+
+    @property
+    def row_size(self):
+        return self.dim * self.itemsize
+
+    def exists(self):
+        return os.path.exists(self.data_path)
+
+    @contextmanager
+    def _locked(self):
+        """Exclusive writer lock shared by every process using the store"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _ensure_created(self):
+        if self.exists():
+            return
+        for path in (self.ids_path, self.norms_path, self.tomb_path, self.removed_path):
+            open(path, 'wb').close()
+        header = HEADER.pack(MAGIC, VERSION, self.dim, self.itemsize, ID_WIDTH, 0, 0, 0)
+        with open(self.data_path, 'wb') as f:
+            f.write(header.ljust(HEADER_SIZE, b'\0'))
+
+    def read_header(self):
+        """Read the store header; cheap enough to call on every request"""
+        if not self.exists():
+            return {'count': 0, 'generation': 0, 'removed': 0}
+        with open(self.data_path, 'rb') as f:
+            raw = f.read(HEADER.size)
+        magic, version, dim, itemsize, id_width, count, generation, removed = HEADER.unpack(raw)
+        if magic != MAGIC or dim != self.dim or itemsize != self.itemsize or id_width != ID_WIDTH:
+            raise ValueError(f"Incompatible encoding store at {self.data_path}")
+        return {'count': count, 'generation': generation, 'removed': removed}
+
+    def _write_header(self, count, generation, removed):
+        header = HEADER.pack(MAGIC, VERSION, self.dim, self.itemsize, ID_WIDTH, count, generation, removed)
+        with open(self.data_path, 'r+b') as f:
+            f.write(header)
+            f.flush()
+            os.fsync(f.fileno())
+
+    @staticmethod
+    def _encode_id(student_id):
+        raw = str(student_id).encode('utf-8')
+        if len(raw) > ID_WIDTH:
+            raise ValueError(f"Student id longer than {ID_WIDTH} bytes: {student_id}")
+        return raw
+
+    def _live_rows(self, encoded_ids, count):
+        """Rows holding any of the given ids that are not tombstoned yet"""
+        if count == 0:
+            return np.empty(0, dtype=np.int64)
+        ids = np.fromfile(self.ids_path, dtype=f'S{ID_WIDTH}', count=count)
+        rows = np.flatnonzero(np.isin(ids, np.array(list(encoded_ids), dtype=f'S{ID_WIDTH}')))
+        return rows[self._alive_mask(count)[rows]]
+
+    def _alive_mask(self, count):
+        bits = np.fromfile(self.tomb_path, dtype=np.uint8)
+        dead = np.unpackbits(bits, bitorder='little')[:count].astype(bool)
+        if len(dead) < count:
+            dead = np.concatenate([dead, np.zeros(count - len(dead), dtype=bool)])
+        return ~dead
+
+    def _tombstone(self, rows, removed):
+        """Set tombstone bits and log the rows at position `removed` of the removal log"""
+        if len(rows) == 0:
+            return
+        with open(self.tomb_path, 'r+b') as f:
+            for row in rows:
+                f.seek(row // 8)
+                current = f.read(1)
+                value = current[0] if current else 0
+                f.seek(row // 8)
+                f.write(bytes([value | (1 << (row % 8))]))
+        # Opened without truncation; an entry left over from a crashed
+        # writer past the header's removed count is simply overwritten
+        with open(self.removed_path, 'ab'):
+            pass
+        with open(self.removed_path, 'r+b') as f:
+            f.seek(removed * 8)
+            f.write(np.asarray(rows, dtype=np.int64).tobytes())
+
+    def add_many(self, items):
+        """
+        Append encodings for several students in one pass
+        items: iterable of (student_id, encodings), encodings shaped (128,) or (K, 128)
+        Returns: list of appended row ranges, one per item
+        """
+        prepared = []
+        for student_id, encodings in items:
+            matrix = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+            prepared.append((self._encode_id(student_id), matrix))
+        if not prepared:
+            return []
+
+        with self._locked():
+            self._ensure_created()
+            header = self.read_header()
+            count = header['count']
+
+            # Re-enrollment replaces whatever the student had before
+            stale = self._live_rows({encoded for encoded, _ in prepared}, count)
+
+            matrix = np.vstack([m for _, m in prepared])
+            ids = np.array([encoded for encoded, m in prepared for _ in range(len(m))], dtype=f'S{ID_WIDTH}')
+            norms = np.einsum('ij,ij->i', matrix, matrix).astype(np.float32)
+
+            with open(self.data_path, 'r+b') as f:
+                f.seek(HEADER_SIZE + count * self.row_size)
+                f.write(matrix.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            for path, array, width in ((self.ids_path, ids, ID_WIDTH), (self.norms_path, norms, 4)):
+                with open(path, 'r+b') as f:
+                    f.seek(count * width)
+                    f.write(array.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            ranges = []
+            start = count
+            for _, m in prepared:
+                ranges.append(range(start, start + len(m)))
+                start += len(m)
+
+            # Commit the new rows first; until the old ones are tombstoned
+            # below, both match the same student
+            self._write_header(start, header['generation'] + 1, header['removed'])
+            if len(stale):
+                self._tombstone(stale, header['removed'])
+                self._write_header(start, header['generation'] + 2, header['removed'] + len(stale))
+        return ranges
+
+    def add(self, student_id, encodings):
+        """Append the encoding(s) of one student, replacing earlier ones"""
+        return self.add_many([(student_id, encodings)])[0]
+
+    def get(self, student_id):
+        """Current encodings of one student, shaped (K, 128); K is 0 if not enrolled"""
+        header = self.read_header()
+        rows = self._live_rows({self._encode_id(student_id)}, header['count'])
+        if len(rows) == 0:
+            return np.empty((0, self.dim), dtype=np.float32)
+        encodings = np.memmap(self.data_path, dtype=np.float32, mode='r',
+                              offset=HEADER_SIZE, shape=(header['count'], self.dim))
+        return np.array(encodings[rows])
+
+    def remove(self, student_id):
+        """Tombstone every row of a student; returns the number of rows removed"""
+        if not self.exists():
+            return 0
+        with self._locked():
+            header = self.read_header()
+            rows = self._live_rows({self._encode_id(student_id)}, header['count'])
+            if len(rows) == 0:
+                return 0
+            self._tombstone(rows, header['removed'])
+            self._write_header(header['count'], header['generation'] + 1, header['removed'] + len(rows))
+        return len(rows)
+
+    def snapshot(self):
+        """
+        Map the store read-only
+        Returns: (ids, encodings, sq_norms, header) where encodings and ids are
+        memory-mapped and tombstoned rows have an infinite squared norm, so
+        they can never be the closest match
+        """
+        header = self.read_header()
+        count = header['count']
+        if count == 0:
+            return (np.empty(0, dtype=f'S{ID_WIDTH}'),
+                    np.empty((0, self.dim), dtype=np.float32),
+                    np.empty(0, dtype=np.float32),
+                    header)
+
+        encodings = np.memmap(self.data_path, dtype=np.float32, mode='r',
+                              offset=HEADER_SIZE, shape=(count, self.dim))
+        ids = np.memmap(self.ids_path, dtype=f'S{ID_WIDTH}', mode='r', shape=(count,))
+        sq_norms = np.fromfile(self.norms_path, dtype=np.float32, count=count)
+        sq_norms[~self._alive_mask(count)] = np.inf
+        return ids, encodings, sq_norms, header
+
+    def changes_since(self, count, removed):
+        """
+        Delta since a reader last synced at (count, removed)
+        Returns: (ids, encodings, new_sq_norms, removed_rows, header) where ids
+        and encodings map every row, new_sq_norms covers rows [count, new count)
+        and removed_rows lists rows tombstoned since then
+        """
+        header = self.read_header()
+        new_count = header['count']
+        ids = np.memmap(self.ids_path, dtype=f'S{ID_WIDTH}', mode='r', shape=(new_count,))
+        encodings = np.memmap(self.data_path, dtype=np.float32, mode='r',
+                              offset=HEADER_SIZE, shape=(new_count, self.dim))
+
+        new_sq_norms = np.empty(0, dtype=np.float32)
+        if new_count > count:
+            with open(self.norms_path, 'rb') as f:
+                f.seek(count * 4)
+                new_sq_norms = np.fromfile(f, dtype=np.float32, count=new_count - count)
+
+        removed_rows = np.empty(0, dtype=np.int64)
+        if header['removed'] > removed and os.path.exists(self.removed_path):
+            with open(self.removed_path, 'rb') as f:
+                f.seek(removed * 8)
+                removed_rows = np.fromfile(f, dtype=np.int64, count=header['removed'] - removed)
+
+        return ids, encodings, new_sq_norms, removed_rows, header
+
+
+# Global instance
+encoding_store = EncodingStore()
@@ -0,0 +1,44 @@
+import threading
+
+
+class AttendanceFeed:
+    """
+    In-process notification of new check-ins.
+
+    Writers call publish() after committing; live streams block in wait()
+    instead of polling the database. Check-ins committed by other gunicorn
+    workers are picked up by the streams' periodic check of the database.
+    Also counts the open streams, so they can be capped per worker.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.sequence = 0
+        self.streams = 0
+
+    def publish(self):
+        with self.condition:
+            self.sequence += 1
+            self.condition.notify_all()
+
+    def wait(self, sequence, timeout):
+        """Block until something is published after `sequence` or timeout; returns the current sequence"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.sequence != sequence, timeout)
+            return self.sequence
+
+    def open_stream(self, limit):
+        """Take one of `limit` stream slots (0 = no limit); False when all are taken"""
+        with self.condition:
+            if limit and self.streams >= limit:
+                return False
+            self.streams += 1
+            return True
+
+    def close_stream(self):
+        with self.condition:
+            self.streams -= 1
+
+
+# Global instance
+attendance_feed = AttendanceFeed()
@@ -0,0 +1,211 @@
+import hashlib
+import os
+import numpy as np
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ExactIndex:
+    """Brute-force search over the whole gallery (always exact)"""
+
+    name = 'exact'
+
+    def __init__(self, gallery):
+        self.gallery = gallery
+
+    def build(self):
+        pass
+
+    def add(self, rows):
+        pass
+
+    def search(self, probes, k=1):
+        return self.gallery.exact_search(probes, k)
+
+
+class IVFIndex:
+    """
+    Inverted-file index over the gallery.
+
+    Encodings are partitioned into `nlist` k-means cells. A probe is compared
+    with the centroids first and then exactly with the members of its
+    `nprobe` nearest cells only, so recall and latency are traded through
+    `nprobe`. Distances on the candidates are exact, only the candidate set
+    is approximate.
+    """
+
+    name = 'ivf'
+
+    def __init__(self, gallery, nlist=None, nprobe=None, train_iterations=10, seed=0):
+        self.gallery = gallery
+        self.nlist = nlist or Config.FACE_INDEX_NLIST
+        self.nprobe = nprobe or Config.FACE_INDEX_NPROBE
+        self.train_iterations = train_iterations
+        self.seed = seed
+        self.centroids = None
+        self.lists = []
+        self.n_rows = 0
+
+    def _auto_nlist(self, n):
+        return max(1, min(n, int(4 * np.sqrt(n))))
+
+    def _assign(self, vectors, chunk=65536):
+        """Index of the nearest centroid for every vector"""
+        centroid_norms = np.einsum('ij,ij->i', self.centroids, self.centroids)
+        assignments = np.empty(vectors.shape[0], dtype=np.int64)
+        for start in range(0, vectors.shape[0], chunk):
+            block = np.asarray(vectors[start:start + chunk], dtype=np.float32)
+            # ||c||^2 - 2 x.c orders centroids the same way as ||x - c||^2
+            scores = block @ self.centroids.T
+            scores *= -2.0
+            scores += centroid_norms[None, :]
+            assignments[start:start + chunk] = np.argmin(scores, axis=1)
+        return assignments
+
+    def build(self):
+        """Train centroids with k-means and fill the inverted lists"""
+        encodings = self.gallery.encodings
+        n = encodings.shape[0]
+        self.n_rows = n
+        if n == 0:
+            self.centroids = np.empty((0, self.gallery.dim), dtype=np.float32)
+            self.lists = []
+            return
+
+        nlist = min(self.nlist or self._auto_nlist(n), n)
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(n, nlist * 64)
+        sample = np.asarray(encodings[np.sort(rng.choice(n, sample_size, replace=False))], dtype=np.float32)
+
+        self.centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(self.train_iterations):
+            assignments = self._assign(sample)
+            counts = np.bincount(assignments, minlength=nlist)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, assignments, sample)
+            filled = counts > 0
+            self.centroids[filled] = sums[filled] / counts[filled, None]
+
+        assignments = self._assign(encodings)
+        order = np.argsort(assignments, kind='stable')
+        bounds = np.searchsorted(assignments[order], np.arange(nlist + 1))
+        self.lists = [order[bounds[i]:bounds[i + 1]] for i in range(nlist)]
+        logger.info(f"Built IVF index with {nlist} lists over {n} encodings")
+
+    def add(self, rows):
+        """Assign newly appended gallery rows to their nearest lists"""
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) == 0:
+            return
+        if self.centroids is None or len(self.centroids) == 0:
+            self.build()
+            return
+        for row, cell in zip(rows, self._assign(self.gallery.encodings[rows])):
+            self.lists[cell] = np.append(self.lists[cell], row)
+        self.n_rows = max(self.n_rows, int(rows.max()) + 1)
+
+    def search(self, probes, k=1):
+        probes = np.asarray(probes, dtype=np.float32).reshape(-1, self.gallery.dim)
+        n_probes = probes.shape[0]
+        if self.centroids is None or len(self.centroids) == 0 or n_probes == 0:
+            return self.gallery.exact_search(probes, k)
+
+        nprobe = min(self.nprobe, len(self.centroids))
+        centroid_scores = probes @ self.centroids.T
+        centroid_scores *= -2.0
+        centroid_scores += np.einsum('ij,ij->i', self.centroids, self.centroids)[None, :]
+        cells = np.argpartition(centroid_scores, nprobe - 1, axis=1)[:, :nprobe]
+
+        ids = np.full((n_probes, k), None, dtype=object)
+        dists = np.full((n_probes, k), np.inf, dtype=np.float32)
+        for i in range(n_probes):
+            candidates = np.concatenate([self.lists[c] for c in cells[i]])
+            if len(candidates) == 0:
+                continue
+            cand_ids, cand_dists = self.gallery.exact_search(probes[i:i + 1], k, rows=candidates)
+            ids[i, :cand_ids.shape[1]] = cand_ids[0]
+            dists[i, :cand_dists.shape[1]] = cand_dists[0]
+        return ids, dists
+
+    def fingerprint(self, n_rows):
+        digest = hashlib.sha1()
+        ids = self.gallery.ids[:n_rows]
+        if ids.dtype.kind == 'S':
+            digest.update(np.ascontiguousarray(ids).tobytes())
+        else:
+            for student_id in ids:
+                digest.update(str(student_id).encode('utf-8'))
+                digest.update(b'\0')
+        return digest.hexdigest()
+
+    def save(self, path):
+        if self.centroids is None:
+            return
+        sizes = np.array([len(rows) for rows in self.lists], dtype=np.int64)
+        members = np.concatenate(self.lists) if self.lists else np.empty(0, dtype=np.int64)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path,
+                 centroids=self.centroids,
+                 sizes=sizes,
+                 members=members,
+                 n_rows=self.n_rows,
+                 fingerprint=self.fingerprint(self.n_rows))
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        """
+        Load a persisted index if it still describes a prefix of the gallery
+        Returns: True if loaded, False if it has to be rebuilt
+        """
+        if not os.path.exists(path):
+            return False
+        try:
+            with np.load(path) as data:
+                n_rows = int(data['n_rows'])
+                if n_rows > len(self.gallery) or str(data['fingerprint']) != self.fingerprint(n_rows):
+                    return False
+                self.centroids = data['centroids'].astype(np.float32)
+                offsets = np.concatenate([[0], np.cumsum(data['sizes'])])
+                members = data['members']
+                self.lists = [members[offsets[i]:offsets[i + 1]] for i in range(len(self.centroids))]
+                self.n_rows = n_rows
+        except Exception as e:
+            logger.error(f"Error loading face index {path}: {e}")
+            return False
+
+        # Rows enrolled after the index was saved
+        self.add(np.arange(n_rows, len(self.gallery)))
+        return True
+
+
+INDEX_TYPES = {
+    ExactIndex.name: ExactIndex,
+    IVFIndex.name: IVFIndex,
+}
+
+
+def create_index(gallery, kind=None, path=None):
+    """
+    Build the search index selected by Config.FACE_INDEX for a loaded gallery
+    path: file the built index is saved to and reloaded from (default
+    Config.FACE_INDEX_PATH, else face_index.npz in Config.FACE_ENCODINGS_DIR)
+    """
+    kind = kind or Config.FACE_INDEX
+    path = path or Config.FACE_INDEX_PATH or os.path.join(Config.FACE_ENCODINGS_DIR, 'face_index.npz')
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown face index type: {kind}")
+
+    # Below this size a brute-force scan is already cheaper than the index
+    if kind == ExactIndex.name or len(gallery) < Config.FACE_INDEX_MIN_SIZE:
+        return ExactIndex(gallery)
+
+    index = INDEX_TYPES[kind](gallery)
+    if not index.load(path):
+        index.build()
+        try:
+            index.save(path)
+        except OSError as e:
+            logger.error(f"Error saving face index: {e}")
+    return index
@@ -1,126 +1,220 @@
 import face_recognition
 import cv2
 import numpy as np
-import pickle
+import glob
 import os
+import threading
 from config import Config
+from utils.gallery import FaceGallery
+from utils.face_index import create_index
+from utils.encoding_store import encoding_store
+from utils.detection import FaceDetector, StageTimer
+from utils.recognition_cache import recognition_cache, face_hash
+from utils.encode_batcher import EncodingBatcher
+from utils.templates import build_template, TemplateError
+from utils.quality import quality_filter, REASONS
 import logging
 
 logger = logging.getLogger(__name__)
 
 class FaceRecognitionSystem:
-    def __init__(self):
-        self.known_face_encodings = []
-        self.known_face_ids = []
+    def __init__(self, store=None, cache=None):
+        self.gallery = FaceGallery()
+        self.store = store or encoding_store
+        self.cache = cache or recognition_cache
+        # Shared encode + match batches across concurrent requests
+        self.batcher = EncodingBatcher(self) if Config.ENCODE_BATCHING else None
         self.tolerance = Config.TOLERANCE
         self.model = Config.MODEL
+        self.detector = FaceDetector(model=self.model)
+        # Enrollment photos are few and set the template for every later scan: no downscale, no cascade
+        self.enroll_detector = FaceDetector(model=self.model, scale=1.0, cascade='')
+        # Store header (count, generation, removed) the gallery is in sync with
+        self.synced = None
+        self.refresh_lock = threading.Lock()
+    
+    @property
+    def index_path(self):
+        """Where this gallery's search index is saved: with its encoding store unless FACE_INDEX_PATH is set"""
+        return Config.FACE_INDEX_PATH or os.path.join(self.store.directory, 'face_index.npz')
     
     def load_known_faces(self):
         """Load all enrolled face encodings"""
-        self.known_face_encodings = []
-        self.known_face_ids = []
+        self.gallery.clear()
+        self.cache.clear()
+        self.synced = None
+        
+        if not self.store.exists():
+            if glob.glob(os.path.join(self.store.directory, '*.pkl')):
+                logger.warning("Found legacy .pkl face encodings but no encoding store; "
+                               "run `python -m scripts.migrate_encodings` to import them")
+            self.synced = self.store.read_header()
+            return
         
-        if not os.path.exists(Config.FACE_ENCODINGS_DIR):
+        try:
+            ids, encodings, sq_norms, header = self.store.snapshot()
+        except Exception as e:
+            logger.error(f"Error loading encoding store: {e}")
             return
         
-        for filename in os.listdir(Config.FACE_ENCODINGS_DIR):
-            if filename.endswith('.pkl'):
-                filepath = os.path.join(Config.FACE_ENCODINGS_DIR, filename)
-                try:
-                    with open(filepath, 'rb') as f:
-                        data = pickle.load(f)
-                        self.known_face_encodings.append(data['encoding'])
-                        self.known_face_ids.append(data['student_id'])
-                except Exception as e:
-                    logger.error(f"Error loading face encoding {filename}: {e}")
-        
-        logger.info(f"Loaded {len(self.known_face_encodings)} face encodings")
+        self.gallery.load(ids, encodings, sq_norms)
+        self.gallery.index = create_index(self.gallery, path=self.index_path)
+        self.synced = header
+        logger.info(f"Loaded {len(self.gallery)} face encodings")
     
-    def enroll_face(self, image_data, student_id):
+    def refresh(self):
         """
-        Enroll a new face
-        image_data: numpy array of image
-        student_id: unique identifier for student
+        Pick up enrollments and removals made by any worker since the last sync.
+        Costs one header read when nothing changed and O(delta) otherwise.
         """
-        try:
-            # Detect faces in the image
-            face_locations = face_recognition.face_locations(image_data, model=self.model)
+        with self.refresh_lock:
+            if self.synced is None:
+                self.load_known_faces()
+                return
             
-            if len(face_locations) == 0:
-                return False, "No face detected in the image"
+            header = self.store.read_header()
+            if header['generation'] == self.synced['generation']:
+                return
             
-            if len(face_locations) > 1:
-                return False, "Multiple faces detected. Please ensure only one face is visible"
+            # The store was replaced (e.g. re-migrated) rather than appended to
+            if header['count'] < self.synced['count'] or header['removed'] < self.synced['removed']:
+                self.load_known_faces()
+                return
             
-            # Get face encoding
-            face_encodings = face_recognition.face_encodings(image_data, face_locations)
+            ids, encodings, new_sq_norms, removed_rows, header = self.store.changes_since(
+                self.synced['count'], self.synced['removed'])
+            self.gallery.apply_changes(ids, encodings, new_sq_norms, removed_rows)
+            # Cached results may name a removed or re-enrolled student
+            self.cache.clear()
             
-            if len(face_encodings) == 0:
-                return False, "Could not generate face encoding"
+            # A gallery that grew past the index threshold gets its index now
+            if self.gallery.index is None or self.gallery.index.name != Config.FACE_INDEX:
+                self.gallery.index = create_index(self.gallery, path=self.index_path)
             
-            encoding = face_encodings[0]
+            self.synced = header
+            logger.info(f"Applied {len(new_sq_norms)} new and {len(removed_rows)} removed face encodings")
+    
+    def warm_up(self, timer=None):
+        """
+        Load the gallery and run one dummy detection, encoding and match, so the
+        first real scan pays for neither model loading nor cold caches
+        Returns: stage timings (ms)
+        """
+        timer = timer or StageTimer()
+        with timer.stage('refresh'):
+            self.refresh()
+        frame = np.zeros((240, 320, 3), dtype=np.uint8)
+        self.detector.detect(frame, timer)
+        with timer.stage('encode'):
+            encodings = face_recognition.face_encodings(frame, [(60, 200, 180, 80)])
+        with timer.stage('match'):
+            self.gallery.match(encodings, self.tolerance)
+        return timer.timings
+    
+    def enroll_face(self, image_data, student_id, extend=False):
+        """
+        Enroll a new face
+        image_data: numpy array of image, or a list of them (several samples of the same student)
+        student_id: unique identifier for student
+        extend: merge the samples into the student's current template instead of replacing it
+        """
+        try:
+            images = image_data if isinstance(image_data, (list, tuple)) else [image_data]
+            samples, error = self.encode_enrollment_images(images)
+            if samples is None:
+                return False, error
+            
+            if extend:
+                samples = np.vstack([self.store.get(student_id), samples])
             
-            # Save encoding
-            encoding_path = os.path.join(Config.FACE_ENCODINGS_DIR, f"{student_id}.pkl")
-            with open(encoding_path, 'wb') as f:
-                pickle.dump({
-                    'student_id': student_id,
-                    'encoding': encoding
-                }, f)
+            # Reduce the samples to a medoid plus a few exemplars
+            try:
+                template = build_template(samples)
+            except TemplateError as e:
+                return False, str(e)
             
-            logger.info(f"Face enrolled successfully for student {student_id}")
-            return True, encoding_path
+            # Save template (replaces the student's earlier rows)
+            self.store.add(student_id, template)
+            self.refresh()
+            
+            logger.info(f"Face enrolled successfully for student {student_id} "
+                        f"({len(samples)} samples, {len(template)} template rows)")
+            return True, self.store.data_path
             
         except Exception as e:
             logger.error(f"Error enrolling face: {e}")
             return False, str(e)
     
-    def recognize_face(self, image_data):
+    def encode_enrollment_images(self, images):
+        """
+        Encode every enrollment photo of one student
+        Returns: ((K, 128) encodings, None) or (None, error message naming the failing photo)
+        """
+        encodings = []
+        for index, image in enumerate(images):
+            encoding, error = self.encode_enrollment_image(image)
+            if encoding is None:
+                return None, error if len(images) == 1 else f"Image {index + 1}: {error}"
+            encodings.append(encoding)
+        if not encodings:
+            return None, "No face detected in the image"
+        return np.array(encodings, dtype=np.float32), None
+    
+    def encode_enrollment_image(self, image_data):
+        """
+        Check that an enrollment photo shows exactly one face and encode it
+        Returns: (encoding, None) or (None, error message)
+        """
+        # Detect faces in the image
+        face_locations = self.enroll_detector.detect(image_data)
+        
+        if len(face_locations) == 0:
+            return None, "No face detected in the image"
+        
+        if len(face_locations) > 1:
+            return None, "Multiple faces detected. Please ensure only one face is visible"
+        
+        # Get face encoding
+        face_encodings = face_recognition.face_encodings(image_data, face_locations)
+        
+        if len(face_encodings) == 0:
+            return None, "Could not generate face encoding"
+        
+        return face_encodings[0], None
+    
+    def recognize_face(self, image_data, timer=None):
         """
         Recognize a face from image
+        timer: optional StageTimer that receives per-stage timings
         Returns: (student_id, confidence) or (None, 0)
         """
+        timer = timer or StageTimer()
         try:
-            # Load known faces if not loaded
-            if len(self.known_face_encodings) == 0:
-                self.load_known_faces()
+            # Pick up faces enrolled or removed by any worker
+            with timer.stage('refresh'):
+                self.refresh()
             
-            if len(self.known_face_encodings) == 0:
+            if len(self.gallery) == 0:
                 return None, 0, "No enrolled faces found"
             
             # Detect faces
-            face_locations = face_recognition.face_locations(image_data, model=self.model)
+            face_locations = self.detector.detect(image_data, timer)
             
             if len(face_locations) == 0:
                 return None, 0, "No face detected"
             
-            # Get encodings
-            face_encodings = face_recognition.face_encodings(image_data, face_locations)
-            
-            if len(face_encodings) == 0:
-                return None, 0, "Could not generate face encoding"
-            
-            # Compare with known faces
-            for face_encoding in face_encodings:
-                matches = face_recognition.compare_faces(
-                    self.known_face_encodings, 
-                    face_encoding, 
-                    tolerance=self.tolerance
-                )
-                face_distances = face_recognition.face_distance(
-                    self.known_face_encodings, 
-                    face_encoding
-                )
-                
-                if len(face_distances) > 0:
-                    best_match_index = np.argmin(face_distances)
-                    
-                    if matches[best_match_index]:
-                        student_id = self.known_face_ids[best_match_index]
-                        confidence = float(1 - face_distances[best_match_index])
-                        
-                        logger.info(f"Face recognized: {student_id} with confidence {confidence}")
-                        return student_id, confidence, "Success"
+            # Faces far from the camera encode poorly: skip them and ask the student to move closer
+            face_locations = [box for box in face_locations if quality_filter.large_enough(box, image_data.shape[0])]
+            if len(face_locations) == 0:
+                return None, 0, REASONS['face_too_small']
+            
+            # Encode and compare every face in the frame with the gallery in one batch
+            matches = self._identify_faces([(image_data, location) for location in face_locations], timer)
+            
+            for student_id, confidence in matches:
+                if student_id is not None:
+                    logger.info(f"Face recognized: {student_id} with confidence {confidence}")
+                    return student_id, confidence, "Success"
             
             return None, 0, "Face not recognized"
             
@@ -128,10 +222,148 @@ class FaceRecognitionSystem:
             logger.error(f"Error recognizing face: {e}")
             return None, 0, str(e)
     
+    def recognize_faces(self, images, timer=None):
+        """
+        Recognize every face in one or more images (group photos, multi-frame uploads)
+        Faces from all images are matched against the gallery in a single call,
+        and each student is reported once with their best confidence.
+        Returns: (matches, faces_detected, message) where matches is a list of
+        dicts with student_id, confidence, image index and face location
+        """
+        timer = timer or StageTimer()
+        try:
+            with timer.stage('refresh'):
+                self.refresh()
+            
+            if len(self.gallery) == 0:
+                return [], 0, "No enrolled faces found"
+            
+            faces = []
+            face_sources = []
+            for image_index, image_data in enumerate(images):
+                face_locations = self.detector.detect(image_data, timer)
+                faces.extend((image_data, location) for location in face_locations)
+                face_sources.extend((image_index, location) for location in face_locations)
+            
+            if len(faces) == 0:
+                return [], 0, "No face detected"
+            
+            matches = self._identify_faces(faces, timer)
+            
+            best = {}
+            for (student_id, confidence), (image_index, location) in zip(matches, face_sources):
+                if student_id is None:
+                    continue
+                if student_id not in best or confidence > best[student_id]['confidence']:
+                    best[student_id] = {
+                        'student_id': student_id,
+                        'confidence': confidence,
+                        'image': image_index,
+                        'location': list(location)
+                    }
+            
+            logger.info(f"Recognized {len(best)} of {len(faces)} faces in {len(images)} images")
+            return list(best.values()), len(faces), "Success"
+            
+        except Exception as e:
+            logger.error(f"Error recognizing faces: {e}")
+            return [], 0, str(e)
+    
+    def identify(self, image_data, face_locations, timer=None, session=None):
+        """
+        Encode faces at already known locations and match them in one batch
+        session: id of the tracked scan session the image belongs to, if any
+        Returns: list of (student_id, confidence), (None, 0.0) for unrecognized faces
+        """
+        timer = timer or StageTimer()
+        with timer.stage('refresh'):
+            self.refresh()
+        
+        if len(face_locations) == 0 or len(self.gallery) == 0:
+            return [(None, 0.0)] * len(face_locations)
+        
+        return self._identify_faces([(image_data, location) for location in face_locations], timer, session)
+    
+    def _identify_faces(self, faces, timer, session=None):
+        """
+        Identify faces given as (image, location) pairs
+        A face whose crop matches a recent recognition in the same scan session,
+        or whose encoding matches any recent recognition, reuses it;
+        the rest are encoded per image and matched in one gallery call, or
+        handed to the batcher to share both with concurrent requests.
+        Returns: list of (student_id, confidence), (None, 0.0) for unrecognized faces
+        """
+        results = [None] * len(faces)
+        hashes = [None] * len(faces)
+        
+        # Outside a tracked session a crop hash can never be trusted, so it is not computed
+        if self.cache.enabled and session is not None:
+            with timer.stage('cache'):
+                for i, (image_data, location) in enumerate(faces):
+                    hashes[i] = face_hash(image_data, location)
+                    results[i] = self.cache.lookup_hash(hashes[i], session)
+        
+        pending = [i for i, result in enumerate(results) if result is None]
+        if not pending:
+            return results
+        
+        if self.batcher is not None:
+            with timer.stage('encode_match'):
+                encodings, matches = self.batcher.identify([faces[i] for i in pending])
+            for i, encoding, (student_id, distance) in zip(pending, encodings, matches):
+                if student_id is None:
+                    results[i] = (None, 0.0)
+                    continue
+                results[i] = (student_id, float(1 - distance))
+                self.cache.put(student_id, results[i][1], hashes[i], encoding, session)
+            return results
+        
+        # One encoder call per image
+        encodings = {}
+        with timer.stage('encode'):
+            by_image = {}
+            for i in pending:
+                by_image.setdefault(id(faces[i][0]), []).append(i)
+            for indexes in by_image.values():
+                image_data = faces[indexes[0]][0]
+                computed = face_recognition.face_encodings(image_data, [faces[i][1] for i in indexes])
+                encodings.update(zip(indexes, computed))
+        
+        to_match = []
+        for i in pending:
+            if i not in encodings:
+                results[i] = (None, 0.0)
+                continue
+            cached = self.cache.lookup_encoding(encodings[i])
+            if cached is not None:
+                results[i] = cached
+                self.cache.remember_hash(cached[0], hashes[i], session)
+            else:
+                to_match.append(i)
+        
+        if to_match:
+            with timer.stage('match'):
+                matches = self.gallery.match([encodings[i] for i in to_match], self.tolerance)
+            for i, (student_id, distance) in zip(to_match, matches):
+                if student_id is None:
+                    results[i] = (None, 0.0)
+                    continue
+                results[i] = (student_id, float(1 - distance))
+                self.cache.put(student_id, results[i][1], hashes[i], encodings[i], session)
+        
+        return results
+    
+    def remove_face(self, student_id):
+        """Remove a student's encodings so they can no longer be recognized"""
+        removed = self.store.remove(student_id)
+        self.refresh()
+        logger.info(f"Removed {removed} face encodings for student {student_id}")
+        return removed > 0
+    
     def detect_face_in_frame(self, image_data):
         """Simple face detection for live video"""
         try:
-            face_locations = face_recognition.face_locations(image_data, model='hog')
+            face_locations = self.detector.detect(image_data)
             return len(face_locations) > 0, face_locations
         except Exception as e:
             logger.error(f"Error detecting face: {e}")
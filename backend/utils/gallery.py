@@ -0,0 +1,171 @@
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+ENCODING_DIM = 128
+
+
+class FaceGallery:
+    """
+    In-memory gallery of enrolled face encodings.
+
+    Encodings live in one contiguous float32 (N, 128) matrix with an aligned
+    array of student ids and precomputed squared norms, so matching a whole
+    frame worth of probes is a single matrix multiply. A student enrolled
+    with several samples has one row per template entry (see
+    utils/templates.py); the nearest row is their distance.
+    """
+
+    def __init__(self, dim=ENCODING_DIM):
+        self.dim = dim
+        self.clear()
+
+    def clear(self):
+        self.index = None
+        self.encodings = np.empty((0, self.dim), dtype=np.float32)
+        self.ids = np.empty(0, dtype=object)
+        self.sq_norms = np.empty(0, dtype=np.float32)
+        self._norms_buffer = self.sq_norms
+
+    def __len__(self):
+        return self.encodings.shape[0]
+
+    def load(self, student_ids, encodings, sq_norms=None):
+        """
+        Replace the gallery contents with the given ids and encodings.
+        Arrays that are already float32 and contiguous (e.g. memory-mapped
+        from the encoding store) are used in place without copying.
+        """
+        matrix = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        if matrix.shape[0] != len(student_ids):
+            raise ValueError("student_ids and encodings must have the same length")
+
+        self.index = None
+        self.encodings = np.ascontiguousarray(matrix)
+        if isinstance(student_ids, np.ndarray):
+            self.ids = student_ids
+        else:
+            self.ids = np.array(list(student_ids), dtype=object)
+        if sq_norms is None:
+            sq_norms = np.einsum('ij,ij->i', self.encodings, self.encodings)
+        self.sq_norms = np.asarray(sq_norms, dtype=np.float32)
+        self._norms_buffer = self.sq_norms
+
+    def add(self, student_id, encodings):
+        """Append the encoding(s) of one student, shaped (128,) or (K, 128), to the gallery"""
+        rows = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        old_count = len(self)
+        self.encodings = np.vstack([self.encodings, rows])
+        self.ids = np.append(self.ids.astype(object), np.array([student_id] * len(rows), dtype=object))
+        self.sq_norms = np.append(self.sq_norms, np.einsum('ij,ij->i', rows, rows))
+        self._norms_buffer = self.sq_norms
+        if self.index is not None:
+            self.index.add(np.arange(old_count, len(self)))
+
+    def apply_changes(self, student_ids, encodings, new_sq_norms, removed_rows):
+        """
+        Catch up with a grown encoding store without reloading it.
+        student_ids and encodings map every row (old and new ones),
+        new_sq_norms covers only the appended rows and removed_rows are
+        rows tombstoned since the last sync. Cost is O(delta).
+        """
+        old_count = len(self)
+        new_count = old_count + len(new_sq_norms)
+        if len(student_ids) != new_count or encodings.shape[0] != new_count:
+            raise ValueError("Encoding store delta does not line up with the gallery")
+
+        self.encodings = encodings
+        self.ids = student_ids
+
+        # Norms are the only per-worker copy; grow them geometrically
+        if new_count > len(self._norms_buffer):
+            buffer = np.empty(max(new_count, 2 * len(self._norms_buffer)), dtype=np.float32)
+            buffer[:old_count] = self.sq_norms
+            self._norms_buffer = buffer
+        self._norms_buffer[old_count:new_count] = new_sq_norms
+        self.sq_norms = self._norms_buffer[:new_count]
+        if len(removed_rows):
+            self.sq_norms[removed_rows] = np.inf
+
+        if self.index is not None and new_count > old_count:
+            self.index.add(np.arange(old_count, new_count))
+
+    def distances(self, probes, rows=None):
+        """
+        Euclidean distances between probes and gallery encodings
+        probes: (P, 128) array-like
+        rows: optional subset of gallery rows to compare against
+        Returns: (P, N) float32 array
+        """
+        probes = np.asarray(probes, dtype=np.float32).reshape(-1, self.dim)
+        probe_norms = np.einsum('ij,ij->i', probes, probes)
+        if rows is None:
+            encodings, sq_norms = self.encodings, self.sq_norms
+        else:
+            encodings, sq_norms = self.encodings[rows], self.sq_norms[rows]
+
+        # ||a - b||^2 = ||a||^2 + ||b||^2 - 2 a.b, one GEMM for all probes
+        sq = probes @ encodings.T
+        sq *= -2.0
+        sq += probe_norms[:, None]
+        sq += sq_norms[None, :]
+        np.maximum(sq, 0.0, out=sq)
+        return np.sqrt(sq, out=sq)
+
+    def search(self, probes, k=1):
+        """
+        Find the k closest gallery entries for each probe, through the
+        configured index if there is one
+        Returns: (ids, distances), both shaped (P, k) and sorted by distance
+        """
+        if self.index is not None:
+            return self.index.search(probes, k)
+        return self.exact_search(probes, k)
+
+    def exact_search(self, probes, k=1, rows=None):
+        """Brute-force top-k over the whole gallery or a subset of its rows"""
+        probes = np.asarray(probes, dtype=np.float32).reshape(-1, self.dim)
+        ids = self.ids if rows is None else self.ids[rows]
+        n = len(ids)
+        if n == 0 or probes.shape[0] == 0:
+            return (np.empty((probes.shape[0], 0), dtype=object),
+                    np.empty((probes.shape[0], 0), dtype=np.float32))
+
+        k = min(k, n)
+        dists = self.distances(probes, rows)
+
+        if k < n:
+            top = np.argpartition(dists, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(n), dists.shape)
+        top_dists = np.take_along_axis(dists, top, axis=1)
+        order = np.argsort(top_dists, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+
+        top_dists = np.take_along_axis(top_dists, order, axis=1)
+        return self._result_ids(ids[top], top_dists), top_dists
+
+    @staticmethod
+    def _result_ids(ids, dists):
+        """Plain str ids, None where the row can never match (removed entries)"""
+        if ids.dtype.kind == 'S':
+            ids = np.char.decode(ids, 'utf-8')
+        ids = ids.astype(object)
+        ids[~np.isfinite(dists)] = None
+        return ids
+
+    def match(self, probes, tolerance):
+        """
+        Best match for each probe within tolerance; with multi-row templates
+        this is the student whose closest template row is nearest
+        Returns: list of (student_id, distance) or (None, distance) per probe
+        """
+        ids, dists = self.search(probes, k=1)
+        results = []
+        for row_ids, row_dists in zip(ids, dists):
+            if len(row_dists) and row_dists[0] <= tolerance:
+                results.append((row_ids[0], float(row_dists[0])))
+            else:
+                results.append((None, float(row_dists[0]) if len(row_dists) else 1.0))
+        return results
@@ -0,0 +1,129 @@
+import binascii
+import threading
+from contextlib import nullcontext
+import cv2
+import numpy as np
+from flask import request
+import logging
+
+logger = logging.getLogger(__name__)
+
+RAW_IMAGE_TYPES = {'image/jpeg', 'image/jpg', 'image/png', 'application/octet-stream'}
+READ_CHUNK = 64 * 1024
+
+_local = threading.local()
+
+
+class ImageDecodeError(ValueError):
+    pass
+
+
+def _buffer(size):
+    """Per-thread scratch buffer reused across requests, grown on demand"""
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is None or len(buffer) < size:
+        buffer = bytearray(max(size, 2 * len(buffer) if buffer else READ_CHUNK))
+        _local.buffer = buffer
+    return buffer
+
+
+def _read_stream(stream, length=None):
+    """Read a file-like object into the scratch buffer; returns a memoryview of the bytes read"""
+    # One spare byte so a correct Content-Length never triggers a regrow
+    buffer = _buffer((length or READ_CHUNK) + 1)
+    view = memoryview(buffer)
+    readinto = getattr(stream, 'readinto', None)
+    total = 0
+    while True:
+        if total == len(buffer):
+            # Unknown or wrong Content-Length: grow and keep what was read so far
+            buffer = _buffer(2 * len(buffer))
+            buffer[:total] = view[:total]
+            view = memoryview(buffer)
+        if readinto is not None:
+            n = readinto(view[total:])
+        else:
+            chunk = stream.read(len(buffer) - total)
+            n = len(chunk)
+            view[total:total + n] = chunk
+        if not n:
+            return view[:total]
+        total += n
+
+
+def _stage(timer, name):
+    return timer.stage(name) if timer is not None else nullcontext()
+
+
+def decode_image(data, reduced=False, timer=None):
+    """
+    Decode encoded image bytes (any buffer) into an RGB array
+    reduced: decode at half resolution (IMREAD_REDUCED_COLOR_2), which for JPEG
+    is done in the DCT domain and is much cheaper than a full decode
+    timer: optional StageTimer, charged under 'imdecode'
+    """
+    flags = cv2.IMREAD_REDUCED_COLOR_2 if reduced else cv2.IMREAD_COLOR
+    with _stage(timer, 'imdecode'):
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), flags)
+        if image is None:
+            raise ImageDecodeError("Could not decode image")
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+
+
+def decode_data_url(data_url, reduced=False, timer=None):
+    """Decode a base64 data URL (the legacy JSON format) into an RGB array"""
+    try:
+        with _stage(timer, 'base64'):
+            raw = binascii.a2b_base64(data_url.split(',', 1)[-1])
+    except (binascii.Error, AttributeError) as e:
+        raise ImageDecodeError(f"Invalid base64 image: {e}")
+    return decode_image(raw, reduced, timer)
+
+
+def is_raw_image_request(req=None):
+    req = req or request
+    return req.mimetype in RAW_IMAGE_TYPES
+
+
+def request_fields(req=None):
+    """Form fields of the request: the JSON body, or form fields plus query args for binary uploads"""
+    req = req or request
+    if req.is_json:
+        return req.get_json(silent=True) or {}
+    fields = req.args.to_dict()
+    if req.mimetype == 'multipart/form-data':
+        fields.update(req.form.to_dict())
+    return fields
+
+
+def read_images(req=None, reduced=False, timer=None):
+    """
+    Decode every image sent with the request, whichever way it was sent:
+    - a raw image/jpeg (or png) body, read straight from the request stream
+    - multipart/form-data file fields named 'image' or 'images'
+    - JSON with an 'image' data URL or an 'images' list (backward compatible)
+    timer: optional StageTimer; reading the body is charged under 'read',
+    base64 under 'base64' and cv2.imdecode under 'imdecode'
+    Returns: list of RGB arrays (empty if the request carries no image)
+    """
+    req = req or request
+
+    if is_raw_image_request(req):
+        with _stage(timer, 'read'):
+            data = _read_stream(req.stream, req.content_length)
+        return [decode_image(data, reduced, timer)] if len(data) else []
+
+    if req.mimetype == 'multipart/form-data':
+        with _stage(timer, 'read'):
+            files = req.files.getlist('image') + req.files.getlist('images')
+        images = []
+        for f in files:
+            with _stage(timer, 'read'):
+                data = _read_stream(f.stream, f.content_length or None)
+            images.append(decode_image(data, reduced, timer))
+        return images
+
+    with _stage(timer, 'read'):
+        data = req.get_json(silent=True) or {}
+    encoded = data.get('images') or ([data['image']] if data.get('image') else [])
+    return [decode_data_url(d, reduced, timer) for d in encoded]
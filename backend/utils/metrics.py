@@ -0,0 +1,361 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from a cache hit to a slow CNN detection
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    'ams_scan_requests_total': ('counter', 'Scan requests by endpoint and outcome'),
+    'ams_scan_faces_total': ('counter', 'Faces detected in scan requests by endpoint'),
+    'ams_scan_duration_seconds': ('histogram', 'Scan request latency by endpoint'),
+    'ams_stage_duration_seconds': ('histogram', 'Time spent per pipeline stage of a scan request'),
+    'ams_slow_requests_total': ('counter', 'Scan requests slower than METRICS_PROFILE_SLOW_MS'),
+    'ams_gallery_rows': ('gauge', 'Live face encodings in the encoding store'),
+    'ams_recognition_in_flight': ('gauge', 'Recognition jobs queued or running, per worker'),
+    'ams_attendance_queue_depth': ('gauge', 'Check-ins waiting in the write-behind queue, per worker'),
+}
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + (list(extra.items()) if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in items) + '}'
+
+
+class ScanMetrics:
+    """What a route reports about one scan; see MetricsRegistry.track_scan"""
+
+    def __init__(self, endpoint, timer):
+        self.endpoint = endpoint
+        self.timer = timer
+        self.outcome = 'error'
+        self.faces = 0
+
+
+class MetricsRegistry:
+    """
+    Counters, gauges and latency histograms of this worker, exposed in the
+    Prometheus text format.
+
+    Every worker process writes its values to METRICS_DIR/<parent pid>-<pid>.json
+    at most every METRICS_FLUSH_SECONDS (and at exit), and a scrape of any
+    worker merges the files of every worker started by the same parent
+    (the gunicorn master or uvicorn supervisor): counters and histograms are
+    summed, including those of workers that have since exited, so they stay
+    monotonic; per-worker gauges are reported for live workers only, with a
+    pid label. Files of earlier server runs are ignored and cleaned up.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = Config.METRICS_DIR if directory is None else directory
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.last_flush = 0.0
+        self.profiler = SlowRequestProfiler()
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f'{os.getppid()}-{os.getpid()}.json')
+
+    def inc(self, name, labels=None, value=1):
+        key = (name, _key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, labels=None):
+        key = (name, _key(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                # Bucket counts (non-cumulative), then sum and count
+                histogram = self.histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0, 0]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram[i] += 1
+                    break
+            else:
+                histogram[len(BUCKETS)] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+    def set_gauge(self, name, value, labels=None):
+        with self.lock:
+            self.gauges[(name, _key(labels))] = value
+
+    @contextmanager
+    def track_scan(self, endpoint, timer, sample_stacks=True):
+        """
+        Time one scan request and record its outcome, face count and the
+        per-stage timings its StageTimer collected; watched by the slow
+        request profiler when METRICS_PROFILE_SLOW_MS is set
+        sample_stacks: sample the calling thread's stack (False when the
+        request's work runs on other threads)
+        """
+        scan = ScanMetrics(endpoint, timer)
+        start = time.perf_counter()
+        sample = self.profiler.start(sample_stacks)
+        try:
+            yield scan
+        finally:
+            elapsed = time.perf_counter() - start
+            if self.profiler.finish(sample, endpoint, elapsed, timer):
+                self.inc('ams_slow_requests_total', {'endpoint': endpoint})
+            self.record_scan(scan, elapsed)
+
+    def record_scan(self, scan, elapsed):
+        labels = {'endpoint': scan.endpoint}
+        self.inc('ams_scan_requests_total', {'endpoint': scan.endpoint, 'outcome': scan.outcome})
+        if scan.faces:
+            self.inc('ams_scan_faces_total', labels, scan.faces)
+        self.observe('ams_scan_duration_seconds', elapsed, labels)
+        for stage, ms in scan.timer.timings.items():
+            self.observe('ams_stage_duration_seconds', ms / 1000, {'endpoint': scan.endpoint, 'stage': stage})
+        self.maybe_flush()
+
+    def _update_gauges(self):
+        # Imported here: these modules import the models layer, which must not import metrics back
+        from utils.attendance_queue import attendance_writer
+        from utils.recognition_pool import recognition_executor
+        self.set_gauge('ams_recognition_in_flight', recognition_executor.stats()['in_flight'])
+        self.set_gauge('ams_attendance_queue_depth', attendance_writer.stats()['queue_depth'])
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'pid': os.getpid(),
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, labels, values] for (name, labels), values in self.histograms.items()],
+                'gauges': [[name, labels, value] for (name, labels), value in self.gauges.items()],
+            }
+
+    def maybe_flush(self):
+        if self.directory and time.monotonic() - self.last_flush >= Config.METRICS_FLUSH_SECONDS:
+            self.flush()
+
+    def flush(self):
+        """Write this worker's values for the other workers' scrapes"""
+        if not self.directory:
+            return
+        # Request threads and scrapes flush concurrently; they share the temporary file
+        with self.flush_lock:
+            self.last_flush = time.monotonic()
+            try:
+                self._update_gauges()
+                os.makedirs(self.directory, exist_ok=True)
+                path = self.path
+                with open(f'{path}.tmp', 'w') as f:
+                    json.dump(self.snapshot(), f)
+                os.replace(f'{path}.tmp', path)
+            except Exception as e:
+                logger.warning(f"Could not write metrics to {self.directory}: {e}")
+
+    def _snapshots(self):
+        """
+        The values of every worker, all read from the metrics files
+        This worker flushes its own file first instead of adding its live
+        values: merging live values here with files that are up to
+        METRICS_FLUSH_SECONDS old elsewhere would let a counter go back when
+        consecutive scrapes land on different workers. Read from files
+        only, each worker's share comes from one source and never shrinks.
+        """
+        if not self.directory:
+            self._update_gauges()
+            return [self.snapshot()]
+        self.flush()
+        if not os.path.isdir(self.directory):
+            return [self.snapshot()]
+        snapshots = []
+        own = False
+        parent, me = os.getppid(), os.getpid()
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                file_parent, pid = (int(part) for part in name[:-5].split('-'))
+            except ValueError:
+                continue
+            path = os.path.join(self.directory, name)
+            if file_parent != parent:
+                # Left behind by an earlier server run
+                if not _pid_alive(file_parent):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                continue
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if pid == me:
+                own = True
+            elif not _pid_alive(pid):
+                snapshot['gauges'] = []
+            snapshots.append(snapshot)
+        if not own:
+            # Our file could not be written
+            snapshots.append(self.snapshot())
+        return snapshots
+
+    def render(self):
+        """Merged metrics of every worker in the Prometheus text exposition format"""
+        counters, histograms, gauges = {}, {}, {}
+        for snapshot in self._snapshots():
+            for name, labels, value in snapshot['counters']:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, values in snapshot['histograms']:
+                key = (name, tuple(map(tuple, labels)))
+                merged = histograms.setdefault(key, [0] * len(values))
+                for i, value in enumerate(values):
+                    merged[i] += value
+            for name, labels, value in snapshot['gauges']:
+                gauges[(name, tuple(map(tuple, labels)), snapshot['pid'])] = value
+
+        from utils.encoding_store import encoding_store
+        header = encoding_store.read_header()
+        gauges[('ams_gallery_rows', (), None)] = header['count'] - header['removed']
+
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'counter':
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f'{name}{_format_labels(labels)} {value}')
+            elif kind == 'gauge':
+                for (metric, labels, pid), value in sorted(gauges.items(), key=str):
+                    if metric == name:
+                        extra = {'pid': pid} if pid is not None else None
+                        lines.append(f'{name}{_format_labels(labels, extra)} {value}')
+            else:
+                for (metric, labels), values in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS + ('+Inf',), values):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{_format_labels(labels, {"le": bound})} {cumulative}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {values[-2]}')
+                    lines.append(f'{name}_count{_format_labels(labels)} {values[-1]}')
+        return '\n'.join(lines) + '\n'
+
+
+class SlowRequestProfiler:
+    """
+    Opt-in sampling profiler for slow scan requests.
+
+    With METRICS_PROFILE_SLOW_MS set, one background thread samples the
+    Python stack of every thread that is inside a scan request every
+    METRICS_PROFILE_INTERVAL_MS. Requests that end faster than the
+    threshold drop their samples; slower ones are logged with their stage
+    timings and hottest stack, and their samples are appended in collapsed
+    ("folded") form to METRICS_PROFILE_DIR/<endpoint>.folded, ready for
+    flamegraph.pl or speedscope.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = {}
+        self.thread = None
+
+    @property
+    def enabled(self):
+        return Config.METRICS_PROFILE_SLOW_MS > 0
+
+    def start(self, sample_stacks=True):
+        if not self.enabled:
+            return None
+        samples = Counter()
+        if not sample_stacks:
+            return samples
+        with self.lock:
+            self.active[threading.get_ident()] = samples
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='slow-request-profiler', daemon=True)
+                self.thread.start()
+        return samples
+
+    def finish(self, samples, endpoint, elapsed, timer):
+        """Stop sampling this request; returns True if it was slow"""
+        if samples is None:
+            return False
+        with self.lock:
+            self.active.pop(threading.get_ident(), None)
+        elapsed_ms = elapsed * 1000
+        if elapsed_ms < Config.METRICS_PROFILE_SLOW_MS:
+            return False
+
+        timings = {stage: round(ms, 1) for stage, ms in timer.timings.items()}
+        hottest = samples.most_common(1)[0][0].rsplit(';', 3)[-3:] if samples else []
+        logger.warning(f"Slow {endpoint} request: {elapsed_ms:.0f} ms, stages {timings}, "
+                       f"hottest stack {' > '.join(hottest)}")
+        if Config.METRICS_PROFILE_DIR and samples:
+            try:
+                os.makedirs(Config.METRICS_PROFILE_DIR, exist_ok=True)
+                with open(os.path.join(Config.METRICS_PROFILE_DIR, f'{endpoint}.folded'), 'a') as f:
+                    f.writelines(f'{stack} {count}\n' for stack, count in samples.items())
+            except OSError as e:
+                logger.warning(f"Could not write profile samples: {e}")
+        return True
+
+    def _run(self):
+        interval = Config.METRICS_PROFILE_INTERVAL_MS / 1000
+        while True:
+            time.sleep(interval)
+            with self.lock:
+                if not self.active:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, samples in self.active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[self._collapse(frame)] += 1
+
+    @staticmethod
+    def _collapse(frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+            frame = frame.f_back
+        return ';'.join(reversed(stack))
+
+
+# Global instance
+metrics = MetricsRegistry()
+atexit.register(metrics.flush)
@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+import cv2
+import numpy as np
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Reason codes returned to the client, with the message shown to the student
+REASONS = {
+    'too_dark': 'Image too dark, add more light',
+    'too_bright': 'Image overexposed, reduce glare',
+    'blurry': 'Image too blurry, hold still',
+    'static_frame': 'No movement between frames',
+    'face_too_small': 'Face too small, move closer',
+}
+
+# Frames are checked at this size: plenty for blur and exposure, and a fraction of a millisecond
+CHECK_SIZE = (320, 240)
+LIVENESS_SIZE = (64, 48)
+LEVELS = np.arange(256, dtype=np.float32)
+
+
+class QualityFilter:
+    """
+    Cheap frame checks that run before any dlib work.
+
+    Recognition on a dark, overexposed or blurred frame costs a full
+    detection (and often an encoding) and still fails, so such frames are
+    rejected up front with a reason code the kiosk can act on:
+    - exposure: mean brightness from the gray-level histogram, and the share
+      of crushed or blown-out pixels
+    - blur: variance of the Laplacian (little high-frequency detail means
+      motion blur or an unfocused camera)
+    - face_size: faces smaller than a share of the frame height are not
+      encoded (see large_enough); the student is asked to move closer
+    - liveness: a frame nearly identical to the previous one from the same
+      client (a photo on a stand, a frozen or replayed feed) is rejected.
+      A heuristic only, so it is off unless listed in QUALITY_CHECKS
+    Blur and exposure run on a 320x240 grayscale copy of the frame.
+    """
+
+    def __init__(self, checks=None, min_brightness=None, max_brightness=None, max_clipped=None,
+                 blur_threshold=None, min_face=None, liveness_min_diff=None, liveness_window=None,
+                 max_clients=256):
+        checks = checks if checks is not None else Config.QUALITY_CHECKS
+        self.checks = {c.strip() for c in checks.split(',') if c.strip()} if isinstance(checks, str) else set(checks)
+        self.min_brightness = min_brightness if min_brightness is not None else Config.QUALITY_MIN_BRIGHTNESS
+        self.max_brightness = max_brightness if max_brightness is not None else Config.QUALITY_MAX_BRIGHTNESS
+        self.max_clipped = max_clipped if max_clipped is not None else Config.QUALITY_MAX_CLIPPED
+        self.blur_threshold = blur_threshold if blur_threshold is not None else Config.QUALITY_BLUR_THRESHOLD
+        self.min_face = min_face if min_face is not None else Config.QUALITY_MIN_FACE
+        self.liveness_min_diff = (liveness_min_diff if liveness_min_diff is not None
+                                  else Config.QUALITY_LIVENESS_MIN_DIFF)
+        self.liveness_window = liveness_window if liveness_window is not None else Config.QUALITY_LIVENESS_WINDOW
+        self.max_clients = max_clients
+        self.previous = OrderedDict()  # client -> (time, liveness thumbnail)
+        self.lock = threading.Lock()
+        self.metrics = Counter()
+
+    @property
+    def enabled(self):
+        return bool(self.checks)
+
+    def _exposure(self, gray):
+        histogram = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel() / gray.size
+        mean = float(histogram @ LEVELS)
+        if mean < self.min_brightness or histogram[:16].sum() > self.max_clipped:
+            return 'too_dark'
+        if mean > self.max_brightness or histogram[240:].sum() > self.max_clipped:
+            return 'too_bright'
+        return None
+
+    def _blur(self, gray):
+        _, deviation = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_16S))
+        if deviation[0, 0] ** 2 < self.blur_threshold:
+            return 'blurry'
+        return None
+
+    def _liveness(self, gray, client):
+        small = cv2.resize(gray, LIVENESS_SIZE, interpolation=cv2.INTER_AREA)
+        now = time.monotonic()
+        with self.lock:
+            previous = self.previous.pop(client, None)
+            self.previous[client] = (now, small)
+            while len(self.previous) > self.max_clients:
+                self.previous.popitem(last=False)
+        if previous is None or now - previous[0] > self.liveness_window:
+            return None
+        if float(cv2.absdiff(small, previous[1]).mean()) < self.liveness_min_diff:
+            return 'static_frame'
+        return None
+
+    def check_frame(self, image, client=None, timer=None):
+        """
+        Run the frame-level checks on an RGB frame
+        client: key of the camera the frame came from (kiosk or session id),
+        needed by the liveness check only
+        Returns: a reason code from REASONS, or None if the frame is usable
+        """
+        if not self.enabled:
+            return None
+        start = time.perf_counter()
+        # Bilinear rather than area: several times cheaper on HD frames, and blurred input reads the same
+        small = cv2.resize(image, CHECK_SIZE, interpolation=cv2.INTER_LINEAR)
+        gray = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+        reason = None
+        if 'exposure' in self.checks:
+            reason = self._exposure(gray)
+        if reason is None and 'blur' in self.checks:
+            reason = self._blur(gray)
+        if reason is None and 'liveness' in self.checks and client is not None:
+            reason = self._liveness(gray, client)
+        if timer is not None:
+            timer.merge({'quality': (time.perf_counter() - start) * 1000})
+        with self.lock:
+            self.metrics['checked'] += 1
+            if reason is not None:
+                self.metrics[reason] += 1
+        return reason
+
+    def large_enough(self, box, frame_height):
+        """Whether a (top, right, bottom, left) box is big enough to encode, in any coordinates matching frame_height"""
+        if 'face_size' not in self.checks:
+            return True
+        top, right, bottom, left = box
+        return min(bottom - top, right - left) >= self.min_face * frame_height
+
+    def stats(self):
+        with self.lock:
+            metrics = dict(self.metrics)
+        metrics['checks'] = sorted(self.checks)
+        return metrics
+
+
+def rejection(reason):
+    """Response payload for a frame turned away before recognition"""
+    return {'error': REASONS[reason], 'recognized': False, 'reason': reason}
+
+
+# Global instance
+quality_filter = QualityFilter()
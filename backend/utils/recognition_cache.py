@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+import cv2
+import numpy as np
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def face_hash(image, location):
+    """64-bit difference hash (dHash) of the face crop at `location`; None for an empty crop"""
+    top, right, bottom, left = location
+    crop = image[max(0, top):bottom, max(0, left):right]
+    if crop.size == 0:
+        return None
+    gray = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY) if crop.ndim == 3 else crop
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+class RecognitionCache:
+    """
+    Short-lived cache of recent recognitions, with LRU eviction.
+
+    A face in front of the scanner looks almost the same from one frame to
+    the next, so within `ttl` seconds:
+    - a face crop whose perceptual hash is within `hash_bits` bits of the
+      one last recognized in the same tracked scan session reuses that
+      result without encoding or matching. A 64-bit hash does not tell
+      people apart, so it is only trusted for the session that just saw
+      the student: session ids are issued per camera stream, unlike kiosk
+      headers or addresses, which clients behind one NAT or proxy share
+    - an encoding within `distance` of a cached one skips the gallery search
+    Check-ins are also deduplicated: a student written in the last
+    `checkin_window` seconds is not written again.
+    """
+
+    def __init__(self, ttl=None, max_entries=None, hash_bits=None, distance=None, checkin_window=None):
+        self.ttl = ttl if ttl is not None else Config.RECOGNITION_CACHE_TTL
+        self.max_entries = max_entries or Config.RECOGNITION_CACHE_SIZE
+        self.hash_bits = hash_bits if hash_bits is not None else Config.RECOGNITION_CACHE_HASH_BITS
+        self.distance = distance if distance is not None else Config.RECOGNITION_CACHE_DISTANCE
+        self.checkin_window = checkin_window if checkin_window is not None else Config.CHECKIN_DEDUP_SECONDS
+        self.entries = OrderedDict()  # student_id -> entry dict
+        self.checkins = OrderedDict()  # (date, student_id) -> time of the write
+        self.lock = threading.Lock()
+        self.metrics = {
+            'hash_hits': 0,
+            'encoding_hits': 0,
+            'misses': 0,
+            'checkins_written': 0,
+            'checkins_suppressed': 0,
+        }
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def _expire(self, now):
+        # Entries are in LRU order, not expiry order
+        for student_id in [s for s, entry in self.entries.items() if entry['expires'] <= now]:
+            del self.entries[student_id]
+
+    def lookup_hash(self, phash, session):
+        """(student_id, confidence) of a live entry with a near-identical face crop seen in `session`, or None"""
+        if not self.enabled or phash is None or session is None:
+            return None
+        now = time.monotonic()
+        with self.lock:
+            self._expire(now)
+            for student_id, entry in self.entries.items():
+                if entry['session'] != session or entry['hash'] is None:
+                    continue
+                if bin(entry['hash'] ^ phash).count('1') <= self.hash_bits:
+                    self.entries.move_to_end(student_id)
+                    self.metrics['hash_hits'] += 1
+                    return student_id, entry['confidence']
+        return None
+
+    def lookup_encoding(self, encoding):
+        """(student_id, confidence) of a live entry whose encoding is within `distance`, or None"""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self.lock:
+            self._expire(now)
+            if not self.entries:
+                self.metrics['misses'] += 1
+                return None
+            student_ids = list(self.entries)
+            matrix = np.stack([self.entries[s]['encoding'] for s in student_ids])
+            distances = np.linalg.norm(matrix - np.asarray(encoding, dtype=np.float32), axis=1)
+            best = int(np.argmin(distances))
+            if distances[best] > self.distance:
+                self.metrics['misses'] += 1
+                return None
+            student_id = student_ids[best]
+            self.entries.move_to_end(student_id)
+            self.metrics['encoding_hits'] += 1
+            return student_id, self.entries[student_id]['confidence']
+
+    def put(self, student_id, confidence, phash, encoding, session=None):
+        """Remember a confirmed recognition for `ttl` seconds; `session` is the scan session it came from"""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.entries.pop(student_id, None)
+            self.entries[student_id] = {
+                'confidence': confidence,
+                'hash': phash,
+                'session': session,
+                'encoding': np.asarray(encoding, dtype=np.float32),
+                'expires': time.monotonic() + self.ttl
+            }
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def remember_hash(self, student_id, phash, session=None):
+        """Attach the latest face hash (and its session) to a live entry; its expiry and encoding stay as confirmed by the gallery"""
+        with self.lock:
+            entry = self.entries.get(student_id)
+            if entry is not None and phash is not None:
+                entry['hash'] = phash
+                entry['session'] = session
+
+    def clear(self):
+        """Drop cached recognitions, e.g. after the gallery changed"""
+        with self.lock:
+            self.entries.clear()
+
+    def claim_checkins(self, student_ids):
+        """
+        Student ids that should be written now; the rest were written within
+        the dedup window and are skipped. Claimed ids count as written until
+        release_checkins is called for a failed write.
+        """
+        if self.checkin_window <= 0:
+            return list(student_ids)
+        now = time.monotonic()
+        date = datetime.now().strftime('%Y-%m-%d')
+        claimed = []
+        with self.lock:
+            while self.checkins and next(iter(self.checkins.values())) <= now - self.checkin_window:
+                self.checkins.popitem(last=False)
+            for student_id in student_ids:
+                if (date, student_id) in self.checkins:
+                    self.metrics['checkins_suppressed'] += 1
+                    continue
+                self.checkins[(date, student_id)] = now
+                claimed.append(student_id)
+            self.metrics['checkins_written'] += len(claimed)
+        return claimed
+
+    def release_checkins(self, student_ids):
+        """Forget claims whose write failed so the next frame retries them"""
+        date = datetime.now().strftime('%Y-%m-%d')
+        with self.lock:
+            for student_id in student_ids:
+                self.checkins.pop((date, student_id), None)
+            self.metrics['checkins_written'] -= len(student_ids)
+
+    def stats(self):
+        with self.lock:
+            metrics = dict(self.metrics)
+            metrics['size'] = len(self.entries)
+        lookups = metrics['hash_hits'] + metrics['encoding_hits'] + metrics['misses']
+        metrics['hit_rate'] = round((metrics['hash_hits'] + metrics['encoding_hits']) / lookups, 3) if lookups else 0.0
+        metrics['enabled'] = self.enabled
+        return metrics
+
+
+# Global instance
+recognition_cache = RecognitionCache()
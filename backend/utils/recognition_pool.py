@@ -0,0 +1,221 @@
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from config import Config
+from utils.detection import StageTimer
+import logging
+
+logger = logging.getLogger(__name__)
+
+# FaceRecognitionSystem methods that may be run in the pool
+POOL_METHODS = {'recognize_face', 'recognize_faces', 'warm_up'}
+
+
+class RecognitionUnavailable(Exception):
+    """Recognition could not run now; the client should retry after `retry_after` seconds"""
+
+    status = 503
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after if retry_after is not None else Config.RECOGNITION_RETRY_AFTER
+
+
+class RecognitionBusy(RecognitionUnavailable):
+    """The recognition queue is full"""
+
+    status = 429
+
+
+class RecognitionTimeout(RecognitionUnavailable):
+    """No result within the request deadline"""
+
+
+def worker_settings():
+    """Config values to hand to spawned worker processes"""
+    return {name: value for name, value in vars(Config).items() if name.isupper()}
+
+
+def apply_worker_settings(settings):
+    # Spawned workers re-import config; apply the parent's settings, including ones changed at runtime
+    for name, value in settings.items():
+        setattr(Config, name, value)
+
+
+def _init_worker(settings):
+    apply_worker_settings(settings)
+    # Load the gallery once per worker process, before the first request
+    from utils.face_utils import face_system
+    face_system.refresh()
+    logger.info(f"Recognition worker {os.getpid()} ready with {len(face_system.gallery)} encodings")
+
+
+def _run_task(method, args, kwargs, deadline):
+    """Runs inside a worker process; returns (result, stage timings) or None when the deadline passed while queued"""
+    if time.time() > deadline:
+        return None
+    from utils.face_utils import face_system
+    timer = StageTimer()
+    result = getattr(face_system, method)(*args, timer=timer, **kwargs)
+    return result, timer.timings
+
+
+class RecognitionExecutor:
+    """
+    Runs CPU-bound detection and encoding in a pool of worker processes.
+
+    Each worker keeps its own FaceRecognitionSystem, loaded once at start
+    and kept current through the encoding store, so request threads only
+    decode the upload and wait. At most `queue_size` jobs are queued or
+    running; beyond that submit() raises RecognitionBusy at once instead of
+    piling up work. A job that has not finished by its deadline raises
+    RecognitionTimeout, and a job still queued at its deadline is skipped
+    by the worker.
+
+    With no workers configured, run() calls the in-process face_system
+    directly, exactly as before.
+    """
+
+    def __init__(self, workers=None, queue_size=None, timeout=None):
+        self.workers = workers if workers is not None else Config.RECOGNITION_WORKERS
+        self.queue_size = queue_size or Config.RECOGNITION_QUEUE_SIZE or 4 * max(1, self.workers)
+        self.timeout = timeout or Config.RECOGNITION_TIMEOUT
+        self.pool = None
+        self.pid = None
+        self.slots = threading.BoundedSemaphore(self.queue_size)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.metrics = {
+            'submitted': 0,
+            'completed': 0,
+            'rejected': 0,
+            'timeouts': 0,
+            'failures': 0,
+        }
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    def _get_pool(self):
+        # Worker processes belong to the process that started them (not to forked gunicorn workers)
+        with self.lock:
+            if self.pool is None or self.pid != os.getpid():
+                # spawn: never fork a process that already runs request threads
+                self.pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=multiprocessing.get_context('spawn'),
+                                                initializer=_init_worker,
+                                                initargs=(worker_settings(),))
+                self.pid = os.getpid()
+                self.slots = threading.BoundedSemaphore(self.queue_size)
+                self.in_flight = 0
+            return self.pool
+
+    def _count(self, name):
+        with self.lock:
+            self.metrics[name] += 1
+
+    def submit(self, method, *args, timeout=None, **kwargs):
+        """
+        Queue a FaceRecognitionSystem method call
+        Returns: (future, deadline); raises RecognitionBusy when the queue is full
+        """
+        if method not in POOL_METHODS:
+            raise ValueError(f"Unsupported recognition method: {method}")
+        pool = self._get_pool()
+        slots = self.slots
+        if not slots.acquire(blocking=False):
+            self._count('rejected')
+            raise RecognitionBusy("Recognition queue is full, please retry")
+
+        deadline = time.time() + (timeout or self.timeout)
+        try:
+            future = pool.submit(_run_task, method, args, kwargs, deadline)
+        except (BrokenProcessPool, RuntimeError) as e:
+            slots.release()
+            self._reset(e)
+            raise RecognitionUnavailable("Recognition workers are restarting")
+        with self.lock:
+            self.in_flight += 1
+            self.metrics['submitted'] += 1
+        future.add_done_callback(lambda _: self._finished(slots))
+        return future, deadline
+
+    def _finished(self, slots):
+        with self.lock:
+            self.in_flight -= 1
+        slots.release()
+
+    def result(self, future, deadline):
+        """Wait for a submitted job until its deadline"""
+        try:
+            outcome = future.result(timeout=max(0.0, deadline - time.time()))
+        except FutureTimeoutError:
+            future.cancel()
+            self._count('timeouts')
+            raise RecognitionTimeout("Recognition timed out, please retry")
+        except BrokenProcessPool as e:
+            self._reset(e)
+            raise RecognitionUnavailable("Recognition workers are restarting")
+        if outcome is None:
+            self._count('timeouts')
+            raise RecognitionTimeout("Recognition timed out, please retry")
+        self._count('completed')
+        return outcome
+
+    def run(self, method, *args, timer=None, timeout=None, **kwargs):
+        """
+        Call a FaceRecognitionSystem method in the pool (or inline when the pool is disabled)
+        and wait for its result; worker stage timings are added to `timer`
+        """
+        if not self.enabled:
+            from utils.face_utils import face_system
+            return getattr(face_system, method)(*args, timer=timer, **kwargs)
+
+        future, deadline = self.submit(method, *args, timeout=timeout, **kwargs)
+        result, timings = self.result(future, deadline)
+        if timer is not None:
+            timer.merge(timings)
+        return result
+
+    def warm_up(self):
+        """Start the worker processes and have each of them run one warm-up pass"""
+        if not self.enabled:
+            return
+        # One job per worker, submitted together so every worker is likely to pick one up
+        jobs = [self.submit('warm_up', timeout=max(self.timeout, 120))
+                for _ in range(min(self.workers, self.queue_size))]
+        for future, deadline in jobs:
+            self.result(future, deadline)
+
+    def _reset(self, error):
+        logger.error(f"Recognition pool failed, restarting: {error}")
+        with self.lock:
+            self.metrics['failures'] += 1
+            pool, self.pool = self.pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self.lock:
+            pool, self.pool = self.pool, None
+        if pool is not None and self.pid == os.getpid():
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self.lock:
+            metrics = dict(self.metrics)
+            metrics['in_flight'] = self.in_flight
+        metrics['workers'] = self.workers
+        metrics['queue_size'] = self.queue_size
+        metrics['enabled'] = self.enabled
+        return metrics
+
+
+# Global instance
+recognition_executor = RecognitionExecutor()
+atexit.register(recognition_executor.shutdown)
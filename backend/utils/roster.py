@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import OrderedDict
+from config import Config
+from models import Student
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RosterCache:
+    """
+    In-process cache of student records keyed by student_id, with LRU eviction.
+
+    Every recognized face needs the student's record for the response; this
+    answers those lookups from memory instead of from SQLite. Triggers bump
+    a roster version on every change to the students table (see
+    models.init_db). The cache compares it at most every `check_seconds`
+    and starts over when it moved, so a change made by another worker (or
+    outside the app) shows up within that interval. Enrollment and
+    deactivation in this process call invalidate() for an immediate effect.
+    Unknown students are not cached.
+    """
+
+    def __init__(self, max_entries=None, check_seconds=None):
+        self.max_entries = max_entries if max_entries is not None else Config.ROSTER_CACHE_SIZE
+        self.check_seconds = check_seconds if check_seconds is not None else Config.ROSTER_CACHE_CHECK_SECONDS
+        self.entries = OrderedDict()  # student_id -> record
+        self.lock = threading.Lock()
+        self.version = None
+        self.checked_at = 0.0
+        # Bumped whenever entries are dropped, so a lookup that raced with it does not store stale rows
+        self.epoch = 0
+        self.metrics = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _validate(self):
+        now = time.monotonic()
+        if self.version is not None and now - self.checked_at < self.check_seconds:
+            return
+        version = Student.get_version()
+        with self.lock:
+            if version != self.version:
+                if self.entries:
+                    self.metrics['invalidations'] += 1
+                self.entries.clear()
+                self.epoch += 1
+                self.version = version
+            self.checked_at = now
+
+    def get_many(self, student_ids):
+        """Records of several students keyed by student_id (active or not); unknown ids are left out"""
+        student_ids = list(dict.fromkeys(student_ids))
+        if not self.enabled:
+            return Student.get_many(student_ids)
+        self._validate()
+
+        found = {}
+        with self.lock:
+            epoch = self.epoch
+            for student_id in student_ids:
+                record = self.entries.get(student_id)
+                if record is not None:
+                    self.entries.move_to_end(student_id)
+                    found[student_id] = dict(record)
+            self.metrics['hits'] += len(found)
+            self.metrics['misses'] += len(student_ids) - len(found)
+
+        missing = [student_id for student_id in student_ids if student_id not in found]
+        if missing:
+            fetched = Student.get_many(missing)
+            with self.lock:
+                if epoch == self.epoch:
+                    self.entries.update(fetched)
+                    while len(self.entries) > self.max_entries:
+                        self.entries.popitem(last=False)
+            found.update((student_id, dict(record)) for student_id, record in fetched.items())
+        return found
+
+    def get(self, student_id):
+        """Record of one student, or None"""
+        return self.get_many([student_id]).get(student_id)
+
+    def invalidate(self):
+        """Drop every cached record, after this process changed the roster"""
+        with self.lock:
+            self.entries.clear()
+            self.epoch += 1
+            self.version = None
+
+    def stats(self):
+        with self.lock:
+            metrics = dict(self.metrics)
+            metrics['size'] = len(self.entries)
+        lookups = metrics['hits'] + metrics['misses']
+        metrics['hit_rate'] = round(metrics['hits'] / lookups, 3) if lookups else 0.0
+        metrics['enabled'] = self.enabled
+        return metrics
+
+
+# Global instance
+roster = RosterCache()
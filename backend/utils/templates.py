@@ -0,0 +1,58 @@
+import numpy as np
+from config import Config
+from utils.gallery import ENCODING_DIM
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TemplateError(ValueError):
+    pass
+
+
+def pairwise_distances(encodings):
+    """Euclidean distances between every pair of rows"""
+    sq_norms = np.einsum('ij,ij->i', encodings, encodings)
+    sq = sq_norms[:, None] + sq_norms[None, :] - 2.0 * (encodings @ encodings.T)
+    np.maximum(sq, 0.0, out=sq)
+    return np.sqrt(sq, out=sq)
+
+
+def build_template(samples, size=None, coverage=None, max_spread=None):
+    """
+    Reduce several enrollment encodings of one student to a compact template.
+
+    The first row is the medoid (the sample closest to all others, so one bad
+    photo cannot drag it the way it would a mean). Exemplars are then added
+    farthest-first: the sample least covered by the template so far, as long
+    as it is more than `coverage` away from every template row, up to `size`
+    rows in total. Samples that are already covered add nothing, so a student
+    enrolled with 10 near-identical photos still gets a single row.
+    samples: (K, 128) array-like of encodings
+    max_spread: samples farther than this from the medoid are rejected as a
+    different person or a bad photo
+    Returns: (M, 128) float32 template, 1 <= M <= size
+    """
+    size = size or Config.TEMPLATE_SIZE
+    coverage = Config.TEMPLATE_COVERAGE if coverage is None else coverage
+    max_spread = max_spread or Config.TOLERANCE
+    samples = np.asarray(samples, dtype=np.float32).reshape(-1, ENCODING_DIM)
+    if len(samples) == 0:
+        raise TemplateError("No face samples")
+    if len(samples) == 1:
+        return samples
+
+    dists = pairwise_distances(samples)
+    medoid = int(np.argmin(dists.sum(axis=1)))
+    if dists[medoid].max() > max_spread:
+        raise TemplateError("Face samples do not look like the same person")
+
+    chosen = [medoid]
+    covered = dists[medoid].copy()
+    while len(chosen) < size:
+        candidate = int(np.argmax(covered))
+        if covered[candidate] <= coverage:
+            break
+        chosen.append(candidate)
+        np.minimum(covered, dists[candidate], out=covered)
+    return samples[chosen]
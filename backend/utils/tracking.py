@@ -0,0 +1,233 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+import cv2
+from config import Config
+from utils.detection import StageTimer
+from utils.quality import quality_filter
+import logging
+
+logger = logging.getLogger(__name__)
+
+TRACKER_FACTORIES = {
+    'kcf': 'TrackerKCF_create',
+    'csrt': 'TrackerCSRT_create',
+    'mil': 'TrackerMIL_create',
+}
+
+_tracker_warned = set()
+
+
+def create_tracker(kind=None):
+    """An OpenCV single-object tracker; falls back to MIL (always in core OpenCV) when `kind` is unavailable"""
+    kind = (kind or Config.TRACKER).lower()
+    name = TRACKER_FACTORIES.get(kind, TRACKER_FACTORIES['mil'])
+    # KCF and CSRT live in opencv-contrib, under cv2.legacy in some builds
+    for owner in (cv2, getattr(cv2, 'legacy', None)):
+        factory = getattr(owner, name, None) if owner is not None else None
+        if factory is not None:
+            return factory()
+    if kind not in _tracker_warned:
+        _tracker_warned.add(kind)
+        logger.warning(f"Tracker '{kind}' is not available in this OpenCV build; using MIL")
+    return cv2.TrackerMIL_create()
+
+
+def box_iou(a, b):
+    """Intersection over union of two (top, right, bottom, left) boxes"""
+    top, right = max(a[0], b[0]), min(a[1], b[1])
+    bottom, left = min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, right - left) * max(0, bottom - top)
+    if inter == 0:
+        return 0.0
+    area_a = (a[1] - a[3]) * (a[2] - a[0])
+    area_b = (b[1] - b[3]) * (b[2] - b[0])
+    return inter / float(area_a + area_b - inter)
+
+
+class FaceTrack:
+    """One face followed across the frames of a session"""
+
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = box  # (top, right, bottom, left) in the downscaled frame
+        self.tracker = None
+        self.student_id = None
+        self.confidence = 0.0
+        self.encoded_at = None  # frame index of the last encoding
+
+    def start(self, small):
+        """(Re)initialise the tracker on the current box"""
+        top, right, bottom, left = self.box
+        self.tracker = create_tracker()
+        self.tracker.init(small, (int(left), int(top), int(right - left), int(bottom - top)))
+
+    def update(self, small):
+        """Advance the tracker by one frame; False when the face was lost"""
+        ok, (x, y, w, h) = self.tracker.update(small)
+        if not ok or w <= 0 or h <= 0:
+            return False
+        self.box = (int(y), int(x + w), int(y + h), int(x))
+        return True
+
+    def needs_encoding(self, frame_index):
+        if self.student_id is None or self.encoded_at is None:
+            return True
+        if self.confidence < Config.TRACK_MIN_CONFIDENCE:
+            return True
+        return frame_index - self.encoded_at >= Config.TRACK_REVERIFY_FRAMES
+
+
+class RecognitionSession:
+    """
+    Recognition over a continuous stream of frames from one camera.
+
+    Full detection runs on every `detect_every`-th frame only; in between,
+    each face is followed by a cheap OpenCV tracker on the downscaled frame.
+    A face is encoded and matched when its track is new, unidentified, below
+    TRACK_MIN_CONFIDENCE, or not verified for TRACK_REVERIFY_FRAMES frames,
+    so a face standing in front of the kiosk is encoded once instead of on
+    every frame.
+    """
+
+    def __init__(self, session_id, system=None, detect_every=None):
+        self.session_id = session_id
+        if system is None:
+            from utils.face_utils import face_system
+            system = face_system
+        self.system = system
+        self.detector = self.system.detector
+        self.detect_every = max(1, detect_every or Config.TRACK_DETECT_EVERY)
+        self.tracks = []
+        self.frame_index = 0
+        self.next_track_id = 1
+        self.reported = set()  # students already returned as check-ins
+        self.last_seen = time.monotonic()
+        # Frames of one session must be processed in order
+        self.lock = threading.Lock()
+        self.metrics = {'frames': 0, 'detections': 0, 'encodings': 0}
+
+    def process_frame(self, image, timer=None):
+        """
+        Advance the session by one RGB frame
+        Returns: (tracks, checkins) where tracks describes every face being
+        followed and checkins lists (student_id, confidence) for students
+        identified for the first time in this session
+        """
+        timer = timer or StageTimer()
+        with self.lock:
+            self.last_seen = time.monotonic()
+            with timer.stage('downscale'):
+                small = self.detector.downscale(image)
+
+            if self.frame_index % self.detect_every == 0:
+                self._detect(image, small, timer)
+            else:
+                with timer.stage('track'):
+                    self.tracks = [t for t in self.tracks if t.update(small)]
+
+            self.frame_index += 1
+            self.metrics['frames'] += 1
+
+            checkins = []
+            for track in self.tracks:
+                if track.student_id is not None and track.student_id not in self.reported:
+                    self.reported.add(track.student_id)
+                    checkins.append((track.student_id, track.confidence))
+            return [self._describe(t, image.shape) for t in self.tracks], checkins
+
+    def _detect(self, image, small, timer):
+        boxes = self.detector.detect_scaled(small, timer)
+        self.metrics['detections'] += 1
+
+        # Greedily continue the existing tracks with the detections overlapping them most
+        pairs = sorted(((box_iou(track.box, box), ti, bi)
+                        for ti, track in enumerate(self.tracks)
+                        for bi, box in enumerate(boxes)), reverse=True)
+        used_tracks, used_boxes = set(), set()
+        tracks = []
+        for iou, ti, bi in pairs:
+            if iou < Config.TRACK_IOU:
+                break
+            if ti in used_tracks or bi in used_boxes:
+                continue
+            used_tracks.add(ti)
+            used_boxes.add(bi)
+            track = self.tracks[ti]
+            track.box = tuple(boxes[bi])
+            tracks.append(track)
+
+        # Detection is authoritative: unmatched tracks are dropped, unmatched boxes start new ones
+        for bi, box in enumerate(boxes):
+            if bi not in used_boxes:
+                tracks.append(FaceTrack(self.next_track_id, tuple(box)))
+                self.next_track_id += 1
+
+        with timer.stage('track'):
+            for track in tracks:
+                track.start(small)
+        self.tracks = tracks
+
+        # Faces too small to encode well stay tracked, and are encoded once they come closer
+        pending = [t for t in tracks
+                   if t.needs_encoding(self.frame_index) and quality_filter.large_enough(t.box, small.shape[0])]
+        if not pending:
+            return
+        locations = self.detector.to_full([t.box for t in pending], image.shape)
+        results = self.system.identify(image, locations, timer, session=self.session_id)
+        self.metrics['encodings'] += len(pending)
+        for track, (student_id, confidence) in zip(pending, results):
+            track.student_id = student_id
+            track.confidence = confidence
+            track.encoded_at = self.frame_index
+
+    def _describe(self, track, shape):
+        return {
+            'track_id': track.track_id,
+            'student_id': track.student_id,
+            'confidence': round(track.confidence * 100, 2),
+            'location': list(self.detector.to_full([track.box], shape)[0])
+        }
+
+
+class SessionManager:
+    """Per-worker registry of streaming sessions, expired after TRACK_SESSION_TTL seconds without frames"""
+
+    def __init__(self, ttl=None, max_sessions=None):
+        self.ttl = ttl or Config.TRACK_SESSION_TTL
+        self.max_sessions = max_sessions or Config.TRACK_MAX_SESSIONS
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def create(self):
+        return self.get(uuid.uuid4().hex)
+
+    def get(self, session_id):
+        """
+        The session with this id, created if this worker has not seen it
+        (first frame, expired, or routed to another worker) - it then just
+        starts with a full detection
+        """
+        with self.lock:
+            self._expire()
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = self.sessions[session_id] = RecognitionSession(session_id)
+                while len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+            self.sessions.move_to_end(session_id)
+            return session
+
+    def close(self, session_id):
+        with self.lock:
+            return self.sessions.pop(session_id, None) is not None
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl
+        for session_id in [s for s, session in self.sessions.items() if session.last_seen < cutoff]:
+            del self.sessions[session_id]
+
+
+# Global instance
+session_manager = SessionManager()
@@ -0,0 +1,82 @@
+import os
+import threading
+import time
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class WarmUp:
+    """
+    Per-process warm-up state behind /api/health.
+
+    run() imports the face models, loads the gallery and runs one dummy
+    detection, encoding and match (and, with RECOGNITION_WORKERS set, does
+    the same in every recognition worker process). Until it has finished in
+    the current process /api/health answers 503, so a load balancer only
+    routes scans to warm workers.
+
+    With gunicorn --preload (see gunicorn.conf.py) the master runs it once
+    before forking, so the models and gallery pages are shared copy-on-write
+    and each worker's own pass is only a dummy detection. Elsewhere
+    create_app() starts it on a background thread.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.thread = None
+        self.ready_pid = None
+        self.error = None
+        self.timings = {}
+        self.seconds = None
+
+    def run(self, recognition_pool=True):
+        """Warm this process up now; recognition_pool=False in a master that is about to fork"""
+        from utils.face_utils import face_system
+        from utils.recognition_pool import recognition_executor
+        start = time.perf_counter()
+        try:
+            self.timings = face_system.warm_up()
+            if recognition_pool:
+                recognition_executor.warm_up()
+            self.error = None
+        except Exception as e:
+            logger.error(f"Warm-up failed: {e}")
+            self.error = str(e)
+            return False
+        self.seconds = round(time.perf_counter() - start, 3)
+        self.ready_pid = os.getpid()
+        logger.info(f"Warm-up finished in {self.seconds}s (pid {os.getpid()})")
+        return True
+
+    def start(self):
+        """Warm up on a background thread, once per process (again if the last attempt failed)"""
+        with self.lock:
+            if self.pid == os.getpid() and (self.ready or self.thread.is_alive()):
+                return
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self.run, name='warm-up', daemon=True)
+            self.thread.start()
+
+    @property
+    def ready(self):
+        return self.ready_pid == os.getpid()
+
+    def status(self):
+        if Config.WARMUP == 'off':
+            return {'status': 'healthy'}
+        if not self.ready:
+            # A process forked without a warm-up of its own (e.g. --preload without
+            # gunicorn.conf.py) starts one here, as does a retry after a failure
+            self.start()
+        if self.error is not None:
+            return {'status': 'unhealthy', 'error': self.error}
+        if not self.ready:
+            return {'status': 'starting'}
+        return {'status': 'healthy', 'warm_up_seconds': self.seconds}
+
+
+# Global instance
+warmup = WarmUp()
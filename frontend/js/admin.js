@@ -1,32 +1,102 @@
 const API_BASE = 'http://localhost:5000/api';
 
+let attendanceRecords = [];
+let attendanceStream = null;
+let attendanceEtag = null;
+let pollTimer = null;
+const STREAM_RETRY_MS = 30000;
+const POLL_MS = 10000;
+
 async function loadAttendance() {
     try {
-        const response = await fetch(`${API_BASE}/attendance/today`);
-        const records = await response.json();
-        
-        const tbody = document.getElementById('attendanceTable');
-        
-        if (records.length === 0) {
-            tbody.innerHTML = '<tr><td colspan="6" class="text-center">No records found</td></tr>';
-            return;
-        }
-        
-        tbody.innerHTML = records.map(record => `
-            <tr>
-                <td>${record.name}</td>
-                <td>${record.student_id}</td>
-                <td>${record.department}</td>
-                <td>${new Date(record.check_in_time).toLocaleString()}</td>
-                <td>${Math.round(record.confidence * 100)}%</td>
-                <td><span class="badge bg-success">${record.status}</span></td>
-            </tr>
-        `).join('');
+        await refreshAttendance();
+        watchAttendance();
     } catch (error) {
         console.error('Error loading attendance:', error);
     }
 }
 
+// Conditional GET: an unchanged day is a 304 with no body
+async function refreshAttendance() {
+    const headers = attendanceEtag ? { 'If-None-Match': attendanceEtag } : {};
+    const response = await fetch(`${API_BASE}/attendance/today`, { headers, cache: 'no-store' });
+    if (response.status === 304) {
+        return;
+    }
+    attendanceEtag = response.headers.get('ETag');
+    attendanceRecords = await response.json();
+    renderAttendance();
+}
+
+// Used while the server has no stream slot for us
+function startPolling() {
+    if (!pollTimer) {
+        pollTimer = setInterval(() => {
+            refreshAttendance().catch(error => console.error('Error polling attendance:', error));
+        }, POLL_MS);
+    }
+}
+
+function stopPolling() {
+    clearInterval(pollTimer);
+    pollTimer = null;
+}
+
+// Live updates pushed by the server; a re-check-in replaces the student's row
+function watchAttendance() {
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
+    if (attendanceStream) {
+        return;
+    }
+    
+    attendanceStream = new EventSource(`${API_BASE}/attendance/stream`);
+    attendanceStream.onopen = stopPolling;
+    
+    // Turned away (the server caps open streams) or gone for good: poll until a slot opens
+    attendanceStream.onerror = () => {
+        if (attendanceStream.readyState === EventSource.CLOSED) {
+            attendanceStream = null;
+            startPolling();
+            setTimeout(watchAttendance, STREAM_RETRY_MS);
+        }
+    };
+    
+    attendanceStream.addEventListener('snapshot', event => {
+        attendanceRecords = JSON.parse(event.data).records;
+        renderAttendance();
+    });
+    
+    attendanceStream.addEventListener('checkin', event => {
+        const record = JSON.parse(event.data);
+        attendanceRecords = [record].concat(
+            attendanceRecords.filter(r => r.student_id !== record.student_id));
+        renderAttendance();
+    });
+}
+
+function renderAttendance() {
+    const tbody = document.getElementById('attendanceTable');
+    
+    if (attendanceRecords.length === 0) {
+        tbody.innerHTML = '<tr><td colspan="6" class="text-center">No records found</td></tr>';
+        return;
+    }
+    
+    tbody.innerHTML = attendanceRecords.map(record => `
+        <tr>
+            <td>${record.name}</td>
+            <td>${record.student_id}</td>
+            <td>${record.department}</td>
+            <td>${new Date(record.check_in_time).toLocaleString()}</td>
+            <td>${Math.round(record.confidence * 100)}%</td>
+            <td><span class="badge bg-success">${record.status}</span></td>
+        </tr>
+    `).join('');
+}
+
 function exportReport() {
     alert('Export functionality - Coming soon!');
 }
@@ -1,6 +1,7 @@
 const API_BASE = 'http://localhost:5000/api';
 let videoStream = null;
 let capturedImageData = null;
+let capturedImageBlob = null;
 
 const video = document.getElementById('video');
 const canvas = document.getElementById('canvas');
@@ -32,6 +33,7 @@ captureBtn.addEventListener('click', () => {
     ctx.drawImage(video, 0, 0);
     
     capturedImageData = canvas.toDataURL('image/jpeg');
+    canvas.toBlob(blob => { capturedImageBlob = blob; }, 'image/jpeg', 0.9);
     
     const preview = document.getElementById('preview');
     preview.src = capturedImageData;
@@ -50,19 +52,19 @@ captureBtn.addEventListener('click', () => {
 enrollForm.addEventListener('submit', async (e) => {
     e.preventDefault();
     
-    if (!capturedImageData) {
+    if (!capturedImageBlob) {
         alert('Please capture a photo first');
         return;
     }
     
-    const formData = {
-        student_id: document.getElementById('studentId').value,
-        name: document.getElementById('studentName').value,
-        department: document.getElementById('department').value,
-        email: document.getElementById('email').value,
-        phone: document.getElementById('phone').value,
-        image: capturedImageData
-    };
+    // Multipart upload: the photo travels as binary, not base64 inside JSON
+    const formData = new FormData();
+    formData.append('student_id', document.getElementById('studentId').value);
+    formData.append('name', document.getElementById('studentName').value);
+    formData.append('department', document.getElementById('department').value);
+    formData.append('email', document.getElementById('email').value);
+    formData.append('phone', document.getElementById('phone').value);
+    formData.append('image', capturedImageBlob, 'photo.jpg');
     
     enrollBtn.disabled = true;
     enrollBtn.innerHTML = '<span class="spinner-border spinner-border-sm me-2"></span>Enrolling...';
@@ -70,8 +72,7 @@ enrollForm.addEventListener('submit', async (e) => {
     try {
         const response = await fetch(`${API_BASE}/enroll/register`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(formData)
+            body: formData
         });
         
         const data = await response.json();
@@ -81,6 +82,7 @@ enrollForm.addEventListener('submit', async (e) => {
             enrollForm.reset();
             document.getElementById('capturedImage').style.display = 'none';
             capturedImageData = null;
+            capturedImageBlob = null;
             startCameraBtn.disabled = false;
             startCameraBtn.textContent = 'Start Camera';
         } else {
@@ -34,50 +34,146 @@ document.addEventListener('DOMContentLoaded', function() {
 });
 
 // Load Dashboard Data
+let recentAttendance = [];
+let attendanceStream = null;
+let pollTimer = null;
+const etags = {};
+const STREAM_RETRY_MS = 30000;
+const POLL_MS = 10000;
+
 async function loadDashboard() {
     try {
-        // Fetch statistics
-        const statsResponse = await fetch(`${API_BASE}/attendance/statistics`);
-        const stats = await statsResponse.json();
-        
-        document.getElementById('totalStudents').textContent = stats.total_students;
-        document.getElementById('presentCount').textContent = stats.present;
-        document.getElementById('absentCount').textContent = stats.absent;
-        document.getElementById('attendanceRate').textContent = stats.attendance_rate + '%';
-        
-        // Fetch recent attendance
-        const attendanceResponse = await fetch(`${API_BASE}/attendance/today`);
-        const attendance = await attendanceResponse.json();
+        // Statistics and the 10 most recent check-ins in one request
+        const dashboardResponse = await fetch(`${API_BASE}/admin/dashboard`);
+        const dashboard = await dashboardResponse.json();
         
-        const container = document.getElementById('recentAttendance');
-        if (attendance.length === 0) {
-            container.innerHTML = '<p class="text-muted">No attendance records today</p>';
-            return;
-        }
+        renderStatistics(dashboard.statistics);
+        recentAttendance = dashboard.recent_attendance;
+        renderRecentAttendance();
         
-        container.innerHTML = attendance.slice(0, 10).map(record => `
-            <div class="d-flex justify-content-between align-items-center p-3 mb-2 bg-light rounded">
-                <div class="d-flex align-items-center">
-                    <div class="avatar-circle me-3">
-                        ${record.name.split(' ').map(n => n[0]).join('')}
-                    </div>
-                    <div>
-                        <strong>${record.name}</strong>
-                        <p class="mb-0 small text-muted">
-                            <span class="me-2">🕐 ${new Date(record.check_in_time).toLocaleTimeString()}</span>
-                            ${record.department}
-                        </p>
-                    </div>
-                </div>
-                <span class="badge bg-success">Present</span>
-            </div>
-        `).join('');
+        watchDashboard();
         
     } catch (error) {
         console.error('Error loading dashboard:', error);
     }
 }
 
+// Conditional GET: resolves to null when the server answers 304 (nothing changed)
+async function fetchIfChanged(path) {
+    const headers = etags[path] ? { 'If-None-Match': etags[path] } : {};
+    const response = await fetch(`${API_BASE}${path}`, { headers, cache: 'no-store' });
+    if (response.status === 304) {
+        return null;
+    }
+    etags[path] = response.headers.get('ETag');
+    return response.json();
+}
+
+async function pollDashboard() {
+    try {
+        const stats = await fetchIfChanged('/attendance/statistics');
+        if (stats) {
+            renderStatistics(stats);
+        }
+        const records = await fetchIfChanged('/attendance/today');
+        if (records) {
+            recentAttendance = records.slice(0, 10);
+            renderRecentAttendance();
+        }
+    } catch (error) {
+        console.error('Error polling dashboard:', error);
+    }
+}
+
+// Used while the server has no stream slot for us
+function startPolling() {
+    if (!pollTimer) {
+        pollTimer = setInterval(pollDashboard, POLL_MS);
+    }
+}
+
+function stopPolling() {
+    clearInterval(pollTimer);
+    pollTimer = null;
+}
+
+// Keep the dashboard current with server-pushed events, polling only when refused a stream
+function watchDashboard() {
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
+    if (attendanceStream) {
+        return;
+    }
+    
+    attendanceStream = new EventSource(`${API_BASE}/attendance/stream`);
+    attendanceStream.onopen = stopPolling;
+    
+    // Turned away (the server caps open streams) or gone for good: poll until a slot opens
+    attendanceStream.onerror = () => {
+        if (attendanceStream.readyState === EventSource.CLOSED) {
+            attendanceStream = null;
+            startPolling();
+            setTimeout(watchDashboard, STREAM_RETRY_MS);
+        }
+    };
+    
+    attendanceStream.addEventListener('snapshot', event => {
+        const snapshot = JSON.parse(event.data);
+        renderStatistics(snapshot.statistics);
+        recentAttendance = snapshot.records.slice(0, 10);
+        renderRecentAttendance();
+    });
+    
+    attendanceStream.addEventListener('checkin', event => {
+        const record = JSON.parse(event.data);
+        recentAttendance = [record]
+            .concat(recentAttendance.filter(r => r.student_id !== record.student_id))
+            .slice(0, 10);
+        renderRecentAttendance();
+    });
+    
+    attendanceStream.addEventListener('statistics', event => {
+        renderStatistics(JSON.parse(event.data));
+    });
+    
+    // EventSource reconnects on its own; the server sends a fresh snapshot
+}
+
+function renderStatistics(stats) {
+    document.getElementById('totalStudents').textContent = stats.total_students;
+    document.getElementById('presentCount').textContent = stats.present;
+    document.getElementById('absentCount').textContent = stats.absent;
+    document.getElementById('attendanceRate').textContent = stats.attendance_rate + '%';
+}
+
+function renderRecentAttendance() {
+    const container = document.getElementById('recentAttendance');
+    if (recentAttendance.length === 0) {
+        container.innerHTML = '<p class="text-muted">No attendance records today</p>';
+        return;
+    }
+    
+    container.innerHTML = recentAttendance.map(record => `
+        <div class="d-flex justify-content-between align-items-center p-3 mb-2 bg-light rounded">
+            <div class="d-flex align-items-center">
+                <div class="avatar-circle me-3">
+                    ${record.name.split(' ').map(n => n[0]).join('')}
+                </div>
+                <div>
+                    <strong>${record.name}</strong>
+                    <p class="mb-0 small text-muted">
+                        <span class="me-2">🕐 ${new Date(record.check_in_time).toLocaleTimeString()}</span>
+                        ${record.department}
+                    </p>
+                </div>
+            </div>
+            <span class="badge bg-success">Present</span>
+        </div>
+    `).join('');
+}
+
 // Utility: Display message
 function showMessage(message, type = 'info') {
     const alertDiv = document.createElement('div');
@@ -1,6 +1,26 @@
 const API_BASE = 'http://localhost:5000/api';
 let scanStream = null;
 let scanning = false;
+let sessionId = null;
+
+// Stable id of this kiosk, so the server tells cameras apart even behind one NAT or proxy
+const KIOSK_ID = localStorage.getItem('kioskId') || (() => {
+    const id = crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    localStorage.setItem('kioskId', id);
+    return id;
+})();
+
+// Frames are sent back to back (one in flight at a time), at most this often
+const FRAME_INTERVAL_MS = 100;
+
+// Hints for frames the server turned away before recognition (the response's reason code)
+const REASON_HINTS = {
+    too_dark: 'Too dark - face a light source',
+    too_bright: 'Too bright - move away from the glare',
+    blurry: 'Hold still for a moment',
+    static_frame: 'Move slightly so the camera can see you are there',
+    face_too_small: 'Move closer to the camera'
+};
 
 const scanVideo = document.getElementById('scanVideo');
 const scanCanvas = document.getElementById('scanCanvas');
@@ -19,8 +39,14 @@ startScanBtn.addEventListener('click', async () => {
         startScanBtn.style.display = 'none';
         stopScanBtn.style.display = 'block';
         
-        // Start continuous scanning
-        scanInterval = setInterval(captureAndRecognize, 3000);
+        // Start a streaming session: the server tracks faces between frames
+        // and only re-runs full recognition when it has to
+        const response = await fetch(`${API_BASE}/attendance/sessions`, {
+            method: 'POST',
+            headers: { 'X-Kiosk-Id': KIOSK_ID }
+        });
+        sessionId = (await response.json()).session_id;
+        scanLoop();
     } catch (error) {
         alert('Unable to access camera: ' + error.message);
     }
@@ -36,48 +62,77 @@ function stopScanning() {
         scanStream.getTracks().forEach(track => track.stop());
         scanVideo.srcObject = null;
     }
-    if (scanInterval) {
-        clearInterval(scanInterval);
+    if (sessionId) {
+        fetch(`${API_BASE}/attendance/sessions/${sessionId}`, {
+            method: 'DELETE',
+            headers: { 'X-Kiosk-Id': KIOSK_ID }
+        });
+        sessionId = null;
     }
     startScanBtn.style.display = 'block';
     stopScanBtn.style.display = 'none';
 }
 
+async function scanLoop() {
+    while (scanning) {
+        const started = performance.now();
+        await captureAndRecognize();
+        const wait = FRAME_INTERVAL_MS - (performance.now() - started);
+        if (wait > 0) {
+            await new Promise(resolve => setTimeout(resolve, wait));
+        }
+    }
+}
+
 async function captureAndRecognize() {
-    if (!scanning) return;
+    if (!scanning || !sessionId) return;
     
     scanCanvas.width = scanVideo.videoWidth;
     scanCanvas.height = scanVideo.videoHeight;
     const ctx = scanCanvas.getContext('2d');
     ctx.drawImage(scanVideo, 0, 0);
     
-    const imageData = scanCanvas.toDataURL('image/jpeg');
+    // Send the JPEG bytes as-is instead of a base64 data URL inside JSON
+    const imageBlob = await new Promise(resolve => scanCanvas.toBlob(resolve, 'image/jpeg', 0.9));
     
     try {
-        const response = await fetch(`${API_BASE}/attendance/mark`, {
+        const response = await fetch(`${API_BASE}/attendance/sessions/${sessionId}/frames`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ image: imageData })
+            headers: { 'Content-Type': 'image/jpeg', 'X-Kiosk-Id': KIOSK_ID },
+            body: imageBlob
         });
         
         const data = await response.json();
         
-        if (data.recognized) {
+        if (!response.ok) {
+            resultDiv.innerHTML = `
+                <div class="alert alert-warning">
+                    <p class="mb-0">⚠️ ${data.error}</p>
+                </div>
+            `;
+        } else if (data.recognized.length > 0) {
+            const match = data.recognized[0];
             resultDiv.innerHTML = `
                 <div class="alert alert-success">
                     <h5>✓ Attendance Marked!</h5>
-                    <p class="mb-1"><strong>Name:</strong> ${data.student.name}</p>
-                    <p class="mb-1"><strong>Student ID:</strong> ${data.student.student_id}</p>
-                    <p class="mb-1"><strong>Department:</strong> ${data.student.department}</p>
-                    <p class="mb-1"><strong>Confidence:</strong> ${data.confidence}%</p>
+                    <p class="mb-1"><strong>Name:</strong> ${match.student.name}</p>
+                    <p class="mb-1"><strong>Student ID:</strong> ${match.student.student_id}</p>
+                    <p class="mb-1"><strong>Department:</strong> ${match.student.department}</p>
+                    <p class="mb-1"><strong>Confidence:</strong> ${match.confidence}%</p>
                     <p class="mb-0"><strong>Time:</strong> ${data.timestamp}</p>
                 </div>
             `;
             stopScanning();
         } else {
+            let message = data.tracks.length === 0
+                ? 'No face detected'
+                : 'Face not recognized';
+            if (data.reason in REASON_HINTS) {
+                message = REASON_HINTS[data.reason];
+            }
             resultDiv.innerHTML = `
                 <div class="alert alert-warning">
-                    <p class="mb-0">⚠️ ${data.error}</p>
+                    <p class="mb-0">⚠️ ${message}</p>
                 </div>
             `;
         }